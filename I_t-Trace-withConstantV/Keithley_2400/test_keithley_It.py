@@ -1,231 +1,255 @@
 #!/usr/bin/env python3
-import gpib
-import time
-import numpy as np
-import pyqtgraph as pg
-from pyqtgraph.Qt import QtCore
-from pyqtgraph.exporters import ImageExporter
 import os
-os.chdir(os.path.dirname(__file__))
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from keithley2400 import Keithley2400, GrowableBuffer
+from keithley2400.acquisition import AcquisitionThread, consume
+from keithley2400.storage import timestamped_filename, open_writer, read_data
+from keithley2400.longrun import MultiResolutionStore
+from keithley2400.catalog import RunCatalog, script_parameters
+from keithley2400.nearest import SortedIndex
+from keithley2400.safety import handle_signals
+from keithley2400.monitor import AnomalyDetector, MeasurementAborted
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 
 # User parameters
 keithley_address = 24    # GPIB address of the Keithley 2400
+simulate = False         # Use the simulated Keithley 2400 (1 MOhm resistor) instead of the GPIB instrument
 voltage = -10            # Voltage to perform I-t measurement in volts
 v_ramp = 0.1             # Ramp time in seconds
 ramping_delay = 0.1      # Delay between steps in seconds (min:0.05)
+ramp_rate = None         # Ramp speed limit in V/s (up and down), None: one v_ramp step per ramping_delay
+watchdog_timeout = 10    # Switch the output off if the instrument is not read for this many seconds, None: no watchdog
+on_compliance = "abort"  # In compliance for compliance_points readings in a row: "abort" (or "skip") ends the trace, "warn" or None
+compliance_points = 3    # Readings in compliance in a row that count as an anomaly
+on_overrange = "range"   # Reading over curr_range: "range" (next range), "abort", "warn" or None
+jump_sigma = None        # Flag a current change this many standard deviations off the recent ones (spikes, breakdown), None: off
+on_jump = "warn"         # Action on a jump: "abort", "warn" or None
 curr_comp = 3E-1         # Max Current which should be applied
 curr_range = 10E-6       # Current Range
 total_time = 75          # Total time for the measurement in seconds
+nplc = 1                 # Integration time per conversion in power line cycles (0.01 to 10)
+average_count = 1        # Conversions averaged by the instrument into every reading (1: filter off, max 100)
+long_run = False         # Long stability tests: keep only aggregates, spike events and the last raw_window seconds instead of every reading
+raw_window = 600         # Long run: seconds of raw readings kept in memory (for the plot) and saved at the end
+intervals = (1, 60)      # Long run: aggregation intervals in seconds, one file of mean/min/max/count each (at least one)
+spike_threshold = None   # Long run: save full-rate readings around currents this far (A) from the 1st-interval median, None: no events
+event_window = 5         # Long run: seconds saved before and after a spike
+data_format = "ASCII"   # Data transfer format: "ASCII", "REAL,64" or "SREAL" (binary, fewer bytes on the bus)
+file_format = "txt"     # Data file format: "txt", "csv", "bin" (append-only binary) or "h5" (HDF5, needs h5py)
+headless = False        # Run without a plot window (e.g. over SSH); pyqtgraph/Qt are not imported
+render_png = True       # Headless only: render the final plot offscreen and save it as .png
 verbose = True          # Do you want to display the data in real time? If yes, set to True.
+device = None           # Name of the device under test, recorded in the run catalog
+record_run = True       # Register the run (parameters, IDN, duration, files) in the run catalog runs.sqlite
+
+parameters = script_parameters(globals())  # The parameters above, for the run catalog
 
 
 ###############################################################################
 #########################    Main Program    ##################################
 
 # Set the Communication
-keithley = gpib.dev(0, keithley_address)  # use your GPIB address
-gpib.write(keithley, "*IDN?\n")
-keithley_byte = gpib.read(keithley, 1024)
-print(keithley_byte.decode('utf-8').strip())  # Print the identification string
-
-# Configure the Keithley 2400 for voltage sweep and current measurement: Manual_Page79
-gpib.write(keithley, "*RST")  # Reset the instrument
-gpib.write(keithley, ":SOUR:FUNC VOLT")  # Set source function to voltage
-gpib.write(keithley, ":TRACe:CLEar")     # Clear the buffer before the measurement
-gpib.write(keithley, ":SOUR:VOLT:MODE FIXED")
-gpib.write(keithley, f":SENSe:CURRent:PROTection {curr_comp}")    # Set current compliance (adjust as needed)
-gpib.write(keithley, f":SENS:CURR:RANG {curr_range}")
-gpib.write(keithley, ":SENS:FUNC 'CURR'")  # Set measure function to current
-
-
-# Enable output and start the sweep
-gpib.write(keithley, ":OUTP ON")
-
-if voltage > 0:
-    for i in np.arange(0, voltage+v_ramp, v_ramp):
-        gpib.write(keithley, f":SOUR:VOLT:LEV {i}")  # Set the voltage
-        time.sleep(ramping_delay)
-else:
-    for i in np.arange(0, voltage-v_ramp, -v_ramp):
-        gpib.write(keithley, f":SOUR:VOLT:LEV {i}")
-        time.sleep(ramping_delay)
-
-
-# Create a plot window using pyqtgraph
-# Set up the plotting window
-app = pg.QtWidgets.QApplication([])
-win = pg.QtWidgets.QMainWindow()
-win.setWindowTitle('Live Data Plotting with PyQtGraph')
-win.setGeometry(100, 100, 1200, 800)
-plot_widget = pg.PlotWidget()
-win.setCentralWidget(plot_widget)
-
-# Show right and top axis
-plot_widget.showAxis('right')
-plot_widget.showAxis('top')
-
-
-# Increase the font size of x and y labels and set axis/tick color to black
-font = pg.QtGui.QFont()
-font.setPointSize(18)
-for axis in ['left', 'bottom', 'right', 'top']:
-    ax = plot_widget.getAxis(axis)
-    if ax is not None:
-        ax.setTickFont(font)
-        ax.setPen(pg.mkPen(color='k', width=2))  # Axis line and ticks in black
-        ax.setTickPen(pg.mkPen(color='k', width=2))
-        ax.setTextPen(pg.mkPen(color='k'))       # Tick labels in black
-        ax.setLabel(ax.labelText, units=ax.labelUnits, **{'font-size': '18pt', 'color': 'k'})
-        if axis == 'left':
-            # Use a lambda to format y-axis ticks in scientific notation
-            ax.setStyle(autoExpandTextSpace=True, tickTextOffset=10, showValues=True)
-            ax.tickStrings = lambda values, scale, spacing: [f"{v:.2e}" for v in values]
-
-# Change the background color to white
-plot_widget.setBackground('w')
-
-# Add a legend to the plot
-legend = plot_widget.addLegend()
-legend.setBrush(pg.mkBrush(color=(10, 10, 10, 10)))
-
-# Set axis labels and title (no need to set size here, handled above)
-plot_widget.setLabel('left', 'Current (A)')
-plot_widget.setLabel('bottom', 'Time (s)')
-plot_widget.setTitle("<span style='font-size:24pt; color:k;'>I-t Measurement</span>")
-plot_widget.showGrid(x=False, y=False)
-if total_time <= 30:
-    plot_widget.setXRange(0, total_time, padding=0.1)  # Set x-axis range from 0 to total_time
+if simulate:
+    keithley = Keithley2400.simulated(realtime=True)
 else:
-    plot_widget.setXRange(0, 30, padding=0.1)
-
-# Remove tick labels from right and top axes (keep ticks but hide labels)
-right_axis = plot_widget.getAxis('right')
-top_axis = plot_widget.getAxis('top')
-
-# Store original ticks if needed
-original_right_tickStrings = right_axis.tickStrings 
-original_top_tickStrings = top_axis.tickStrings 
-
-# Override tickStrings to return empty strings for right and top axes
-right_axis.tickStrings = lambda values, scale, spacing: ['' for v in values]    
-top_axis.tickStrings = lambda values, scale, spacing: ['' for v in values]
-
-# Store the data
-curr_list = np.array([])
-time_list = np.array([])
-
-# Create plot items with different styles
-# Dataset 1: Red circles
-curve = plot_widget.plot(
-    time_list, curr_list,
-    pen=None,             # No line connecting points
-    symbol='o',           # Circle marker
-    symbolBrush='r',      # Red color for marker fill
-    symbolSize=8,
-    name='Current'
-)
+    keithley = Keithley2400.open(keithley_address)  # use your GPIB address
+idn = keithley.identify()
+print(idn)  # Print the identification string
+
+# Configure the Keithley 2400 for voltage sourcing and current measurement: Manual_Page79
+keithley.configure("VOLT", curr_comp, curr_range)
+keithley.set_data_format(data_format)
+with keithley.batch():
+    keithley.set_nplc(nplc)                  # Longer integration and averaging lower the noise and the reading rate
+    keithley.set_averaging(average_count)
+
+# Check every reading for compliance, over-range and jumps
+detector = AnomalyDetector(keithley, curr_range, on_compliance, compliance_points, on_overrange, jump_sigma, on_jump)
+
+# Ramp down on SIGTERM/SIGHUP as on Ctrl+C, and switch the output off if the measurement loop hangs
+handle_signals()
+keithley.set_slew_rate(ramp_rate)
+if watchdog_timeout is not None:
+    keithley.start_watchdog(watchdog_timeout)
+
+
+# Plot settings
+title, x_label, y_label = "I-t Measurement", "Time (s)", "Current (A)"
+
+# Store the data for the plot: column 0 is the time, column 1 the current.
+# In headless and long run mode the trace is only kept on disk, so memory does not grow with total_time.
+data_buffer = GrowableBuffer(2)
+first_time = None   # Time of the first and last reading and number of readings
+last_time = None
+n_points = 0
+
+if not headless:
+    from keithley2400 import plotting
+
+    # Set up the plotting window
+    app, win, plot_widget = plotting.create_plot_window(title, x_label, y_label)
+    if total_time <= 30:
+        plot_widget.setXRange(0, total_time, padding=0.1)  # Set x-axis range from 0 to total_time
+    else:
+        plot_widget.setXRange(0, 30, padding=0.1)
 
-#  Define the update function
-def update_plot(new_x, new_y):
-    # Use global to update the arrays outside the function
-    global time_list, curr_list
+    if long_run:
+        # Create plot item: red circles of the raw readings still in memory
+        curve = plotting.add_curve(plot_widget, 'r', 'Current')
+    else:
+        # Create plot item: red circles, a min/max line once the visible window holds too many points
+        curve = plotting.DecimatedCurve(plot_widget, data_buffer, 'r', 'Current')
+
+
+# Store a batch of (time, current) samples and stream them to the data file
+def store_samples(samples):
+    global first_time, last_time, n_points
+    if not headless and not long_run:
+        data_buffer.extend(samples)
+    writer.write(samples)
+    if first_time is None:
+        first_time = samples[0][0]
+    last_time = samples[-1][0]
+    n_points += len(samples)
+
+    # Print the data
+    if verbose:
+        for real_time, curr_data in samples:
+            print(f"Time: {real_time:.4f} s \t\t Current: {curr_data} A")
 
-    time_list = np.append(time_list, new_x)
-    curr_list = np.append(curr_list, new_y)
-    curve.setData(time_list, curr_list)
 
-    if np.max(time_list) <= 30:
+#  Define the update function
+def update_plot(samples):
+    # Store the batch and redraw once
+    store_samples(samples)
+    new_x = last_time
+
+    # Time only increases, so new_x is the latest time. Only the visible
+    # last 30 s (plus the 10% padding of the x range) are handed to the plot.
+    if new_x <= 30:
         plot_widget.setXRange(0, 30, padding=0.1)  # Set x-axis range from 0 to 30
     else:
-        plot_widget.setXRange(np.max(time_list)-30, np.max(time_list), padding=0.1)
+        plot_widget.setXRange(new_x-30, new_x, padding=0.1)
+    if long_run:
+        recent = writer.recent(33)
+        curve.setData(recent[:, 0], recent[:, 1])
+    else:
+        curve.refresh()
     plot_widget.update()
 
 
-# Show the plot window before starting the update loop
-win.show()
-pg.QtWidgets.QApplication.processEvents()
-
-# Start the measurement
-gpib.write(keithley, ":SYSTem:TIME:RESet")  # Start the measurement
-real_time = 0
-while total_time > real_time:
-    # Read the data, Convert to string, and split
-    data_bytes = gpib.read(keithley, 100)
-    try:
-        data_string = data_bytes.decode('utf-8')
-    except UnicodeDecodeError:
-        data_string = data_bytes.decode('ascii', errors='ignore') # Try ASCII, ignoring errors if needed
-    
-    data = data_string.split(",")
-    curr_data = float(data[1])
-    real_time = float(data[3])
-
-    # Update the plot data
-    update_plot(real_time, curr_data)
-
-    pg.QtWidgets.QApplication.processEvents()  # Ensure UI updates
-
-    # Print the data
-    if verbose:
-        print(f"Time: {real_time:.4f} s \t\t Current: {curr_data} A")
+# Define the measurement, it runs in its own thread and yields (time, current)
+def trace():
+    real_time = 0
+    while total_time > real_time:
+        reading = keithley.measure()
+        real_time = reading.time
+        if detector.check(voltage, reading):
+            continue  # Measured on a lower range, the next reading is on the new one
+        yield real_time, reading.current
+        if detector.skipped(voltage):
+            raise MeasurementAborted(f"Trace stopped at {real_time:.2f} s")
 
 
-# Calculate average time interval
-diff_time = np.diff(time_list)
-print(f"Average time interval: \t {np.mean(diff_time):.4f} seconds")
+# Show the plot window before starting the update loop
+if not headless:
+    plotting.show(win)
+
+# Start the measurement: the sample interval is set by the instrument, the plot redraws at a fixed rate.
+# The data is written to disk while the measurement runs.
+filename = timestamped_filename("current_time_data")
+if long_run:
+    # Aggregates per interval, spike events and the last raw_window seconds, memory stays bounded
+    writer = MultiResolutionStore(filename, file_format, raw_window, intervals, spike_threshold, event_window)
+else:
+    writer = open_writer(filename, "Time (s)\tCurrent (A)", file_format)
+if record_run:
+    catalog = RunCatalog()
+    run_id = catalog.start("it", idn, parameters, files=[writer.filename], device=device,
+                           address=None if simulate else keithley_address, source="VOLT",
+                           compliance=curr_comp, sense_range=curr_range)
+status = "completed"
+
+acquisition = AcquisitionThread(trace())
+try:
+    # Enable output and ramp up to the measurement voltage
+    keithley.output_on()
+    keithley.ramp(0, voltage, v_ramp, ramping_delay)
+
+    keithley.reset_timestamp()  # Start the measurement
+    acquisition.start()
+    if headless:
+        consume(acquisition, store_samples)
+    else:
+        plotting.run_live(acquisition, update_plot)
+
+except KeyboardInterrupt:
+    status = "interrupted"
+    print("\nMeasurement interrupted by user.")
+except MeasurementAborted as e:
+    status = "aborted"
+    print(f"Measurement aborted: {e}")
+except Exception as e:
+    status = "failed"
+    print(f"Error during measurement: {e}")
+finally:
+    # Stop the measurement thread and keep the samples it already took
+    acquisition.stop()
+    batch = acquisition.drain()
+    if batch:
+        store_samples(batch)
+    writer.close()
+
+    # Ramp the voltage back to zero from the last level set and turn off the output, however the measurement ended
+    keithley.shutdown(keithley.level, v_ramp, ramping_delay, verbose=verbose)
+    if record_run:
+        catalog.finish(run_id, n_points, status, files=writer.filenames if long_run else ())
+
+
+# Calculate average time interval (the mean of the time differences)
+if n_points > 1:
+    print(f"Average time interval: \t {(last_time - first_time) / (n_points - 1):.4f} seconds")
 
 # Print the Number of Data Points
-print(f"Number of data points: \t {len(curr_list)}")
-
-# Turn off the output
-gpib.write(keithley, ":OUTP OFF")
-
-# Close the connection
-gpib.close(keithley)
-
-# Save data using numpy
-data = np.column_stack((time_list, curr_list))
-# Save the data with timestamp
-timestamp = time.strftime("%Y%m%d-%H%M%S")
-filename = f"current_time_data_{timestamp}"
-np.savetxt(filename + ".txt", data, header="Time (s)\tCurrent (A)", delimiter="\t")
-
-# Save the plot to a file using export functionality from PlotItem
-exporter = pg.exporters.ImageExporter(plot_widget.plotItem)
-exporter.export(filename + ".png")
-
-print("The measurement was completed, the data was recorded and a graph was created.")
-
-# Add a crosshair and a label to show data coordinates on mouse hover
-vLine = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('g', width=1))
-hLine = pg.InfiniteLine(angle=0, movable=False, pen=pg.mkPen('g', width=1))
-plot_widget.addItem(vLine, ignoreBounds=True)
-plot_widget.addItem(hLine, ignoreBounds=True)
-coord_label = pg.TextItem("", anchor=(0,1), color='k')
-plot_widget.addItem(coord_label)
-
-def mouseMoved(evt):
-    pos = evt[0]  # using signal proxy turns original arguments into a tuple
-    if plot_widget.sceneBoundingRect().contains(pos):
-        mousePoint = plot_widget.plotItem.vb.mapSceneToView(pos)
-        x = mousePoint.x()
-        y = mousePoint.y()
-        vLine.setPos(x)
-        hLine.setPos(y)
-        # Find the closest data point in either curve
-        all_x = np.concatenate([time_list])
-        all_y = np.concatenate([curr_list])
-        if all_x.size > 0:
-            idx = (np.abs(all_x - x)).argmin()
-            x_nearest = all_x[idx]
-            y_nearest = all_y[idx]
-            coord_label.setText(f"t={x_nearest:.2f}, I={y_nearest:.2e}")
-            coord_label.setPos(x_nearest, y_nearest)
-        else:
-            coord_label.setText("")
-            
-proxy = pg.SignalProxy(plot_widget.scene().sigMouseMoved, rateLimit=60, slot=mouseMoved)
-
-# Create interactive window
-pg.QtWidgets.QApplication.instance().exec()
+print(f"Number of data points: \t {n_points}")
+
+if headless:
+    # Optionally draw the plot offscreen, no display needed
+    if render_png:
+        from keithley2400 import plotting
+        data = read_data(writer.filename)
+        plotting.render_png(filename, title, x_label, y_label,
+                            [(data[:, 0], data[:, 1], 'r', 'Current')])
+        if record_run:
+            catalog.add_file(run_id, filename + ".png")
+    print("The measurement was completed and the data was recorded.")
+else:
+    if long_run:
+        # Show the whole run as the means of the first interval
+        plot_widget.removeItem(curve)
+        data_buffer.extend(read_data(writer.filename)[:, :2])
+        curve = plotting.DecimatedCurve(plot_widget, data_buffer, 'r', f'Current ({intervals[0]} s mean)')
+
+    # Show the full trace and save the plot to a file
+    time_list = data_buffer.column(0)
+    curr_list = data_buffer.column(1)
+    if len(time_list):
+        plot_widget.setXRange(time_list[0], time_list[-1], padding=0.1)
+    curve.refresh()
+    plotting.export_png(plot_widget, filename)
+    if record_run:
+        catalog.add_file(run_id, filename + ".png")
+
+    print("The measurement was completed, the data was recorded and a graph was created.")
+
+    # Add a crosshair and a label to show data coordinates on mouse hover
+    proxy = plotting.add_crosshair(
+        plot_widget,
+        SortedIndex(time_list, curr_list),
+        lambda x, y: f"t={x:.2f}, I={y:.2e}",
+    )
+
+    # Create interactive window
+    plotting.exec_app()
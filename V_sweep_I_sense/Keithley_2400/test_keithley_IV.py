@@ -1,15 +1,25 @@
 #!/usr/bin/python
-import gpib
 import numpy as np
-import pyqtgraph as pg
-import pyqtgraph.exporters
 import time
 import os
-os.chdir(os.path.dirname(__file__))
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from keithley2400 import Keithley2400, GrowableBuffer, hysteresis_profile
+from keithley2400.sweep import AdaptiveSweep, noise_floor
+from keithley2400.ranging import CURRENT_RANGES, RangeManager
+from keithley2400.instrument import STB_MAV
+from keithley2400.acquisition import AcquisitionThread, consume
+from keithley2400.storage import timestamped_filename, open_writer
+from keithley2400.catalog import RunCatalog, script_parameters
+from keithley2400.nearest import GridIndex
+from keithley2400.safety import handle_signals
+from keithley2400.monitor import AnomalyDetector, MeasurementAborted
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 
 # Define the voltage sweep parameters
 keithley_address = 24    # GPIB address of the Keithley 2400
+simulate = False         # Use the simulated Keithley 2400 (1 MOhm resistor) instead of the GPIB instrument
 min_voltage = -5.0     # Start voltage in volts
 max_voltage = 5.0       # Stop voltage in volts
 step_voltage = 0.25       # Step size in volts 
@@ -17,286 +27,253 @@ delay = 0.05             # Delay between steps in seconds (min:0.05)
 curr_comp = 1.05         # Max Current which should be applied (min:1E-6 , max: 1.05A)
 curr_range = 1E-6         # Current Range (min:1E-6 , max: 1.05A)
 file_suffix = None       # File name suffix for saving data, if None, it will not be used
+sweep_mode = "point"     # "point": one write/read per step, "buffered": run the whole sweep on the instrument (max 2500 points), "pulsed": buffered sweep of short pulses, "adaptive": step follows the measured curve
+pulse_width = 0.005      # Pulsed sweep: seconds the source is on per point
+duty_cycle = 0.1         # Pulsed sweep: fraction of the time the source is on (pulse period = pulse_width / duty_cycle)
+measure_window = 0.002   # Pulsed sweep: seconds measured at the end of each pulse (at most pulse_width)
+min_step_voltage = 0.01  # Adaptive sweep: smallest step
+max_step_voltage = 0.5   # Adaptive sweep: largest step, used on straight and flat parts of the curve
+adaptive_target = 0.1    # Adaptive sweep: wanted deviation of log10|I| from a straight line per step
+ranging = "fixed"        # "fixed": curr_range for the whole sweep, "auto": instrument autorange, "managed": predicted and cached ranges, changed only when needed
+wait_mode = "sleep"      # "sleep": wait delay before each read, "srq": read as soon as the instrument requests service (delay becomes the instrument source delay)
+ramp_rate = None         # Speed limit (V/s) when ramping back to zero, None: one step_voltage per delay
+watchdog_timeout = 10    # Switch the output off if the instrument is not read for this many seconds, None: no watchdog
+on_compliance = "skip"   # In compliance for compliance_points readings in a row: "abort" the sweep, "skip" the rest of the branch, "warn" or None
+compliance_points = 3    # Readings in compliance in a row that count as an anomaly
+on_overrange = "range"   # Reading over the fixed curr_range: "range" (next range, measure again), "abort", "skip", "warn" or None
+jump_sigma = None        # Flag a point-to-point change of the current this many standard deviations off the recent ones, None: off
+on_jump = "abort"        # Action on a jump: "abort", "skip", "warn" or None
+data_format = "ASCII"    # Data transfer format: "ASCII", "REAL,64" or "SREAL" (binary, fewer bytes on the bus)
+file_format = "txt"      # Data file format: "txt", "csv", "bin" (append-only binary) or "h5" (HDF5, needs h5py)
+headless = False         # Run without a plot window (e.g. over SSH); pyqtgraph/Qt are not imported
+render_png = True        # Headless only: render the final plot offscreen and save it as .png
 verbose = False          # Do you want to display the data in real time? If yes, set to True.
+device = None            # Name of the device under test, recorded in the run catalog
+record_run = True        # Register the run (parameters, IDN, duration, files) in the run catalog runs.sqlite
+
+parameters = script_parameters(globals())  # The parameters above, for the run catalog
 
 
 ###############################################################################
 #########################    Main Program    ##################################
 
 # Set the Communication
-keithley = gpib.dev(0, keithley_address)  # use your GPIB address
-gpib.write(keithley, "*IDN?\n")
-keithley_byte = gpib.read(keithley, 1024)
-print(keithley_byte.decode('utf-8').strip())  # Print the identification string
-
+if simulate:
+    keithley = Keithley2400.simulated(realtime=True)
+else:
+    keithley = Keithley2400.open(keithley_address)  # use your GPIB address
+idn = keithley.identify()
+print(idn)  # Print the identification string
 
 # Configure the Keithley 2400 for voltage sweep and current measurement
-gpib.write(keithley, "*RST")  # Reset the instrument
-gpib.write(keithley, ":SOUR:FUNC VOLT")  # Set source function to voltage
-gpib.write(keithley, ":TRACe:CLEar")     # Clear the buffer before the measurement
-gpib.write(keithley, ":SOUR:VOLT:MODE FIXED")
-gpib.write(keithley, f":SENSe:CURRent:PROTection {curr_comp}")    # Set current compliance (adjust as needed)
-gpib.write(keithley, f":SENS:CURR:RANG {curr_range}")
-gpib.write(keithley, ":SENS:FUNC 'CURR'")  # Set measure function to current
-
+keithley.configure("VOLT", curr_comp, curr_range)
+keithley.set_data_format(data_format)
+
+# Select how the current range follows the measurement (a buffered or pulsed sweep cannot change ranges between points)
+range_manager = None
+if ranging == "auto" or (ranging == "managed" and sweep_mode in ("buffered", "pulsed")):
+    keithley.set_auto_range()
+elif ranging == "managed":
+    range_manager = RangeManager(keithley, step_voltage, initial_range=curr_range)
+
+# Check every reading of the point and adaptive sweeps for compliance, over-range and jumps
+detector = AnomalyDetector(keithley, curr_range if ranging == "fixed" else None, on_compliance, compliance_points,
+                           on_overrange, jump_sigma, on_jump)
+
+# Ramp down on SIGTERM/SIGHUP as on Ctrl+C, and switch the output off if the measurement loop hangs
+handle_signals()
+keithley.set_slew_rate(ramp_rate)
+if watchdog_timeout is not None:
+    keithley.start_watchdog(watchdog_timeout)
 
 # Enable output and start the sweep
-gpib.write(keithley, ":OUTP ON")
+keithley.output_on()
 
 
 # Create volt_list for the voltage sweep 0 to -min_voltage, -min_voltage to max_voltage, and max_voltage to 0
 # Round the data to 2 decimal places
-volt_list1 = np.arange(0, -min_voltage-step_voltage, -step_voltage)
-volt_list2 = np.arange(-min_voltage, max_voltage+step_voltage, step_voltage)
-volt_list3 = np.arange(max_voltage, 0-step_voltage, -step_voltage)
-volt_list = np.concatenate((volt_list1, volt_list2, volt_list3))
-
-# Round the volt_list to 2 decimal places
-volt_list = np.round(volt_list, 2)
+profile = hysteresis_profile(min_voltage, max_voltage, step_voltage, decimals=2)
+volt_list = profile.levels
 
 # Determine min and max voltage
 v_min = np.min(volt_list)
 v_max = np.max(volt_list)
 
+if sweep_mode == "adaptive":
+    # Same legs and labels, but the levels are chosen from the measured curve during the sweep
+    # Changes within the noise of the (lowest) current range count as flat
+    floor = noise_floor(curr_range if ranging == "fixed" else CURRENT_RANGES[0])
+    profile = AdaptiveSweep(min_voltage, max_voltage, min_step_voltage, max_step_voltage, adaptive_target,
+                            metric="log", floor=floor, decimals=2)
 
-# Set up the plotting window
-app = pg.QtWidgets.QApplication([])
-win = pg.QtWidgets.QMainWindow()
-win.setWindowTitle('Live Data Plotting with PyQtGraph')
-win.setGeometry(100, 100, 1200, 800)
-plot_widget = pg.PlotWidget()
-win.setCentralWidget(plot_widget)
-
-# Show right and top axis
-plot_widget.showAxis('right')
-plot_widget.showAxis('top')
-
-
-# Increase the font size of x and y labels and set axis/tick color to black
-font = pg.QtGui.QFont()
-font.setPointSize(18)
-for axis in ['left', 'bottom', 'right', 'top']:
-    ax = plot_widget.getAxis(axis)
-    if ax is not None:
-        ax.setTickFont(font)
-        ax.setPen(pg.mkPen(color='k', width=2))  # Axis line and ticks in black
-        ax.setTickPen(pg.mkPen(color='k', width=2))
-        ax.setTextPen(pg.mkPen(color='k'))       # Tick labels in black
-        ax.setLabel(ax.labelText, units=ax.labelUnits, **{'font-size': '18pt', 'color': 'k'})
-        if axis == 'left':
-            # Use a lambda to format y-axis ticks in scientific notation
-            ax.setStyle(autoExpandTextSpace=True, tickTextOffset=10, showValues=True)
-            ax.tickStrings = lambda values, scale, spacing: [f"{v:.2e}" for v in values]
-
-# Change the background color to white
-plot_widget.setBackground('w')
-
-# Add a legend to the plot
-legend = plot_widget.addLegend()
-legend.setBrush(pg.mkBrush(color=(10, 10, 10, 10)))
-
-# Set axis labels and title (no need to set size here, handled above)
-plot_widget.setLabel('left', 'Current (A)')
-plot_widget.setLabel('bottom', 'Voltage (V)')
-plot_widget.setTitle("<span style='font-size:24pt; color:k;'>I-V Measurement</span>")
-plot_widget.showGrid(x=False, y=False)
-plot_widget.setXRange(v_min + v_min*0.05, v_max*1.05)
-
-
-# Remove tick labels from right and top axes (keep ticks but hide labels)
-right_axis = plot_widget.getAxis('right')
-top_axis = plot_widget.getAxis('top')
-
-# Store original ticks if needed
-original_right_tickStrings = right_axis.tickStrings 
-original_top_tickStrings = top_axis.tickStrings 
-
-# Override tickStrings to return empty strings for right and top axes
-right_axis.tickStrings = lambda values, scale, spacing: ['' for v in values]    
-top_axis.tickStrings = lambda values, scale, spacing: ['' for v in values]
-
-# Initialize data arrays
-x_data1 = np.array([])
-y_data1 = np.array([])
-
-x_data2 = np.array([])
-y_data2 = np.array([])
-
-# Create plot items with different styles
-# Dataset 1: Red circles
-curve1 = plot_widget.plot(
-    x_data1, y_data1,
-    pen=None,             # No line connecting points
-    symbol='o',           # Circle marker
-    symbolBrush='r',      # Red color for marker fill
-    symbolSize=8,
-    name='Forward'
-)
-
-# Dataset 2: Blue squares
-curve2 = plot_widget.plot(
-    x_data2, y_data2,
-    pen=None,             # No line connecting points
-    symbol='o',           # Square marker
-    symbolBrush='b',      # Blue color for marker fill
-    symbolSize=8,
-    name='Backward'
-)
 
+# Plot settings
+x_range = (v_min + v_min*0.05, v_max*1.05)
+title, x_label, y_label = "I-V Measurement", "Voltage (V)", "Current (A)"
 
-# --- 5. Define the update function ---
-def update_plot(new_x, new_y, direction):
-    # Use global to update the arrays outside the function
-    global x_data1, y_data1, x_data2, y_data2
-
-    if direction == "forward":
-        x_data1 = np.append(x_data1, new_x)
-        y_data1 = np.append(y_data1, new_y)
-        curve1.setData(x_data1, y_data1)
-    else:
-        x_data2 = np.append(x_data2, new_x)
-        y_data2 = np.append(y_data2, new_y)
-        curve2.setData(x_data2, y_data2)
+# Initialize data buffers: column 0 is x, column 1 is y
+data1 = GrowableBuffer(2)  # Forward
+data2 = GrowableBuffer(2)  # Backward
 
-    plot_widget.setXRange(v_min + v_min*0.05, v_max*1.05)
-    plot_widget.update()
+if not headless:
+    from keithley2400 import plotting
 
-# Show the plot window before starting the update loop
-win.show()
-pg.QtWidgets.QApplication.processEvents()
+    # Set up the plotting window
+    app, win, plot_widget = plotting.create_plot_window(title, x_label, y_label)
+    plot_widget.setXRange(*x_range)
 
+    # Create plot items: Forward in red, Backward in blue
+    curve1 = plotting.add_curve(plot_widget, 'r', 'Forward')
+    curve2 = plotting.add_curve(plot_widget, 'b', 'Backward')
 
-# Perform the sweep and measure current
-voltages = np.zeros(len(volt_list))
-currents = np.zeros(len(volt_list))
 
-try:
-    for i, voltage in enumerate(volt_list):
-        gpib.write(keithley, f":SOUR:VOLT:LEV {voltage}")  # Set the voltage
-        time.sleep(delay)  # Wait for the measurement to stabilize
-        
-        # Read the data, Convert to string, and split
-        data_bytes = gpib.read(keithley, 100)
-        try:
-            data_string = data_bytes.decode('utf-8')
-        except UnicodeDecodeError:
-            data_string = data_bytes.decode('ascii', errors='ignore') # Try ASCII, ignoring errors if needed
-
-        data = data_string.split(",")
-        curr_data = float(data[1])
-        volt_data = float(data[0])
-
-        # Store the data
-        voltages[i] = volt_data
-        currents[i] = curr_data
-
-        # Update the plot with the new data
-        if i < len(volt_list1):  # Backward voltage
-            update_plot(volt_data, curr_data, "backward")
-        elif i < len(volt_list1) + len(volt_list2):  # Forward voltage
-            update_plot(volt_data, curr_data, "forward")
-        else:  # Backward voltage again
-            update_plot(volt_data, curr_data, "backward")
-        
-        pg.QtWidgets.QApplication.processEvents()  # Ensure UI updates
+# Store a batch of (index, voltage, current) samples and stream them to the data file
+def store_samples(samples):
+    for i, volt_data, curr_data in samples:
+        if profile.direction(i) == "forward":
+            data1.append(volt_data, curr_data)
+        else:
+            data2.append(volt_data, curr_data)
 
         # Print the data if verbose is True
         if verbose:
             print(f" Voltage: {volt_data} V \t Current: {curr_data} A")
 
+    writer.write([sample[1:] for sample in samples])
+
+
+# --- 5. Define the update function ---
+def update_plot(samples):
+    # Store the batch and redraw once
+    store_samples(samples)
+    curve1.setData(data1.column(0), data1.column(1))
+    curve2.setData(data2.column(0), data2.column(1))
+    plot_widget.setXRange(*x_range)
+    plot_widget.update()
+
+
+# Set the voltage, wait for the device to settle and read one point
+def read_point(voltage):
+    keithley.set_level(voltage)  # Set the voltage
+
+    # Read the data
+    if wait_mode == "srq":
+        return keithley.measure_when_ready()
+    time.sleep(delay)  # Wait for the measurement to stabilize
+    return keithley.measure()
+
+
+# Read one point on the right range and return it as (voltage, current)
+def measure_point(voltage):
+    while True:
+        if range_manager is not None:
+            reading = range_manager.measure(voltage, lambda: read_point(voltage))
+        else:
+            reading = read_point(voltage)
+        if not detector.check(voltage, reading):
+            break
+    return reading.voltage, reading.current
+
+
+# Define the measurement, it runs in its own thread and yields (index, voltage, current)
+def sweep():
+    if sweep_mode == "buffered":
+        # Run the whole sweep on the instrument and read every reading back in one transfer
+        data = keithley.buffered_sweep(volt_list, delay, use_srq=(wait_mode == "srq"))
+        for i, row in enumerate(data):
+            yield i, row[0], row[1]
+    elif sweep_mode == "pulsed":
+        # The same on the instrument, but the source is only on for pulse_width per point to limit self-heating
+        data = keithley.pulsed_sweep(volt_list, pulse_width, duty_cycle, measure_window, use_srq=(wait_mode == "srq"))
+        for i, row in enumerate(data):
+            yield i, row[0], row[1]
+    else:
+        if wait_mode == "srq":
+            # The instrument settles for delay, measures and then requests service
+            keithley.set_source_delay(delay)
+            keithley.enable_srq(STB_MAV)
+        if sweep_mode == "adaptive":
+            yield from profile.run(measure_point, detector.bounds)
+        else:
+            for i, voltage in enumerate(volt_list):
+                if detector.skipped(voltage):
+                    continue  # Branch skipped after an anomaly
+                yield (i, *measure_point(voltage))
+
+# Show the plot window before starting the update loop
+if not headless:
+    plotting.show(win)
+
+
+# Perform the sweep and measure current, the data is written to disk while the sweep runs
+filename = timestamped_filename("voltage_sweep_data", file_suffix)
+writer = open_writer(filename, "Voltage (V)\tCurrent (A)", file_format)
+update = store_samples if headless else update_plot
+
+# Register the run in the catalog, its outcome is recorded when the sweep ends
+if record_run:
+    catalog = RunCatalog()
+    run_id = catalog.start("iv", idn, parameters, files=[writer.filename], device=device,
+                           address=None if simulate else keithley_address, source="VOLT",
+                           compliance=curr_comp, sense_range=curr_range, step=step_voltage, delay=delay)
+status = "completed"
+
+acquisition = AcquisitionThread(sweep())
+try:
+    acquisition.start()
+    if headless:
+        consume(acquisition, update)
+    else:
+        plotting.run_live(acquisition, update)  # Redraws at a fixed rate until the sweep is done
+
 except KeyboardInterrupt:
+    status = "interrupted"
     print("\nMeasurement interrupted by user.")
+except MeasurementAborted as e:
+    status = "aborted"
+    print(f"Measurement aborted: {e}")
 except Exception as e:
+    status = "failed"
     print(f"Error during measurement: {e}")
 finally:
-    # Ensure voltage is ramped to zero regardless of how the loop exits
-    print("Ramping voltage back to zero...")
-    try:
-        # Get the current voltage from the last successful measurement
-        if 'volt_data' in locals():
-            current_voltage = volt_data
-        else:
-            current_voltage = 0  # Default to 0 if no measurement was completed
-            
-        if abs(current_voltage) > 0.01:  # Only ramp if voltage is not already close to zero
-            ramp_steps = max(int(abs(current_voltage) / step_voltage), 1)
-            ramp_voltages = np.linspace(current_voltage, 0, ramp_steps + 1)[1:]  # Exclude current voltage
-            
-            for ramp_voltage in ramp_voltages:
-                gpib.write(keithley, f":SOUR:VOLT:LEV {ramp_voltage}")
-                time.sleep(delay)
-                if verbose:
-                    print(f"Ramping voltage: {ramp_voltage:.2f} V")
-        
-        # Final set to exactly zero
-        gpib.write(keithley, ":SOUR:VOLT:LEV 0")
-        time.sleep(delay)
-        print("Voltage ramped to zero.")
-        
-        # Turn off the output
-        gpib.write(keithley, ":OUTP OFF")
-        
-    except Exception as e:
-        print(f"Error during voltage ramp: {e}")
-        # Still try to turn off output even if ramping fails
-        try:
-            gpib.write(keithley, ":OUTP OFF")
-        except:
-            pass
-    
-    # Close the connection
-    try:
-        gpib.close(keithley)
-    except:
-        pass
-
-
-# Save data using numpy
-data = np.column_stack((voltages, currents))
-# Save the data with timestamp
-timestamp = time.strftime("%Y%m%d-%H%M%S")
-if file_suffix:
-    filename = f"voltage_sweep_data_{timestamp}_{file_suffix}"
+    # Stop the measurement thread and keep the samples it already took
+    acquisition.stop()
+    batch = acquisition.drain()
+    if batch:
+        update(batch)
+    writer.close()
+
+    # Ensure the voltage is ramped to zero from the last level set and the output is off regardless of how the loop exits
+    keithley.shutdown(keithley.level, step_voltage, delay, verbose=verbose)
+    if record_run:
+        catalog.finish(run_id, writer.rows_written, status)
+
+
+if headless:
+    # Optionally draw the plot offscreen, no display needed
+    if render_png:
+        from keithley2400 import plotting
+        plotting.render_png(filename, title, x_label, y_label, [
+            (data1.column(0), data1.column(1), 'r', 'Forward'),
+            (data2.column(0), data2.column(1), 'b', 'Backward'),
+        ], x_range)
+        if record_run:
+            catalog.add_file(run_id, filename + ".png")
+    print("Sweep completed and data saved.")
 else:
-    filename = f"voltage_sweep_data_{timestamp}"
-np.savetxt(filename + ".txt", data, header="Voltage (V)\tCurrent (A)", delimiter="\t")
-
-# Save the plot to a file using export functionality from PlotItem
-exporter = pg.exporters.ImageExporter(plot_widget.plotItem)
-exporter.export(filename + ".png")
-
-print("Sweep completed, data saved, and plot generated.")
-
-# Add a crosshair and a label to show data coordinates on mouse hover
-vLine = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('g', width=1))
-hLine = pg.InfiniteLine(angle=0, movable=False, pen=pg.mkPen('g', width=1))
-plot_widget.addItem(vLine, ignoreBounds=True)
-plot_widget.addItem(hLine, ignoreBounds=True)
-coord_label = pg.TextItem("", anchor=(0,1), color='k')
-plot_widget.addItem(coord_label)
-
-def mouseMoved(evt):
-    pos = evt[0]  # using signal proxy turns original arguments into a tuple
-    if plot_widget.sceneBoundingRect().contains(pos):
-        mousePoint = plot_widget.plotItem.vb.mapSceneToView(pos)
-        x = mousePoint.x()
-        y = mousePoint.y()
-        vLine.setPos(x)
-        hLine.setPos(y)
-        # Find the closest data point in either curve
-        all_x = np.concatenate([x_data1, x_data2])
-        all_y = np.concatenate([y_data1, y_data2])
-        if all_x.size > 0:
-            idx = (np.abs(all_x - x)).argmin()
-            x_nearest = all_x[idx]
-            y_nearest = all_y[idx]
-            coord_label.setText(f"V={x_nearest:.2f}, I={y_nearest:.2e}")
-            coord_label.setPos(x_nearest, y_nearest)
-        else:
-            coord_label.setText("")
-            
-proxy = pg.SignalProxy(plot_widget.scene().sigMouseMoved, rateLimit=60, slot=mouseMoved)
-
-# Create interactive window
-pg.QtWidgets.QApplication.instance().exec()
-
+    # Save the plot to a file
+    plotting.export_png(plot_widget, filename)
+    if record_run:
+        catalog.add_file(run_id, filename + ".png")
+
+    print("Sweep completed, data saved, and plot generated.")
+
+    # Add a crosshair and a label to show data coordinates on mouse hover
+    proxy = plotting.add_crosshair(
+        plot_widget,
+        GridIndex(np.concatenate([data1.column(0), data2.column(0)]), np.concatenate([data1.column(1), data2.column(1)])),
+        lambda x, y: f"V={x:.2f}, I={y:.2e}",
+    )
+
+    # Create interactive window
+    plotting.exec_app()
@@ -0,0 +1,25 @@
+"""Shared driver for the Keithley 2400 SourceMeter measurement scripts.
+
+The plotting helpers live in :mod:`keithley2400.plotting` and are not imported
+here, so the driver can be used without pyqtgraph/Qt.
+"""
+from .buffer import GrowableBuffer
+from .instrument import Keithley2400, Reading, parse_binary, parse_readings
+from .simulator import Diode, NoisyLeakage, Resistor, SimulatedTransport
+from .sweep import SweepProfile, hysteresis_profile
+from .transport import GpibTransport
+
+__all__ = [
+    "GrowableBuffer",
+    "Keithley2400",
+    "Reading",
+    "parse_binary",
+    "parse_readings",
+    "Diode",
+    "NoisyLeakage",
+    "Resistor",
+    "SimulatedTransport",
+    "SweepProfile",
+    "hysteresis_profile",
+    "GpibTransport",
+]
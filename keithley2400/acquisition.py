@@ -0,0 +1,89 @@
+"""Run the instrument loop in its own thread, decoupled from the GUI."""
+from __future__ import annotations
+
+import queue
+import threading
+
+
+class AcquisitionThread(threading.Thread):
+    """Consume a sample generator in a background thread.
+
+    ``samples`` is any iterable that talks to the instrument and yields one
+    sample (e.g. a tuple of floats) per reading. Every sample is pushed into a
+    ``queue.SimpleQueue`` so the consumer (live plot, writer) can fetch them in
+    batches with :meth:`drain` without ever blocking the instrument loop.
+
+    An exception raised by the generator stops the thread and is kept in
+    ``error``; the caller re-raises it after the thread has finished. A
+    generator is closed when the thread ends, so its ``finally`` blocks (e.g.
+    a ramp down) run in this thread also when it was stopped early.
+    """
+
+    def __init__(self, samples):
+        super().__init__(daemon=True)
+        self.samples = samples
+        self.queue = queue.SimpleQueue()
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        try:
+            for sample in self.samples:
+                self.queue.put(sample)
+                if self._stop_event.is_set():
+                    break
+        except BaseException as e:
+            self.error = e
+        finally:
+            close = getattr(self.samples, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except BaseException as e:
+                    self.error = self.error or e
+
+    def stop(self) -> None:
+        """Ask the generator to stop after the current sample and wait for it."""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+    @property
+    def stopped(self) -> bool:
+        """Whether :meth:`stop` was called."""
+        return self._stop_event.is_set()
+
+    def drain(self) -> list:
+        """Return all samples queued since the last call (possibly none)."""
+        batch = []
+        try:
+            while True:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def raise_error(self) -> None:
+        """Re-raise an exception from the acquisition in the calling thread."""
+        if self.error is not None:
+            raise self.error
+
+
+def consume(acquisition, update, period: float = 0.05, idle=None) -> None:
+    """Pass queued samples to ``update`` in batches until ``acquisition`` ends.
+
+    Every ``period`` seconds the queue is drained and handed to ``update`` as
+    one batch, then ``idle`` is called (e.g. to let Qt redraw). An error in the
+    acquisition is re-raised once all samples have been consumed.
+    """
+    while acquisition.is_alive():
+        acquisition.join(period)  # Wait one period, or less if the acquisition ends
+        batch = acquisition.drain()
+        if batch:
+            update(batch)
+        if idle is not None:
+            idle()
+    batch = acquisition.drain()
+    if batch:
+        update(batch)
+    acquisition.raise_error()
@@ -0,0 +1,171 @@
+"""asyncio front end of the driver with pipelined bus access.
+
+linux-gpib calls block, so :class:`AsyncTransport` runs them in one worker
+thread: the calls keep their order on the bus, the event loop stays free while
+the bus waits, and the GIL is released inside the C library. On top of it
+:class:`AsyncKeithley2400` offers ``await inst.query(...)`` and a pipelined
+:meth:`~AsyncKeithley2400.sweep` that sends the next source level while the
+previous reading is parsed and handed on.
+
+One event loop can then drive the acquisition, a live plot feed and a network
+endpoint::
+
+    async def main():
+        inst = AsyncKeithley2400.open(24)
+        print(await inst.identify())
+        await inst.run(inst.instrument.configure, "VOLT", 1.05, 1E-6)
+        await inst.run(inst.instrument.output_on)
+        async for i, reading in inst.sweep(profile.levels, delay=0.05):
+            ...
+        await inst.run(inst.instrument.shutdown, reading.voltage)
+
+    asyncio.run(main())
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrument import STB_MAV, STB_RQS, Keithley2400, Reading, decode
+
+
+class AsyncTransport:
+    """Awaitable wrapper around a blocking transport.
+
+    All calls run in a single worker thread, in the order they were issued,
+    so several coroutines can share the instrument without interleaving a
+    write between another coroutine's write and read.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpib")
+
+    async def call(self, function, *args):
+        """Run ``function(*args)`` in the bus thread and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def write(self, command: str) -> None:
+        await self.call(self.transport.write, command)
+
+    async def read(self, length: int = 100) -> bytes:
+        return await self.call(self.transport.read, length)
+
+    async def serial_poll(self) -> int:
+        return await self.call(self.transport.serial_poll)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.transport.close()
+
+
+class AsyncKeithley2400:
+    """asyncio interface to a :class:`Keithley2400`.
+
+    Measurement I/O has native coroutines; any other driver method (setup,
+    ramps, shutdown) can be run in the bus thread with :meth:`run`.
+    """
+
+    def __init__(self, instrument: Keithley2400):
+        self.instrument = instrument
+        self.transport = AsyncTransport(instrument.transport)
+
+    @classmethod
+    def open(cls, address: int, board: int = 0) -> "AsyncKeithley2400":
+        return cls(Keithley2400.open(address, board))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def run(self, method, *args, **kwargs):
+        """Run a blocking driver method, e.g. ``await inst.run(inst.instrument.output_on)``."""
+        return await self.transport.call(lambda: method(*args, **kwargs))
+
+    async def write(self, command: str) -> None:
+        await self.transport.write(command)
+
+    async def read(self, length: int = 100) -> bytes:
+        return await self.transport.read(length)
+
+    async def query(self, command: str, length: int = 1024) -> str:
+        # One bus call, so no other coroutine gets between the write and the read
+        def query():
+            self.transport.transport.write(command)
+            return self.transport.transport.read(length)
+        return decode(await self.transport.call(query)).strip()
+
+    async def identify(self) -> str:
+        return await self.query("*IDN?\n")
+
+    async def set_level(self, level: float) -> None:
+        await self.write(f":SOUR:{self.instrument.source}:LEV {level}")
+        self.instrument.level = level
+
+    async def read_readings(self, n: int = 1):
+        """Read ``n`` readings as an (n, 5) array; parsing runs on the event loop."""
+        return self.instrument.parse(await self.read(self.instrument.readings_length(n)))
+
+    async def measure(self) -> Reading:
+        return Reading(*map(float, (await self.read_readings())[0]))
+
+    async def wait_for_service(self, timeout: float = 10.0, poll_interval: float = 0.001) -> int:
+        """Serial poll until the instrument requests service, yielding to the loop in between."""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = await self.transport.serial_poll()
+            if status & STB_RQS:
+                return status
+            if time.monotonic() > deadline:
+                raise TimeoutError("Instrument did not request service in time")
+            await asyncio.sleep(poll_interval)
+
+    async def measure_when_ready(self, timeout: float = 10.0) -> Reading:
+        """Trigger a reading with :READ? and fetch it once the instrument requests service.
+
+        Needs ``enable_srq(STB_MAV)``, see :meth:`Keithley2400.measure_when_ready`.
+        """
+        await self.write(":READ?")
+        await self.wait_for_service(timeout)
+        return await self.measure()
+
+    async def sweep(self, levels, delay: float, use_srq: bool = False):
+        """Step through ``levels`` and yield ``(index, Reading)`` for every point.
+
+        The command for the next level is queued on the bus as soon as the raw
+        reading has arrived, so it is sent while this reading is parsed and
+        processed by the caller. The settling time is awaited with
+        ``asyncio.sleep`` (or, with ``use_srq``, is the instrument's source
+        delay), so the event loop keeps serving other tasks.
+        """
+        levels = list(levels)
+        if not levels:
+            return
+        if use_srq:
+            await self.run(self.instrument.set_source_delay, delay)
+            await self.run(self.instrument.enable_srq, STB_MAV)
+        length = self.instrument.readings_length()
+        pending = asyncio.ensure_future(self.set_level(levels[0]))
+        try:
+            for i in range(len(levels)):
+                await pending
+                if use_srq:
+                    await self.write(":READ?")
+                    await self.wait_for_service()
+                else:
+                    await asyncio.sleep(delay)  # Wait for the measurement to stabilize
+                data = await self.read(length)
+                if i + 1 < len(levels):
+                    # Pipeline: the next level goes out while this reading is decoded
+                    pending = asyncio.ensure_future(self.set_level(levels[i + 1]))
+                yield i, Reading(*map(float, self.instrument.parse(data)[0]))
+        finally:
+            if not pending.done():
+                await pending
+
+    def close(self) -> None:
+        self.transport.close()
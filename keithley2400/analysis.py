@@ -0,0 +1,265 @@
+"""Post-processing of saved measurement files into one summary table.
+
+The data files of the scripts (``voltage_sweep_data_*``, ``current_sweep_data_*``
+and ``current_time_data_*``, in any of the formats of
+:mod:`keithley2400.storage`) are loaded and analysed in a process pool, and one
+row of metrics per file is written to a columnar summary:
+
+* ``resistance``: slope of a linear fit of V against I (Ohm)
+* ``hysteresis_area``: area between the forward and the backward branch,
+  ``∫ |y_forward - y_backward| dx`` over the source levels both cover (V·A)
+* ``on_off_ratio``: larger over smaller ``|y|`` of the two branches at the
+  source level ``read_level`` (default: half of the largest level)
+* ``threshold_voltage``: voltage at which ``|I|`` first reaches
+  ``threshold_current`` on the positive part of the forward leg
+* ``drift_slope``: slope of a linear fit of I against t (A/s), I-t files only
+
+The forward and backward branches are the legs of
+:func:`keithley2400.sweep.hysteresis_profile` (0 -> min and max -> 0 are
+backward, min -> max is forward), recovered from the saved source column with
+:func:`~keithley2400.sweep.split_legs`. Overflow readings are ignored. ::
+
+    python -m keithley2400.analysis V_sweep_I_sense/Keithley_2400 --output summary.csv
+
+The summary is a ``.csv`` file, or a ``.parquet`` file (needs ``pyarrow``).
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .instrument import OVERFLOW
+from .storage import FILE_FORMATS, read_data
+from .sweep import split_legs
+
+
+# File name prefix of each measurement script and the kind of data it saves
+KINDS = {
+    "voltage_sweep_data": "iv",   # Voltage (V), Current (A)
+    "current_sweep_data": "vi",   # Current (A), Voltage (V)
+    "current_time_data": "it",    # Time (s), Current (A)
+}
+
+# Names of the extra files of a long run of the I-t script (keithley2400.longrun): the
+# aggregate tiers (_1s, _60s), spike events and the raw tail are not complete I-t traces.
+# The script names them after timestamped_filename("current_time_data") without a suffix,
+# so sweeps and other traces whose own suffix is e.g. "raw" or "2s" are not matched
+_LONG_RUN_FILE = re.compile(r"current_time_data_\d{8}-\d{6}_([0-9.e+-]+s|events|raw)")
+
+# Columns of the summary, in order
+COLUMNS = ("file", "kind", "points", "resistance", "hysteresis_area", "on_off_ratio",
+           "threshold_voltage", "drift_slope", "mean_current", "duration", "error")
+
+
+def kind_of(path: str) -> str | None:
+    """Kind of data (``"iv"``, ``"vi"``, ``"it"``) from the file name, None if unknown.
+
+    The aggregate, event and raw files of a long run are not plain I-t
+    traces and have no kind either (see :func:`is_long_run_file`).
+    """
+    name = os.path.basename(path)
+    if is_long_run_file(name):
+        return None
+    for prefix, kind in KINDS.items():
+        if name.startswith(prefix):
+            return kind
+    return None
+
+
+def is_long_run_file(path: str) -> bool:
+    """Whether ``path`` is an aggregate, event or raw file written by a long I-t run."""
+    return _LONG_RUN_FILE.fullmatch(os.path.splitext(os.path.basename(path))[0]) is not None
+
+
+def find_files(paths) -> list[str]:
+    """Data files given directly or found (recursively) in the given directories.
+
+    The long-run files found in the directories are skipped, with a note on stderr.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for prefix in KINDS:
+                for extension in FILE_FORMATS:
+                    files += glob.glob(os.path.join(path, "**", f"{prefix}_*.{extension}"), recursive=True)
+        else:
+            files.append(path)
+    skipped = {file for file in files if is_long_run_file(file) and file not in paths}
+    for file in sorted(skipped):
+        print(f"Skipped {file}: long run aggregate, event or raw file", file=sys.stderr)
+    return sorted(set(files) - skipped)
+
+
+def fit_slope(x, y) -> float:
+    """Least squares slope of ``y`` against ``x``."""
+    if len(x) < 2:
+        return np.nan
+    dx = x - x.mean()
+    denominator = np.dot(dx, dx)
+    return float(np.dot(dx, y - y.mean()) / denominator) if denominator > 0 else np.nan
+
+
+def _branch(x, y):
+    """Sort a branch by x for interpolation."""
+    order = np.argsort(x, kind='stable')
+    return x[order], y[order]
+
+
+def hysteresis_area(forward, backward) -> float:
+    """Area between two branches ``(x, y)`` over the x range both cover."""
+    (xf, yf), (xb, yb) = _branch(*forward), _branch(*backward)
+    if len(xf) < 2 or len(xb) < 2:
+        return np.nan
+    inside = (xf >= xb[0]) & (xf <= xb[-1])
+    if inside.sum() < 2:
+        return np.nan
+    x = xf[inside]
+    gap = np.abs(yf[inside] - np.interp(x, xb, yb))
+    return float(np.sum((gap[1:] + gap[:-1]) * np.diff(x)) / 2)
+
+
+def on_off_ratio(forward, backward, level: float) -> float:
+    """Ratio of the larger to the smaller ``|y|`` of the two branches at source ``level``."""
+    (xf, yf), (xb, yb) = _branch(*forward), _branch(*backward)
+    if not len(xf) or not len(xb) or not (xf[0] <= level <= xf[-1] and xb[0] <= level <= xb[-1]):
+        return np.nan
+    a, b = abs(np.interp(level, xf, yf)), abs(np.interp(level, xb, yb))
+    return float(max(a, b) / min(a, b)) if min(a, b) > 0 else np.inf
+
+
+def threshold_voltage(voltage, current, threshold: float) -> float:
+    """First voltage above 0 at which ``|current|`` reaches ``threshold`` (interpolated)."""
+    positive = voltage >= 0
+    voltage, current = voltage[positive], np.abs(current[positive])
+    above = np.flatnonzero(current >= threshold)
+    if not len(above):
+        return np.nan
+    i = above[0]
+    if i == 0 or current[i] == current[i - 1]:
+        return float(voltage[i])
+    return float(np.interp(threshold, (current[i - 1], current[i]), (voltage[i - 1], voltage[i])))
+
+
+def analyze_sweep(data, kind: str, threshold_current: float = 1e-6, read_level: float | None = None) -> dict:
+    """Metrics of one I-V (``kind="iv"``) or V-I (``"vi"``) sweep, columns source and sensed."""
+    x, y = data[:, 0], data[:, 1]
+    first, second, third = split_legs(x)
+    legs = np.repeat([0, 1, 2], (first, second, third))
+    valid = (np.abs(x) < OVERFLOW) & (np.abs(y) < OVERFLOW)
+    forward = valid & (legs == 1)
+    backward = valid & (legs != 1)
+    voltage, current = (x, y) if kind == "iv" else (y, x)
+
+    if read_level is None:
+        read_level = 0.5 * np.max(x[valid]) if valid.any() else np.nan
+    return {
+        "points": len(x),
+        "resistance": fit_slope(current[valid], voltage[valid]),
+        "hysteresis_area": hysteresis_area((x[forward], y[forward]), (x[backward], y[backward])),
+        "on_off_ratio": on_off_ratio((x[forward], y[forward]), (x[backward], y[backward]), read_level),
+        "threshold_voltage": threshold_voltage(voltage[forward], current[forward], threshold_current),
+        "mean_current": float(np.mean(current[valid])) if valid.any() else np.nan,
+    }
+
+
+def analyze_trace(data) -> dict:
+    """Metrics of one I-t trace, columns time and current."""
+    t, current = data[:, 0], data[:, 1]
+    valid = np.abs(current) < OVERFLOW
+    return {
+        "points": len(t),
+        "drift_slope": fit_slope(t[valid], current[valid]),
+        "mean_current": float(np.mean(current[valid])) if valid.any() else np.nan,
+        "duration": float(t[-1] - t[0]) if len(t) else np.nan,
+    }
+
+
+def analyze_file(path: str, threshold_current: float = 1e-6, read_level: float | None = None) -> dict:
+    """One summary row for a data file; a file that cannot be analysed gets an ``error``."""
+    row = dict.fromkeys(COLUMNS, np.nan)
+    row.update(file=path, kind=kind_of(path), error="")
+    try:
+        data = read_data(path)
+        if row["kind"] == "it":
+            row.update(analyze_trace(data))
+        elif row["kind"] in ("iv", "vi"):
+            row.update(analyze_sweep(data, row["kind"], threshold_current, read_level))
+        else:
+            raise ValueError("unknown file name prefix or long run aggregate/event file")
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def _analyze(arguments):
+    return analyze_file(*arguments)
+
+
+def analyze_files(files, workers: int | None = None, threshold_current: float = 1e-6,
+                  read_level: float | None = None) -> dict:
+    """Analyse ``files`` in a process pool; returns the summary as ``{column: list}``.
+
+    The files are handed to the workers in chunks, so thousands of small files
+    cost a few inter-process messages per worker rather than one per file.
+    """
+    files = list(files)
+    workers = workers or os.cpu_count() or 1
+    arguments = [(path, threshold_current, read_level) for path in files]
+    summary = {column: [] for column in COLUMNS}
+
+    def collect(rows):
+        for row in rows:
+            for column in COLUMNS:
+                summary[column].append(row[column])
+
+    if workers == 1 or len(files) < 2:
+        collect(map(_analyze, arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            collect(executor.map(_analyze, arguments, chunksize=max(1, len(files) // (4 * workers))))
+    return summary
+
+
+def write_summary(path: str, summary: dict) -> None:
+    """Write the summary as ``.csv`` or ``.parquet`` (needs pyarrow)."""
+    if path.endswith(".parquet"):
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.table(summary), path)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(summary)
+        writer.writerows(zip(*summary.values(), strict=True))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("paths", nargs="+", help="Data files or directories to search")
+    parser.add_argument("--output", default="summary.csv", help="Summary file (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--threshold-current", type=float, default=1e-6,
+                        help="Current defining the threshold voltage in amperes")
+    parser.add_argument("--read-level", type=float,
+                        help="Source level of the on/off ratio (default: half of the largest level)")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    start = time.perf_counter()
+    summary = analyze_files(files, args.workers, args.threshold_current, args.read_level)
+    write_summary(args.output, summary)
+    failed = sum(1 for error in summary["error"] if error)
+    print(f"Analysed {len(files)} files in {time.perf_counter() - start:.2f} s "
+          f"({failed} failed), summary saved to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
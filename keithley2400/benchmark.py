@@ -0,0 +1,379 @@
+"""Acquisition benchmark: throughput, jitter and overhead of the acquisition modes.
+
+Runs the I-V, V-I and I-t workloads of the scripts through the same pipeline
+(acquisition thread, batched consumer, streaming writer, optional live plot)
+and reports as JSON:
+
+* ``throughput``: points per second over the whole run
+* ``host_interval`` / ``instrument_interval``: distribution of the time
+  between samples as seen by the host and by the instrument timestamps
+  (p50, p99, max and the jitter p99 - p50, max - p50)
+* ``cpu``: process CPU time and its share of the wall time
+* ``memory``: resident set size sampled during the run and its growth
+* ``time_split``: seconds spent in bus I/O, waiting for the instrument,
+  parsing, plotting and disk writes
+
+The backend is the simulator (default, see :mod:`keithley2400.simulator`) or a
+real instrument on GPIB. Every combination of the given workloads, modes, data
+formats and file formats is run::
+
+    python -m keithley2400.benchmark --workload iv it --mode point srq buffered \\
+        --data-format ASCII REAL,64 --output results.json
+
+Memory is measured with psutil when it is installed, otherwise from
+``/proc/self/statm``.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from .acquisition import AcquisitionThread, consume
+from .buffer import GrowableBuffer
+from .instrument import MAX_BUFFER_POINTS, STB_MAV, Keithley2400
+from .simulator import Diode, NoisyLeakage, Resistor, SimulatedTransport
+from .storage import open_writer
+from .sweep import hysteresis_profile
+from .transport import GpibTransport
+
+
+WORKLOADS = ("iv", "vi", "it")
+MODES = ("point", "srq", "buffered")
+
+# Simulated device per workload
+SIMULATED_MODELS = {"iv": Diode, "vi": lambda: Resistor(1e3), "it": NoisyLeakage}
+
+
+class StageTimer:
+    """Accumulate wall time per stage (``with timer("bus"): ...``)."""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    @contextmanager
+    def __call__(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[stage] += time.perf_counter() - start
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.totals[stage] += seconds
+
+
+class TimedTransport:
+    """Transport wrapper that books bus traffic and SRQ waits on a :class:`StageTimer`."""
+
+    def __init__(self, transport, timer: StageTimer):
+        self.transport = transport
+        self.timer = timer
+        if hasattr(transport, "wait_rqs"):
+            self.wait_rqs = self._wait_rqs
+
+    def write(self, command: str) -> None:
+        with self.timer("bus"):
+            self.transport.write(command)
+
+    def read(self, length: int = 100) -> bytes:
+        with self.timer("bus"):
+            return self.transport.read(length)
+
+    def serial_poll(self) -> int:
+        with self.timer("bus"):
+            return self.transport.serial_poll()
+
+    def _wait_rqs(self) -> None:
+        with self.timer("wait"):
+            self.transport.wait_rqs()
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def rss_bytes() -> int | None:
+    """Resident set size of this process, or None if it cannot be measured."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class MemorySampler(threading.Thread):
+    """Sample the resident set size every ``interval`` seconds until stopped."""
+
+    def __init__(self, interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._start = time.perf_counter()
+
+    def run(self) -> None:
+        while True:
+            rss = rss_bytes()
+            if rss is not None:
+                self.samples.append((time.perf_counter() - self._start, rss))
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self) -> list:
+        self._stop_event.set()
+        self.join()
+        rss = rss_bytes()
+        if rss is not None:
+            self.samples.append((time.perf_counter() - self._start, rss))
+        return self.samples
+
+
+def interval_stats(times) -> dict | None:
+    """p50/p99/max of the intervals between consecutive timestamps and the jitter."""
+    intervals = np.diff(np.asarray(times, dtype=float))
+    if len(intervals) == 0:
+        return None
+    p50, p99 = np.percentile(intervals, [50, 99])
+    return {
+        "count": int(len(intervals)),
+        "mean": float(intervals.mean()),
+        "p50": float(p50),
+        "p99": float(p99),
+        "max": float(intervals.max()),
+        "jitter_p99": float(p99 - p50),
+        "jitter_max": float(intervals.max() - p50),
+    }
+
+
+def open_instrument(backend: str, workload: str, timer: StageTimer, address: int = 24,
+                    realtime: bool = True) -> Keithley2400:
+    if backend == "sim":
+        transport = SimulatedTransport(SIMULATED_MODELS[workload](), realtime=realtime)
+    elif backend == "gpib":
+        transport = GpibTransport(address)
+    else:
+        raise ValueError(f"Unknown backend {backend!r}, use 'sim' or 'gpib'")
+    return Keithley2400(TimedTransport(transport, timer))
+
+
+def time_parsing(instrument: Keithley2400, timer: StageTimer) -> None:
+    """Book the time of :meth:`Keithley2400.read_readings` minus its bus I/O as parsing."""
+    read_readings = instrument.read_readings
+
+    def timed_read_readings(n: int = 1):
+        bus = timer.totals["bus"]
+        start = time.perf_counter()
+        data = read_readings(n)
+        timer.add("parse", time.perf_counter() - start - (timer.totals["bus"] - bus))
+        return data
+
+    instrument.read_readings = timed_read_readings
+
+
+def samples(instrument: Keithley2400, workload: str, mode: str, levels, delay: float,
+            duration: float, timer: StageTimer):
+    """The workload as a generator of ``(host_time, instrument_time, x, y)``."""
+    if mode == "srq":
+        instrument.set_source_delay(delay)
+        instrument.enable_srq(STB_MAV)
+    if workload == "it":
+        instrument.reset_timestamp()
+
+    if mode == "buffered":
+        if workload == "it":
+            levels = np.full(max(1, min(int(duration / delay), MAX_BUFFER_POINTS)), levels[0])
+        for k in range(0, len(levels), MAX_BUFFER_POINTS):
+            data = instrument.buffered_sweep(levels[k:k+MAX_BUFFER_POINTS], delay)
+            now = time.perf_counter()
+            for row in data:
+                yield now, row[3], row[0], row[1]
+        return
+
+    start = time.perf_counter()
+    index = 0
+    while True:
+        if workload == "it":
+            if time.perf_counter() - start >= duration:
+                return
+        elif index == len(levels):
+            return
+        else:
+            instrument.set_level(levels[index])
+        index += 1
+        if mode == "srq":
+            reading = instrument.measure_when_ready()
+        else:
+            if workload != "it":  # The I-t script reads back to back
+                with timer("wait"):
+                    time.sleep(delay)
+            reading = instrument.measure()
+        yield time.perf_counter(), reading.time, reading.voltage, reading.current
+
+
+def run_benchmark(workload: str = "iv", mode: str = "point", data_format: str = "ASCII",
+                  file_format: str = "txt", plot: bool = False, backend: str = "sim",
+                  address: int = 24, realtime: bool = True, minimum: float = 2.0,
+                  maximum: float = 2.0, step: float = 0.05, level: float = 1.0,
+                  delay: float = 0.01, duration: float = 5.0, rate: float = 20.0) -> dict:
+    """Run one workload in one acquisition mode and return the metrics."""
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown workload {workload!r}, use one of {WORKLOADS}")
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, use one of {MODES}")
+
+    timer = StageTimer()
+    instrument = open_instrument(backend, workload, timer, address, realtime)
+    time_parsing(instrument, timer)
+    source = "CURR" if workload == "vi" else "VOLT"
+    if source == "CURR":
+        instrument.configure("CURR", 21, 21)
+    else:
+        instrument.configure("VOLT", 0.1, 0.1 if workload == "iv" else 1e-6)
+    instrument.set_data_format(data_format)
+    instrument.output_on()
+    if workload == "it":
+        levels = np.array([level])
+        instrument.set_level(level)
+    else:
+        scale = 1e-3 if source == "CURR" else 1.0
+        levels = hysteresis_profile(minimum, maximum, step, decimals=6).levels * scale
+
+    # Plotted as by the scripts: the I-t trace (time, current) through the decimated
+    # curve, a sweep (source, sensed) drawn from the views of its buffer
+    plot_buffer = GrowableBuffer(2)
+    if plot:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from . import plotting
+        app, win, plot_widget = plotting.create_plot_window("Benchmark", "x", "y")
+        if workload == "it":
+            curve = plotting.DecimatedCurve(plot_widget, plot_buffer, 'r', workload)
+        else:
+            curve = plotting.add_curve(plot_widget, 'r', workload)
+        plotting.show(win)
+
+    host_times, instrument_times = [], []
+    directory = tempfile.TemporaryDirectory()
+    writer = open_writer(os.path.join(directory.name, "benchmark"), "x\ty", file_format)
+
+    def update(batch):
+        for host_time, instrument_time, *_ in batch:
+            host_times.append(host_time)
+            instrument_times.append(instrument_time)
+        with timer("write"):
+            writer.write([sample[2:] for sample in batch])
+        if plot:
+            with timer("plot"):
+                if workload == "it":
+                    plot_buffer.extend([(sample[1], sample[3]) for sample in batch])
+                    last = plot_buffer.last()
+                    plot_widget.setXRange(max(last - 30, 0), max(last, 30), padding=0.1)
+                    curve.refresh()
+                else:
+                    plot_buffer.extend([sample[2:] for sample in batch])
+                    curve.setData(plot_buffer.column(0), plot_buffer.column(1))
+                plotting.process_events()
+
+    memory = MemorySampler()
+    memory.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    acquisition = AcquisitionThread(samples(instrument, workload, mode, levels, delay, duration, timer))
+    try:
+        acquisition.start()
+        consume(acquisition, update, period=1 / rate)
+    finally:
+        acquisition.stop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        memory_samples = memory.stop()
+        with timer("write"):
+            writer.close()
+        directory.cleanup()
+        instrument.output_off()
+        instrument.close()
+        if plot:
+            win.close()
+
+    points = len(host_times)
+    rss = [rss for _, rss in memory_samples]
+    split = {stage: timer.totals.get(stage, 0.0) for stage in ("bus", "wait", "parse", "plot", "write")}
+    split["other"] = max(0.0, wall - sum(split.values()))
+    return {
+        "config": {
+            "workload": workload, "mode": mode, "data_format": data_format,
+            "file_format": file_format, "plot": plot, "backend": backend,
+            "realtime": realtime, "delay": delay,
+        },
+        "points": points,
+        "elapsed": wall,
+        "throughput": points / wall if wall > 0 else None,
+        "host_interval": interval_stats(host_times),
+        "instrument_interval": interval_stats(instrument_times),
+        "cpu": {"seconds": cpu, "percent": 100 * cpu / wall if wall > 0 else None},
+        "memory": {
+            "start": rss[0] if rss else None,
+            "peak": max(rss) if rss else None,
+            "growth": rss[-1] - rss[0] if rss else None,
+            "samples": memory_samples,
+        },
+        "time_split": split,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workload", nargs="+", default=list(WORKLOADS), choices=WORKLOADS)
+    parser.add_argument("--mode", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--data-format", nargs="+", default=["ASCII"], choices=["ASCII", "REAL,64", "SREAL"])
+    parser.add_argument("--file-format", nargs="+", default=["txt"], choices=["txt", "csv", "bin", "h5"])
+    parser.add_argument("--plot", action="store_true", help="Update a live plot (offscreen) during the run")
+    parser.add_argument("--backend", default="sim", choices=["sim", "gpib"])
+    parser.add_argument("--address", type=int, default=24, help="GPIB address for --backend gpib")
+    parser.add_argument("--virtual-time", action="store_true",
+                        help="Run the simulator on its virtual clock (fast, host-side cost only)")
+    parser.add_argument("--delay", type=float, default=0.01, help="Delay between steps in seconds")
+    parser.add_argument("--duration", type=float, default=5.0, help="Length of the I-t workload in seconds")
+    parser.add_argument("--output", help="JSON file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for workload, mode, data_format, file_format in itertools.product(
+            args.workload, args.mode, args.data_format, args.file_format):
+        print(f"Running {workload} / {mode} / {data_format} / {file_format}...", file=sys.stderr)
+        results.append(run_benchmark(
+            workload, mode, data_format, file_format, plot=args.plot, backend=args.backend,
+            address=args.address, realtime=not args.virtual_time, delay=args.delay,
+            duration=args.duration))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
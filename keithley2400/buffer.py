@@ -0,0 +1,72 @@
+"""Growable NumPy buffer for data that arrives one point at a time."""
+from __future__ import annotations
+
+import numpy as np
+
+
+class GrowableBuffer:
+    """Row buffer with amortized O(1) append.
+
+    Rows are written into a preallocated ``(capacity, columns)`` array. When it
+    is full the capacity is doubled (at least by ``chunk`` rows), so appending
+    n points copies O(n) values in total instead of O(n**2) with ``np.append``.
+    All accessors return views, not copies; they stay valid until the next
+    append that has to grow the buffer.
+    """
+
+    def __init__(self, columns: int = 1, chunk: int = 1024, dtype=np.float64):
+        self.chunk = chunk
+        self._data = np.empty((chunk, columns), dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def columns(self) -> int:
+        return self._data.shape[1]
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._data)
+        if size <= capacity:
+            return
+        new_capacity = max(2 * capacity, capacity + self.chunk, size)
+        data = np.empty((new_capacity, self.columns), dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def append(self, *values) -> None:
+        """Append one row, e.g. ``buffer.append(t, current)``."""
+        self._reserve(self._size + 1)
+        self._data[self._size] = values
+        self._size += 1
+
+    def extend(self, rows) -> None:
+        """Append an ``(n, columns)`` array of rows."""
+        rows = np.asarray(rows).reshape(-1, self.columns)
+        self._reserve(self._size + len(rows))
+        self._data[self._size:self._size + len(rows)] = rows
+        self._size += len(rows)
+
+    def clear(self) -> None:
+        self._size = 0
+
+    @property
+    def data(self) -> np.ndarray:
+        """All rows as an ``(n, columns)`` view."""
+        return self._data[:self._size]
+
+    def column(self, index: int) -> np.ndarray:
+        return self._data[:self._size, index]
+
+    def last(self, index: int = 0):
+        return self._data[self._size - 1, index]
+
+    def since(self, start: float, index: int = 0) -> np.ndarray:
+        """Rows whose value in column ``index`` is >= ``start``.
+
+        The column must be non-decreasing (e.g. time), so the first row is
+        found by binary search and the result is a view on the buffer tail.
+        """
+        first = np.searchsorted(self.column(index), start, side='left')
+        return self._data[first:self._size]
@@ -0,0 +1,147 @@
+"""Drive several Keithley 2400s on one GPIB board from a single scheduler.
+
+Every instrument gets a *task*: a generator that talks to its instrument and
+yields either a sample (passed on to the caller) or :data:`WAIT_FOR_DATA`
+after it has started a measurement. A waiting task is only resumed when its
+instrument reports a message available in its status byte, so the bus is
+never blocked by one instrument settling or integrating while the others have
+data to deliver.
+
+With ``use_srq`` the scheduler sleeps on the SRQ line of the board and then
+serial polls only the waiting instruments; without it the waiting instruments
+are serial polled in turn.
+
+Example, I-t on address 24 while sweeping address 25::
+
+    bus = GpibBus()
+    smu1, smu2 = bus.instrument(24), bus.instrument(25)
+    ...configure both, output on...
+    scheduler = BusScheduler(bus)
+    scheduler.add("trace", smu1, trace_task(smu1, total_time=60))
+    scheduler.add("sweep", smu2, sweep_task(smu2, profile.levels, delay=0.05))
+    for name, sample in scheduler.run():
+        ...
+"""
+from __future__ import annotations
+
+import time
+
+from .instrument import STB_MAV, Keithley2400
+from .transport import TIMO, GpibTransport
+
+
+# Returned by a task when it waits for its instrument to have data ready
+WAIT_FOR_DATA = object()
+
+# linux-gpib ibsta bit and timeout code used while waiting for SRQ
+SRQI = 0x1000
+T100ms = 9
+
+
+class GpibBus:
+    """One GPIB board shared by several instruments.
+
+    Owns the board descriptor (used to wait for SRQ) and the device handles of
+    all instruments opened through :meth:`instrument`.
+    """
+
+    def __init__(self, board: int = 0, board_name: str | None = None):
+        import gpib
+        self._gpib = gpib
+        self.board = board
+        self.board_handle = gpib.find(board_name or f"gpib{board}")
+        gpib.timeout(self.board_handle, T100ms)
+        self.instruments = {}
+
+    def instrument(self, address: int) -> Keithley2400:
+        """Open (or return the already open) instrument at ``address``."""
+        if address not in self.instruments:
+            self.instruments[address] = Keithley2400(GpibTransport(address, self.board))
+        return self.instruments[address]
+
+    def wait_srq(self) -> bool:
+        """Wait until a device asserts SRQ or 100 ms pass; True if SRQ is asserted."""
+        status = self._gpib.wait(self.board_handle, SRQI | TIMO)
+        return bool(status & SRQI)
+
+    def close(self) -> None:
+        for instrument in self.instruments.values():
+            instrument.close()
+        self.instruments.clear()
+
+
+class BusScheduler:
+    """Interleave the tasks of several instruments on one bus.
+
+    All bus traffic happens in the thread iterating :meth:`run`, so the
+    scheduler can be wrapped in an
+    :class:`~keithley2400.acquisition.AcquisitionThread` like a single
+    instrument measurement.
+    """
+
+    def __init__(self, bus: GpibBus | None = None, use_srq: bool = True, poll_interval: float = 0.001):
+        self.bus = bus
+        self.use_srq = use_srq and bus is not None
+        self.poll_interval = poll_interval
+        self.tasks = {}
+
+    def add(self, name: str, instrument: Keithley2400, task) -> None:
+        """Add the task ``task`` that talks to ``instrument``."""
+        if self.use_srq:
+            instrument.enable_srq(STB_MAV)
+        self.tasks[name] = (task, instrument)
+
+    def run(self):
+        """Run all tasks to completion and yield ``(name, sample)`` as they arrive."""
+        runnable = list(self.tasks)
+        waiting = []
+        while runnable or waiting:
+            # Advance every runnable task until it waits for data or finishes
+            for name in runnable:
+                task, _ = self.tasks[name]
+                for item in task:
+                    if item is WAIT_FOR_DATA:
+                        waiting.append(name)
+                        break
+                    yield name, item
+            runnable = []
+            if not waiting:
+                break
+
+            # Resume only the instruments that have data ready
+            if self.use_srq:
+                self.bus.wait_srq()
+            else:
+                time.sleep(self.poll_interval)
+            for name in list(waiting):
+                if self.tasks[name][1].serial_poll() & STB_MAV:
+                    waiting.remove(name)
+                    runnable.append(name)
+
+
+def trace_task(instrument: Keithley2400, total_time: float):
+    """I-t trace: (time, current) samples until ``total_time`` seconds have passed."""
+    instrument.reset_timestamp()
+    real_time = 0
+    while total_time > real_time:
+        instrument.trigger_reading()
+        yield WAIT_FOR_DATA
+        reading = instrument.measure()
+        real_time = reading.time
+        yield real_time, reading.current
+
+
+def sweep_task(instrument: Keithley2400, levels, delay: float | None = None):
+    """Source sweep: (index, voltage, current) samples for every level.
+
+    The settling time is the instrument's source delay (``delay`` sets
+    :SOUR:DEL), so no host-side sleep holds up the other instruments.
+    """
+    if delay is not None:
+        instrument.set_source_delay(delay)
+    for i, level in enumerate(levels):
+        instrument.set_level(level)
+        instrument.trigger_reading()
+        yield WAIT_FOR_DATA
+        reading = instrument.measure()
+        yield i, reading.voltage, reading.current
@@ -0,0 +1,235 @@
+"""Run catalog: an SQLite index of every recorded measurement.
+
+Each run of a measurement script registers itself with its parameters, the
+instrument IDN, the start time, duration, number of points, outcome and the
+files it wrote, so past runs can be found without opening the data files::
+
+    catalog = RunCatalog()
+    for run in catalog.runs(kind="iv", device="X", sense_range=1e-6, since="2026-09-01"):
+        print(run["started"], run["files"])
+
+or from the command line::
+
+    python -m keithley2400.catalog --kind iv --device X --sense-range 1e-6 --since 2026-09-01
+
+The catalog is ``runs.sqlite`` in the repository folder, or the file named by
+the ``KEITHLEY2400_CATALOG`` environment variable. Data files recorded before
+the catalog existed can be added with :meth:`RunCatalog.scan`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "runs.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,          -- "iv", "vi" or "it"
+    device TEXT,
+    started REAL NOT NULL,       -- Unix time
+    duration REAL,               -- Seconds
+    points INTEGER,
+    status TEXT NOT NULL,        -- "running", "completed", "interrupted", "aborted", "failed" or "imported"
+    idn TEXT,
+    address INTEGER,             -- GPIB address, NULL for the simulator
+    source TEXT,                 -- "VOLT" or "CURR"
+    compliance REAL,
+    sense_range REAL,
+    step REAL,
+    delay REAL,
+    parameters TEXT              -- All script parameters as JSON
+);
+CREATE TABLE IF NOT EXISTS files (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    path TEXT NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS runs_kind_started ON runs(kind, started);
+CREATE INDEX IF NOT EXISTS runs_device ON runs(device);
+CREATE INDEX IF NOT EXISTS files_run ON files(run_id);
+"""
+
+# Columns of runs that can be filtered on directly
+_FILTERS = ("kind", "device", "status", "idn", "address", "source", "compliance", "sense_range", "step", "delay")
+
+
+def script_parameters(namespace: dict) -> dict:
+    """The user parameters of a script: its module-level numbers, strings, booleans and None.
+
+    Call it with ``globals()`` right after the parameter block. Private names
+    and upper case constants (e.g. imported ``STB_MAV``) are left out.
+    """
+    return {name: value for name, value in namespace.items()
+            if not name.startswith("_") and not name.isupper()
+            and (value is None or type(value) in (bool, int, float, str))}
+
+
+def _timestamp(value) -> float:
+    """Unix time of a ``datetime``, an ISO date(time) string or a number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class RunCatalog:
+    """SQLite index of measurement runs, see the module documentation."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.environ.get("KEITHLEY2400_CATALOG", DEFAULT_PATH)
+        self.connection = sqlite3.connect(self.path, timeout=10.0)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def start(self, kind: str, idn: str | None = None, parameters: dict | None = None,
+              files=(), **columns) -> int:
+        """Register a starting run and return its id.
+
+        ``columns`` fills the filterable columns (``device``, ``address``,
+        ``source``, ``compliance``, ``sense_range``, ``step``, ``delay``).
+        """
+        unknown = set(columns) - set(_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown run columns {sorted(unknown)}")
+        values = dict(columns, kind=kind, idn=idn, started=time.time(), status="running",
+                      parameters=json.dumps(parameters or {}))
+        with self.connection:
+            cursor = self.connection.execute(
+                f"INSERT INTO runs ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                tuple(values.values()))
+            run_id = cursor.lastrowid
+            self._add_files(run_id, files)
+        return run_id
+
+    def finish(self, run_id: int, points: int, status: str = "completed", files=()) -> None:
+        """Record the outcome of a run; its duration is the time since :meth:`start`."""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE runs SET points = ?, status = ?, duration = ? - started WHERE id = ?",
+                (points, status, time.time(), run_id))
+            self._add_files(run_id, files)
+
+    def add_file(self, run_id: int, path: str) -> None:
+        """Register another file written by a run (e.g. the plot)."""
+        with self.connection:
+            self._add_files(run_id, [path])
+
+    def _add_files(self, run_id: int, files) -> None:
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO files (run_id, path) VALUES (?, ?)",
+            [(run_id, os.path.abspath(path)) for path in files])
+
+    def runs(self, since=None, until=None, **filters) -> list[dict]:
+        """Runs matching all given filters, oldest first.
+
+        ``filters`` are column values (see :meth:`start`, plus ``kind`` and
+        ``status``) or, prefixed with ``parameter_``, script parameters (e.g.
+        ``parameter_sweep_mode="buffered"``). ``since`` and ``until`` are
+        datetimes, ISO strings or Unix times.
+        """
+        conditions, values = [], []
+        for name, value in filters.items():
+            if name.startswith("parameter_"):
+                conditions.append("json_extract(parameters, ?) = ?")
+                values += [f"$.{name[len('parameter_'):]}", value]
+            elif name in _FILTERS:
+                conditions.append(f"{name} = ?")
+                values.append(value)
+            else:
+                raise ValueError(f"Unknown filter {name!r}")
+        if since is not None:
+            conditions.append("started >= ?")
+            values.append(_timestamp(since))
+        if until is not None:
+            conditions.append("started < ?")
+            values.append(_timestamp(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(f"SELECT * FROM runs {where} ORDER BY started", values).fetchall()
+
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["parameters"] = json.loads(run["parameters"] or "{}")
+            run["files"] = [path for (path,) in self.connection.execute(
+                "SELECT path FROM files WHERE run_id = ? ORDER BY path", (run["id"],))]
+            runs.append(run)
+        return runs
+
+    def scan(self, paths) -> int:
+        """Register data files that are not in the catalog yet; returns how many were added.
+
+        Only what the file itself holds is known: the kind (from the file
+        name), the number of points and the modification time as start time.
+        """
+        from .analysis import find_files, kind_of
+        from .storage import read_data
+
+        known = {path for (path,) in self.connection.execute("SELECT path FROM files")}
+        added = 0
+        with self.connection:
+            for path in find_files(paths):
+                path = os.path.abspath(path)
+                kind = kind_of(path)
+                if path in known or kind is None:
+                    continue
+                try:
+                    points = len(read_data(path))
+                except Exception:
+                    points = None
+                cursor = self.connection.execute(
+                    "INSERT INTO runs (kind, started, points, status) VALUES (?, ?, ?, 'imported')",
+                    (kind, os.path.getmtime(path), points))
+                self._add_files(cursor.lastrowid, [path])
+                added += 1
+        return added
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--catalog", help="Catalog file (default: runs.sqlite in the repository folder)")
+    parser.add_argument("--scan", nargs="+", metavar="PATH", help="Register existing data files first")
+    parser.add_argument("--kind", choices=["iv", "vi", "it"])
+    parser.add_argument("--device")
+    parser.add_argument("--status")
+    parser.add_argument("--sense-range", type=float)
+    parser.add_argument("--compliance", type=float)
+    parser.add_argument("--since", help="ISO date or time, e.g. 2026-09-01")
+    parser.add_argument("--until", help="ISO date or time")
+    parser.add_argument("--json", action="store_true", help="Print the matching runs as JSON")
+    args = parser.parse_args(argv)
+
+    with RunCatalog(args.catalog) as catalog:
+        if args.scan:
+            print(f"Registered {catalog.scan(args.scan)} data files")
+        filters = {name: getattr(args, name) for name in ("kind", "device", "status", "sense_range", "compliance")
+                   if getattr(args, name) is not None}
+        runs = catalog.runs(args.since, args.until, **filters)
+
+    if args.json:
+        print(json.dumps(runs, indent=2))
+        return
+    for run in runs:
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started"]))
+        duration = f"{run['duration']:.1f} s" if run["duration"] is not None else "-"
+        print(f"{run['id']:5d}  {started}  {run['kind']}  {run['status']:<11}  {run['points'] or 0:7d} points  "
+              f"{duration:>10}  {run['device'] or '-'}  {', '.join(run['files'])}")
+
+
+if __name__ == "__main__":
+    main()
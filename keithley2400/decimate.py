@@ -0,0 +1,108 @@
+"""Min/max decimation of long traces for plotting.
+
+Drawing every point of a multi-million-point I-t trace is slow and pointless:
+a window is only ~1000 pixels wide. :class:`LODPyramid` keeps min/max
+summaries of a growing trace at several levels of detail (each level merges
+``factor`` bins of the level below), updated incrementally as data arrives.
+:meth:`LODPyramid.view` returns, for a visible x window, the minimum and
+maximum of every pixel column, computed from the coarsest level that still
+has at least one bin per pixel and from the raw points at the window edges.
+Spikes and noise bands stay visible exactly as in the full-resolution plot.
+
+The x column must be non-decreasing (e.g. time). This module only needs NumPy;
+the pyqtgraph curve using it is :class:`keithley2400.plotting.DecimatedCurve`.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from .buffer import GrowableBuffer
+
+
+def minmax_per_pixel(x, y_min, y_max, x0: float, x1: float, pixels: int):
+    """Reduce sorted bins to one (min, max) pair per pixel column of ``[x0, x1]``.
+
+    Returns ``(x, y)`` with two points per pixel column (its min and max), to
+    be drawn as a connected line.
+    """
+    if len(x) == 0:
+        return np.empty(0), np.empty(0)
+    width = (x1 - x0) / pixels if x1 > x0 else 1.0
+    column = np.clip(((x - x0) / width).astype(np.int64), 0, pixels - 1)
+    starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+    low = np.minimum.reduceat(y_min, starts)
+    high = np.maximum.reduceat(y_max, starts)
+    return np.repeat(x[starts], 2), np.column_stack((low, high)).ravel()
+
+
+class LODPyramid:
+    """Incrementally built min/max levels of detail of a growing trace.
+
+    ``buffer`` is the full-resolution :class:`GrowableBuffer`; it is only read.
+    Call :meth:`update` after appending to it.
+    """
+
+    def __init__(self, buffer: GrowableBuffer, factor: int = 8, x_index: int = 0, y_index: int = 1):
+        self.buffer = buffer
+        self.factor = factor
+        self.x_index = x_index
+        self.y_index = y_index
+        self.levels = []  # levels[k]: bins of factor**(k+1) points, columns x, y_min, y_max
+
+    def update(self) -> None:
+        """Summarize the points appended since the last call."""
+        x = self.buffer.column(self.x_index)
+        y_min = y_max = self.buffer.column(self.y_index)
+        k = 0
+        while len(x) >= 2 * self.factor:
+            if k == len(self.levels):
+                self.levels.append(GrowableBuffer(3))
+            level = self.levels[k]
+            start = len(level) * self.factor
+            complete = (len(x) - start) // self.factor
+            if complete > 0:
+                stop = start + complete * self.factor
+                level.extend(np.column_stack((
+                    x[start:stop:self.factor],
+                    y_min[start:stop].reshape(-1, self.factor).min(axis=1),
+                    y_max[start:stop].reshape(-1, self.factor).max(axis=1),
+                )))
+            x, y_min, y_max = level.column(0), level.column(1), level.column(2)
+            k += 1
+
+    def view(self, x0: float, x1: float, pixels: int, max_points: int | None = None):
+        """Data to draw for the window ``[x0, x1]`` on ``pixels`` columns.
+
+        Returns ``(x, y, decimated)``. If the window holds at most
+        ``max_points`` points (default ``2 * pixels``) they are returned as they
+        are, otherwise one min/max pair per pixel column.
+        """
+        pixels = max(int(pixels), 1)
+        if max_points is None:
+            max_points = 2 * pixels
+        x = self.buffer.column(self.x_index)
+        y = self.buffer.column(self.y_index)
+        first = np.searchsorted(x, x0, side='left')
+        last = np.searchsorted(x, x1, side='right')
+        n = last - first
+        if n <= max_points:
+            return x[first:last], y[first:last], False
+
+        # Coarsest level that still has at least one bin per pixel column
+        k = min(int(np.log(n / pixels) / np.log(self.factor)), len(self.levels))
+        if k == 0:
+            return (*minmax_per_pixel(x[first:last], y[first:last], y[first:last], x0, x1, pixels), True)
+        level = self.levels[k - 1]
+        size = self.factor ** k
+
+        # Only bins lying fully inside the window, the partial bins at both ends
+        # could hold points outside it; their raw points are used instead
+        start = -(-first // size)
+        stop = max(min(last // size, len(level)), start)
+        bins = level.data[start:stop]
+        head = slice(first, start * size)
+        tail = slice(max(first, stop * size), last)  # Includes the points not summarized yet
+        bx = np.concatenate((x[head], bins[:, 0], x[tail]))
+        low = np.concatenate((y[head], bins[:, 1], y[tail]))
+        high = np.concatenate((y[head], bins[:, 2], y[tail]))
+        return (*minmax_per_pixel(bx, low, high, x0, x1, pixels), True)
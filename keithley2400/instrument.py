@@ -0,0 +1,678 @@
+"""Keithley 2400 SourceMeter driver shared by the measurement scripts."""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+from .safety import Watchdog, signals_abort_ramp
+from .transport import GpibTransport
+
+
+# Number of fields in one reading with the default :FORM:ELEM (V, I, R, t, status)
+READING_FIELDS = 5
+
+# The source list and the trace buffer of the 2400 hold at most 2500 points,
+# and one :SOUR:LIST command accepts at most 100 values
+MAX_BUFFER_POINTS = 2500
+LIST_CHUNK = 100
+
+# Supported :FORM:DATA settings and the NumPy dtype of one binary value.
+# The byte order is set to little endian with :FORM:BORD SWAP.
+DATA_FORMATS = {
+    "ASCII": None,
+    "REAL,64": np.dtype('<f8'),
+    "SREAL": np.dtype('<f4'),
+}
+
+# Maximum length of one ASCII value including the comma
+ASCII_FIELD_LENGTH = 20
+
+# Longest semicolon-joined message sent in one bus transaction, and the
+# longest time one message of instrument-timed ramp steps may take
+MAX_MESSAGE_LENGTH = 500
+MAX_STEPS_TIME = 2.0
+
+# Status byte bits (IEEE 488.2): measurement event summary, message available
+# and request service
+STB_MSB = 0x01
+STB_MAV = 0x10
+STB_RQS = 0x40
+
+# Integration time limits of one conversion in power line cycles
+MIN_NPLC = 0.01
+MAX_NPLC = 10.0
+
+# Value returned for a reading above the measurement range
+OVERFLOW = 9.9e37
+
+# Status word bits of a reading (field 4): measurement over range, source in
+# compliance and sensed value limited by the range instead of the compliance
+STATUS_OVERFLOW = 0x00001
+STATUS_COMPLIANCE = 0x00008
+STATUS_RANGE_COMPLIANCE = 0x10000
+
+# Measurement event register bits of the 2400 (:STAT:MEAS)
+MEAS_READING_AVAILABLE = 0x040
+MEAS_BUFFER_FULL = 0x200
+
+
+class Reading(NamedTuple):
+    """One reading in the default 5-field format of the 2400."""
+    voltage: float
+    current: float
+    resistance: float
+    time: float
+    status: float
+
+
+def decode(data_bytes: bytes) -> str:
+    """Decode an instrument response, falling back to ASCII on bad bytes."""
+    try:
+        return data_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        return data_bytes.decode('ascii', errors='ignore')
+
+
+def parse_readings(data_bytes: bytes) -> np.ndarray:
+    """Parse one or more comma separated readings into an (N, 5) array."""
+    data_string = decode(data_bytes).strip()
+    return np.array(data_string.split(","), dtype=float).reshape(-1, READING_FIELDS)
+
+
+def parse_binary(data_bytes: bytes, dtype) -> np.ndarray:
+    """Parse a binary (REAL,64 / SREAL) response into an (N, 5) array.
+
+    The 2400 sends binary data as ``#0`` followed by the raw values and a line
+    feed. The result is a writeable float64 array, as from the ASCII format.
+    """
+    dtype = np.dtype(dtype)
+    start = data_bytes.index(b"#0") + 2
+    count = (len(data_bytes) - start) // dtype.itemsize
+    count -= count % READING_FIELDS  # Drop the trailing line feed
+    values = np.frombuffer(data_bytes, dtype=dtype, count=count, offset=start)
+    return values.astype(np.float64).reshape(-1, READING_FIELDS)  # Copy: frombuffer is read-only
+
+
+class Keithley2400:
+    """Keithley 2400 SourceMeter on any transport with write/read/close.
+
+    ``source`` is the sourced quantity, "VOLT" or "CURR"; the instrument always
+    senses the other one, as in the I-V, V-I and I-t scripts.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.source = "VOLT"
+        self.data_format = "ASCII"
+        self._settings = {}  # Last value written per setting header
+        self._batch = None   # Commands collected inside batch()
+        self._line_frequency = None
+        self.level = 0.0        # Last fixed source level set, where a ramp down starts
+        self.slew_rate = None   # Fastest ramp in V/s or A/s, see set_slew_rate()
+        self.watchdog = None    # Watchdog fed by every read, see start_watchdog()
+
+    @classmethod
+    def open(cls, address: int, board: int = 0) -> "Keithley2400":
+        """Open the instrument at a GPIB address through linux-gpib."""
+        return cls(GpibTransport(address, board))
+
+    @classmethod
+    def simulated(cls, model=None, **kwargs) -> "Keithley2400":
+        """Simulated instrument, see :class:`keithley2400.simulator.SimulatedTransport`."""
+        from .simulator import SimulatedTransport
+        return cls(SimulatedTransport(model, **kwargs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def sense(self) -> str:
+        return "CURR" if self.source == "VOLT" else "VOLT"
+
+    # ------------------------------------------------------------------
+    # Low level I/O
+
+    def write(self, command: str) -> None:
+        if self._batch is not None:
+            self._batch.append(command)
+        else:
+            self.transport.write(command)
+
+    def read(self, length: int = 100) -> bytes:
+        self.flush()  # A query inside batch() needs its command sent first
+        self._alive(self.reading_time())  # The read may wait for a measurement
+        data = self.transport.read(length)
+        self._alive()
+        return data
+
+    def setting(self, header: str, value) -> None:
+        """Write ``header value`` unless that value was already written since the last reset."""
+        value = str(value)
+        if self._settings.get(header) != value:
+            self._settings[header] = value
+            self.write(f"{header} {value}")
+
+    @contextmanager
+    def batch(self):
+        """Collect the commands written in the block and send them semicolon-joined.
+
+        The commands go out in as few messages of at most
+        :data:`MAX_MESSAGE_LENGTH` characters as possible, when the block ends
+        or before anything is read.
+        """
+        if self._batch is not None:
+            yield self  # Nested: the outer block sends everything
+            return
+        self._batch = []
+        try:
+            yield self
+        finally:
+            self.flush()
+            self._batch = None
+
+    def flush(self) -> None:
+        """Send the commands collected by :meth:`batch` so far."""
+        if not self._batch:
+            return
+        commands, self._batch = self._batch, []
+        message = ""
+        for command in commands:
+            if message and len(message) + 1 + len(command) > MAX_MESSAGE_LENGTH:
+                self.transport.write(message)
+                message = ""
+            message = f"{message};{command}" if message else command
+        self.transport.write(message)
+
+    def query(self, command: str, length: int = 1024) -> str:
+        self.write(command)
+        return decode(self.read(length)).strip()
+
+    def serial_poll(self) -> int:
+        """Return the status byte without addressing the instrument to talk."""
+        self.flush()
+        status = self.transport.serial_poll()
+        self._alive()
+        return status
+
+    def message_available(self) -> bool:
+        return bool(self.serial_poll() & STB_MAV)
+
+    def identify(self) -> str:
+        return self.query("*IDN?\n")
+
+    def line_frequency(self) -> float:
+        """Power line frequency the instrument integrates over (queried once)."""
+        if self._line_frequency is None:
+            self._line_frequency = float(self.query(":SYST:LFR?", 100))
+        return self._line_frequency
+
+    def close(self) -> None:
+        self.stop_watchdog()
+        self.transport.close()
+
+    # ------------------------------------------------------------------
+    # Watchdog
+
+    def start_watchdog(self, timeout: float = 5.0) -> Watchdog:
+        """Switch the output off if no reading or status byte arrives for ``timeout`` seconds.
+
+        Waits the driver knows about (buffered sweeps, service requests,
+        instrument-timed ramps) extend the timeout. Stopped by :meth:`shutdown`
+        and :meth:`close`.
+        """
+        self.stop_watchdog()
+        self.watchdog = Watchdog(self, timeout)
+        self.watchdog.start()
+        return self.watchdog
+
+    def stop_watchdog(self) -> None:
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+
+    def reading_time(self) -> float:
+        """Expected time of one reading: source delay, integration and averaging.
+
+        Estimated from the settings written through :meth:`setting` (the
+        *RST values for the others), with 50 Hz line frequency if unknown.
+        """
+        nplc = float(self._settings.get(f":SENS:{self.sense}:NPLC", 1))
+        count = int(self._settings.get(":SENS:AVER:COUN", 10)) if self._settings.get(":SENS:AVER") == "ON" else 1
+        delay = float(self._settings.get(":SOUR:DEL", 0))
+        return delay + nplc * count / (self._line_frequency or 50.0)
+
+    def _alive(self, expected: float = 0.0) -> None:
+        """Feed the watchdog; ``expected`` is how long the next transaction may take."""
+        if self.watchdog is not None:
+            self.watchdog.feed(expected)
+
+    def force_output_off(self) -> None:
+        """Switch the output off at once, without ramping and outside any batch.
+
+        A device clear first aborts a running sweep or a pending transfer, so
+        this also works while another thread hangs on the bus (used by the
+        :class:`~keithley2400.safety.Watchdog`).
+        """
+        clear = getattr(self.transport, "clear", None)
+        if clear is not None:
+            clear()
+        self.transport.write(":OUTP OFF")
+
+    # ------------------------------------------------------------------
+    # Configuration
+
+    def reset(self) -> None:
+        self.write("*RST")
+        self._settings.clear()      # Every setting is back at its default
+        self.data_format = "ASCII"  # *RST restores ASCII data
+        self.level = 0.0
+
+    def clear_buffer(self) -> None:
+        self.write(":TRACe:CLEar")
+
+    def configure_source(self, function: str, mode: str = "FIXED") -> None:
+        """Select the source function ("VOLT" or "CURR") and its mode."""
+        self.source = function.upper()
+        self.setting(":SOUR:FUNC", self.source)
+        self.setting(f":SOUR:{self.source}:MODE", mode)
+
+    def configure_sense(self, compliance: float, sense_range: float) -> None:
+        """Set compliance and fixed range of the sensed quantity and select it."""
+        self.setting(f":SENSe:{self.sense}:PROTection", compliance)
+        self.set_sense_range(sense_range)
+        self.setting(":SENS:FUNC", f"'{self.sense}'")
+
+    def set_sense_range(self, sense_range: float) -> None:
+        """Select a fixed range of the sensed quantity (turns autorange off)."""
+        self._settings.pop(f":SENS:{self.sense}:RANG:AUTO", None)
+        self.setting(f":SENS:{self.sense}:RANG", sense_range)
+
+    def set_auto_range(self, enabled: bool = True) -> None:
+        """Let the instrument pick the range of the sensed quantity for every reading."""
+        self._settings.pop(f":SENS:{self.sense}:RANG", None)
+        self.setting(f":SENS:{self.sense}:RANG:AUTO", "ON" if enabled else "OFF")
+
+    def set_nplc(self, nplc: float) -> None:
+        """Integration time of the sensed quantity in power line cycles (0.01 to 10)."""
+        self.setting(f":SENS:{self.sense}:NPLC", nplc)
+
+    def set_averaging(self, count: int, control: str = "REP") -> None:
+        """Average ``count`` conversions into every reading (1 turns the filter off).
+
+        ``control`` is "REP" (repeating filter: a new set of conversions per
+        reading) or "MOV" (moving average over the last ``count``).
+        """
+        with self.batch():
+            if count > 1:
+                self.setting(":SENS:AVER:TCON", control)
+                self.setting(":SENS:AVER:COUN", int(count))
+            self.setting(":SENS:AVER", "ON" if count > 1 else "OFF")
+
+    def configure(self, source: str, compliance: float, sense_range: float) -> None:
+        """Reset and configure for sourcing ``source`` and sensing the other quantity."""
+        with self.batch():
+            self.reset()
+            self.configure_source(source)
+            self.clear_buffer()  # Clear the buffer before the measurement
+            self.configure_sense(compliance, sense_range)
+
+    def set_data_format(self, data_format: str) -> None:
+        """Select how readings are transferred: "ASCII", "REAL,64" or "SREAL".
+
+        The binary formats send 8 or 4 bytes per value instead of up to 14
+        ASCII characters and are decoded without any string parsing.
+        """
+        data_format = data_format.upper()
+        if data_format not in DATA_FORMATS:
+            raise ValueError(f"Unknown data format {data_format!r}, use one of {list(DATA_FORMATS)}")
+        self.setting(":FORM:DATA", data_format)
+        if DATA_FORMATS[data_format] is not None:
+            self.setting(":FORM:BORD", "SWAP")  # Little endian, as on the host
+        self.data_format = data_format
+
+    def enable_srq(self, status_bits: int = STB_MAV, measurement_events: int = 0) -> None:
+        """Configure the status model to request service (SRQ).
+
+        ``status_bits`` are enabled in the service request enable register
+        (e.g. :data:`STB_MAV`: a response is waiting). ``measurement_events``
+        are enabled in the measurement event register (e.g.
+        :data:`MEAS_BUFFER_FULL`) and reported through :data:`STB_MSB`.
+        """
+        self.write("*CLS")
+        self.setting(":STAT:MEAS:ENAB", measurement_events)
+        if measurement_events:
+            status_bits |= STB_MSB
+        self.setting("*SRE", status_bits)
+
+    def wait_for_service(self, timeout: float = 10.0, poll_interval: float = 0.001) -> int:
+        """Block until the instrument requests service and return its status byte.
+
+        Uses the transport's ``wait_rqs`` (ibwait on RQS) if it has one and
+        otherwise serial polls every ``poll_interval`` seconds. The serial poll
+        also clears the request.
+        """
+        wait_rqs = getattr(self.transport, "wait_rqs", None)
+        deadline = time.monotonic() + timeout
+        while True:
+            self._alive(deadline - time.monotonic())
+            if wait_rqs is not None:
+                wait_rqs()
+            status = self.serial_poll()
+            if status & STB_RQS:
+                return status
+            if time.monotonic() > deadline:
+                raise TimeoutError("Instrument did not request service in time")
+            if wait_rqs is None:
+                time.sleep(poll_interval)
+
+    def set_source_delay(self, delay: float) -> None:
+        """Settling time between setting the source and measuring, timed by the instrument."""
+        self._settings.pop(":SOUR:DEL:AUTO", None)
+        self.setting(":SOUR:DEL", delay)
+
+    def set_auto_source_delay(self) -> None:
+        """Let the instrument choose the source delay for the range (the *RST setting)."""
+        self._settings.pop(":SOUR:DEL", None)
+        self.setting(":SOUR:DEL:AUTO", "ON")
+
+    def output_on(self) -> None:
+        self.write(":OUTP ON")
+
+    def output_off(self) -> None:
+        self.write(":OUTP OFF")
+
+    def reset_timestamp(self) -> None:
+        """Restart the timestamp returned in field 3 of every reading."""
+        self.write(":SYSTem:TIME:RESet")
+
+    # ------------------------------------------------------------------
+    # Measurement
+
+    def set_level(self, level: float) -> None:
+        self.write(f":SOUR:{self.source}:LEV {level}")
+        self.level = level
+
+    def readings_length(self, n: int = 1) -> int:
+        """Number of bytes to read for ``n`` readings in the current data format."""
+        dtype = DATA_FORMATS[self.data_format]
+        if dtype is None:
+            return ASCII_FIELD_LENGTH * READING_FIELDS * n + 100
+        return dtype.itemsize * READING_FIELDS * n + 3
+
+    def parse(self, data_bytes: bytes) -> np.ndarray:
+        """Parse readings received in the current data format as an (n, 5) array."""
+        dtype = DATA_FORMATS[self.data_format]
+        if dtype is None:
+            return parse_readings(data_bytes)
+        return parse_binary(data_bytes, dtype)
+
+    def read_readings(self, n: int = 1) -> np.ndarray:
+        """Read ``n`` readings in the current data format as an (n, 5) array."""
+        return self.parse(self.read(self.readings_length(n)))
+
+    def trigger_reading(self) -> None:
+        """Start one measurement with :READ?; fetch it later with :meth:`measure`.
+
+        The bus is free while the instrument settles and integrates, so other
+        instruments can be served in the meantime.
+        """
+        self.write(":READ?")
+
+    def measure(self) -> Reading:
+        """Read the next reading from the instrument."""
+        return Reading(*map(float, self.read_readings()[0]))
+
+    def measure_when_ready(self, timeout: float = 10.0) -> Reading:
+        """Trigger a reading and read it as soon as the instrument has it.
+
+        Replaces a fixed host sleep before reading: the instrument applies its
+        source delay, measures and requests service, and the reading is fetched
+        right then. Needs ``enable_srq(STB_MAV)``.
+        """
+        self.trigger_reading()
+        self.wait_for_service(timeout)
+        return self.measure()
+
+    def buffered_sweep(self, levels, delay: float, use_srq: bool = False,
+                       point_time: float | None = None) -> np.ndarray:
+        """Run a whole list sweep on the instrument and return all readings.
+
+        The levels are loaded as a source list, the instrument steps through
+        them on its own trigger engine with ``delay`` as source delay, and every
+        reading is stored in the trace buffer and read back in one transfer.
+        With ``use_srq`` the end of the sweep is detected by the buffer-full
+        service request instead of sleeping for the expected sweep time.
+        ``point_time`` is the expected time per point (default: ``delay`` plus
+        integration and averaging, see :meth:`reading_time`).
+        Returns an (N, 5) array of V, I, R, t, status.
+        """
+        levels = np.asarray(levels)
+        n = len(levels)
+        if n > MAX_BUFFER_POINTS:
+            raise ValueError(f"Buffered sweep supports at most {MAX_BUFFER_POINTS} points, got {n}")
+        with self.batch():
+            for k in range(0, n, LIST_CHUNK):
+                chunk = ",".join(f"{value:g}" for value in levels[k:k+LIST_CHUNK])
+                command = f":SOUR:LIST:{self.source}" if k == 0 else f":SOUR:LIST:{self.source}:APP"
+                self.write(f"{command} {chunk}")
+            self.setting(f":SOUR:{self.source}:MODE", "LIST")
+            self.set_source_delay(delay)
+            self.setting(":TRIG:COUN", n)           # One trigger per list point
+            self.setting(":TRAC:POIN", n)           # Store every reading in the trace buffer
+            self.setting(":TRAC:FEED", "SENS")
+            self.write(":TRAC:FEED:CONT NEXT")      # Re-armed for every sweep, never cached
+            if use_srq:
+                self.enable_srq(0, MEAS_BUFFER_FULL)
+        if point_time is None:
+            self.line_frequency()  # Known for reading_time()
+            point_time = self.reading_time()
+        sweep_time = n * point_time
+        try:
+            self.write(":INIT")                 # Arm and run the sweep
+
+            self._alive(sweep_time)
+            if use_srq:
+                # The instrument requests service as soon as the trace buffer is full
+                self.wait_for_service(timeout=sweep_time + 10)
+                self.query(":STAT:MEAS?", 100)  # Clear the measurement event register
+            else:
+                # Wait for the sweep to finish: *OPC? only answers once all readings are taken
+                time.sleep(sweep_time)
+                self.query("*OPC?", 100)
+
+            # Pull all readings back in one bulk transfer
+            self.write(":TRAC:DATA?")
+            return self.read_readings(n)
+        finally:
+            self.abort_sweep()
+
+    def pulsed_sweep(self, levels, pulse_width: float, duty_cycle: float,
+                     measure_time: float, use_srq: bool = False) -> np.ndarray:
+        """Buffered sweep of short source pulses, the output is off between them.
+
+        With ``:SOUR:CLE:AUTO ON`` the instrument turns the output on for every
+        point, waits the source delay, measures for ``measure_time`` (set as
+        NPLC) and turns the output off again, so every pulse is
+        ``pulse_width`` long. The trigger delay keeps the output off for the
+        rest of the period, ``pulse_width / duty_cycle``. The whole sweep runs
+        on the instrument and is read back in one transfer like
+        :meth:`buffered_sweep`, which also gives the return value.
+        """
+        if not 0 < duty_cycle <= 1:
+            raise ValueError(f"Duty cycle must be in (0, 1], got {duty_cycle}")
+        if not 0 < measure_time <= pulse_width:
+            raise ValueError(f"Measurement time {measure_time} s does not fit into a {pulse_width} s pulse")
+        nplc = min(max(measure_time * self.line_frequency(), MIN_NPLC), MAX_NPLC)
+        period = pulse_width / duty_cycle
+        with self.batch():
+            self.set_nplc(nplc)
+            self.setting(":TRIG:DEL", period - pulse_width)
+            self.setting(":SOUR:CLE:AUTO", "ON")
+        try:
+            return self.buffered_sweep(levels, pulse_width - nplc / self.line_frequency(), use_srq,
+                                       point_time=period)
+        finally:
+            with self.batch():
+                self.setting(":SOUR:CLE:AUTO", "OFF")
+                self.setting(":TRIG:DEL", 0)
+
+    def abort_sweep(self) -> None:
+        """Stop a running list sweep and go back to fixed source mode."""
+        with self.batch():
+            self.write(":ABOR")
+            self.write(":TRAC:FEED:CONT NEV")
+            self.setting(f":SOUR:{self.source}:MODE", "FIXED")
+            self.setting(":TRIG:COUN", 1)  # One reading per :READ? again
+
+    # ------------------------------------------------------------------
+    # Ramping and shutdown
+
+    def set_slew_rate(self, rate: float | None) -> None:
+        """Limit ramps to ``rate`` V/s (voltage source) or A/s (current source).
+
+        Every ramp step is then held for ``step / rate`` instead of the delay
+        passed to the ramp, so a ramp over ``level`` takes about
+        ``abs(level) / rate``. ``None`` holds every step for the delay again.
+        """
+        self.slew_rate = rate
+
+    def _step_delay(self, step: float, delay: float) -> float:
+        return delay if self.slew_rate is None else abs(step) / self.slew_rate
+
+    @contextmanager
+    def fast_readings(self):
+        """Shortest integration and no averaging inside the block, restored afterwards.
+
+        For readings that are not used, e.g. the one the instrument takes on
+        every ramp step.
+        """
+        nplc_header = f":SENS:{self.sense}:NPLC"
+        saved = {nplc_header: self._settings.get(nplc_header, "1"),  # *RST values
+                 ":SENS:AVER": self._settings.get(":SENS:AVER", "OFF")}
+        with self.batch():
+            self.set_nplc(MIN_NPLC)
+            self.setting(":SENS:AVER", "OFF")
+        try:
+            yield self
+        finally:
+            with self.batch():
+                for header, value in saved.items():
+                    self.setting(header, value)
+
+    def step_levels(self, levels, delay: float, verbose: bool = False) -> None:
+        """Step the source through ``levels``, holding each one for ``delay``.
+
+        The instrument times the steps: every level is set in fixed mode and
+        followed by ``:INIT;*WAI``, which applies the source delay and one
+        reading before the next level is parsed. Many steps go out in one
+        message, and the host only waits for ``*OPC?`` after each message.
+        The readings of the steps use :meth:`fast_readings`; the source delay
+        and trigger count are put back afterwards, so the readings after a
+        ramp are not slowed down by the ramp delay.
+        """
+        name, unit = ("voltage", "V") if self.source == "VOLT" else ("current", "A")
+        saved_delay = self._settings.get(":SOUR:DEL")       # None: auto delay (*RST)
+        saved_count = self._settings.get(":TRIG:COUN", "1")
+        with self.batch():
+            self.setting(f":SOUR:{self.source}:MODE", "FIXED")
+            self.setting(":TRIG:COUN", 1)
+            self.set_source_delay(delay)
+        steps_per_message = max(1, int(MAX_STEPS_TIME / (delay + 0.05)))
+        levels = list(levels)
+        try:
+            with self.fast_readings():
+                for k in range(0, len(levels), steps_per_message):
+                    chunk = levels[k:k+steps_per_message]
+                    with self.batch():
+                        for level in chunk:
+                            self.write(f":SOUR:{self.source}:LEV {level:.6g}")
+                            self.write(":INIT")
+                            self.write("*WAI")
+                    self.level = chunk[-1]
+                    self._alive(len(chunk) * (delay + 0.05))
+                    self.query("*OPC?", 100)  # Answers once the last step of the message is done
+                    if verbose:
+                        for level in chunk:
+                            print(f"Ramping {name}: {level:.3g} {unit}")
+        finally:
+            with self.batch():
+                self.setting(":TRIG:COUN", saved_count)
+                if saved_delay is None:
+                    self.set_auto_source_delay()
+                else:
+                    self.set_source_delay(saved_delay)
+
+    def ramp(self, start: float, stop: float, step: float, delay: float) -> None:
+        """Step the source from ``start`` to ``stop`` (inclusive) in ``step`` increments.
+
+        With a slew rate set (:meth:`set_slew_rate`) it limits the speed instead of ``delay``.
+        """
+        step = abs(step) if stop >= start else -abs(step)
+        self.step_levels(np.arange(start, stop + step, step), self._step_delay(step, delay))
+
+    def ramp_to_zero(self, level: float, step: float, delay: float,
+                     threshold: float | None = None, verbose: bool = False) -> None:
+        """Ramp the source from ``level`` back to zero in steps of about ``step``.
+
+        A level within ``threshold`` of zero is set to zero directly. The
+        default threshold is one ``step``, so it has the unit and scale of the
+        sweep (a nA current sweep is ramped as well as a 10 V one). With a
+        slew rate set (:meth:`set_slew_rate`) it limits the speed instead of
+        ``delay``.
+        """
+        threshold = abs(step) if threshold is None else threshold
+        levels = []
+        if abs(level) > threshold:  # Only ramp if the level is not already close to zero
+            ramp_steps = max(int(abs(level) / abs(step)), 1)
+            levels = list(np.linspace(level, 0, ramp_steps + 1)[1:])  # Exclude the start level
+        levels.append(0)  # Final set to exactly zero
+        self.step_levels(levels, self._step_delay(abs(level) / len(levels), delay), verbose)
+
+    def ramp_off(self, level: float = 0, step: float = 0.1, delay: float = 0.05,
+                 threshold: float | None = None, verbose: bool = False) -> None:
+        """Ramp to zero and switch the output off, keeping the connection open.
+
+        The output is switched off even if ramping fails, so this is safe to
+        call from a ``finally`` block; errors of the ramp are printed, a
+        ``KeyboardInterrupt`` is raised again once the output is off.
+        Another Ctrl+C (or SIGTERM) during the ramp skips the rest of it and
+        switches the output off directly.
+        """
+        name = "voltage" if self.source == "VOLT" else "current"
+        print(f"Ramping {name} back to zero...")
+        with signals_abort_ramp():
+            try:
+                self.ramp_to_zero(level, step, delay, threshold, verbose)
+                print(f"{name.capitalize()} ramped to zero.")
+                self.output_off()
+            except BaseException as e:
+                print(f"Error during {name} ramp: {e!r}")
+                # Still try to turn off output even if ramping fails
+                try:
+                    self.force_output_off()
+                except Exception:
+                    pass
+                if not isinstance(e, Exception):
+                    raise
+
+    def shutdown(self, level: float = 0, step: float = 0.1, delay: float = 0.05,
+                 threshold: float | None = None, verbose: bool = False) -> None:
+        """Ramp to zero, switch the output off and close the connection.
+
+        Ramps with :meth:`ramp_off`, and errors while closing are ignored, so
+        this is safe to call from a ``finally`` block. The watchdog is stopped.
+        """
+        try:
+            self.ramp_off(level, step, delay, threshold, verbose)
+        finally:
+            # Close the connection
+            try:
+                self.close()
+            except Exception:
+                pass
@@ -0,0 +1,250 @@
+"""Bounded-memory storage of long I-t traces at several resolutions.
+
+For stability tests running for days, storing every reading makes huge files
+although mostly coarse data is needed. :class:`MultiResolutionStore` keeps
+
+* the raw samples of the last ``raw_window`` seconds in a ring buffer (in
+  memory, for the live plot, and saved when the run ends)
+* one file per aggregation interval (default 1 s and 1 min) with the mean,
+  minimum, maximum and number of samples of every interval, for the whole run
+* optionally an event file with full-rate samples around spikes: every sample
+  deviating from the median of the raw samples of the last first-tier
+  interval by more than ``spike_threshold`` is saved with ``event_window``
+  seconds before and after it (the median is not pulled along by the spikes
+  themselves, unlike the mean)
+
+Memory use only depends on the size of the ring buffer, not on the run
+length: it grows until it holds ``raw_window`` seconds of samples. Combine it with averaging on the instrument
+(:meth:`Keithley2400.set_averaging`, :meth:`Keithley2400.set_nplc`) to lower
+the noise and the reading rate.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from .storage import open_writer
+
+
+class RingBuffer:
+    """Last ``capacity`` rows of a stream, with a non-decreasing first column (time).
+
+    With ``span`` the buffer starts small and doubles, up to ``capacity``
+    rows, while the rows it holds cover less than ``span`` seconds, so its
+    size follows the sample rate.
+    """
+
+    def __init__(self, columns: int, capacity: int, span: float | None = None):
+        self.capacity = capacity
+        self.span = span
+        self._data = np.empty((capacity if span is None else min(capacity, 1024), columns))
+        self._position = 0  # Next row to write
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def extend(self, rows) -> None:
+        rows = np.asarray(rows, dtype=float).reshape(-1, self._data.shape[1])
+        needed = self._size + len(rows)
+        if self.span is not None and len(self._data) < min(needed, self.capacity):
+            oldest = self.first() if self._size else rows[0, 0]
+            if rows[-1, 0] - oldest < self.span:
+                self._resize(min(self.capacity, max(2 * len(self._data), needed)))
+        capacity = len(self._data)
+        rows = rows[-capacity:]
+        n = len(rows)
+        first = min(n, capacity - self._position)
+        self._data[self._position:self._position + first] = rows[:first]
+        self._data[:n - first] = rows[first:]
+        self._position = (self._position + n) % capacity
+        self._size = min(self._size + n, capacity)
+
+    def _resize(self, capacity: int) -> None:
+        rows = np.concatenate(self._segments())
+        self._data = np.empty((capacity, self._data.shape[1]))
+        self._data[:len(rows)] = rows
+        self._size = len(rows)
+        self._position = self._size % capacity
+
+    def _segments(self):
+        """The stored rows as (older, newer) views, each sorted by time."""
+        if self._size < len(self._data):
+            return self._data[:0], self._data[:self._size]
+        return self._data[self._position:], self._data[:self._position]
+
+    def since(self, start: float) -> np.ndarray:
+        """Copy of the rows with time >= ``start``, oldest first."""
+        older, newer = self._segments()
+        return np.concatenate((
+            older[np.searchsorted(older[:, 0], start, side='left'):],
+            newer[np.searchsorted(newer[:, 0], start, side='left'):],
+        ))
+
+    def first(self) -> float:
+        """Time of the oldest row."""
+        older, newer = self._segments()
+        return older[0, 0] if len(older) else newer[0, 0]
+
+    def last(self) -> float:
+        """Time of the newest row."""
+        return self._data[self._position - 1, 0]
+
+
+class Aggregator:
+    """Mean, minimum, maximum and count of a stream per ``interval`` seconds.
+
+    Every finished interval is written as a row ``(start, mean, min, max,
+    count)`` to ``writer``; :meth:`close` writes the last, partial one.
+    """
+
+    def __init__(self, interval: float, writer):
+        self.interval = interval
+        self.writer = writer
+        self.last_mean = None  # Mean of the last finished interval
+        self._bin = None       # Interval being accumulated and its sums
+        self._sums = None
+
+    def add(self, t, y) -> None:
+        bins = np.floor(t / self.interval).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        sums = np.column_stack((
+            np.add.reduceat(y, starts),
+            np.minimum.reduceat(y, starts),
+            np.maximum.reduceat(y, starts),
+            np.diff(np.r_[starts, len(y)]),
+        ))
+        if bins[0] == self._bin:
+            # The batch continues the open interval
+            total, low, high, count = self._sums
+            sums[0] = total + sums[0, 0], min(low, sums[0, 1]), max(high, sums[0, 2]), count + sums[0, 3]
+        elif self._bin is not None:
+            self._emit(np.array([self._bin]), self._sums[np.newaxis])
+        self._emit(bins[starts[:-1]], sums[:-1])
+        self._bin, self._sums = bins[starts[-1]], sums[-1]
+
+    def _emit(self, bins, sums) -> None:
+        if not len(bins):
+            return
+        mean = sums[:, 0] / sums[:, 3]
+        self.writer.write(np.column_stack((bins * self.interval, mean, sums[:, 1], sums[:, 2], sums[:, 3])))
+        self.last_mean = mean[-1]
+
+    def close(self) -> None:
+        if self._bin is not None:
+            self._emit(np.array([self._bin]), self._sums[np.newaxis])
+            self._bin = None
+        self.writer.close()
+
+
+class MultiResolutionStore:
+    """Raw ring buffer, per-interval aggregates and spike events of a (time, current) stream.
+
+    ``filename`` (without extension) gets the suffixes ``_<interval>s`` for
+    the aggregates, ``_events`` for the spike events and ``_raw`` for the raw
+    samples of the last ``raw_window`` seconds, which are saved on
+    :meth:`close`. The ring buffer grows to hold ``raw_window`` seconds, but
+    at most ``max_raw_points`` samples. Spikes are found once the buffer
+    covers the first interval (or is full).
+    Has the ``write``/``close``/``filename`` interface of the streaming
+    writers of :mod:`keithley2400.storage`.
+    """
+
+    def __init__(self, filename: str, file_format: str = "txt", raw_window: float = 600.0,
+                 intervals=(1.0, 60.0), spike_threshold: float | None = None,
+                 event_window: float = 5.0, max_raw_points: int = 1_000_000):
+        if not intervals:
+            raise ValueError("At least one aggregation interval is needed")
+        self.file_format = file_format
+        self.raw_window = raw_window
+        self.spike_threshold = spike_threshold
+        self.event_window = event_window
+        self.raw = RingBuffer(2, max_raw_points, span=max(raw_window, intervals[0]))
+        self.tiers = [
+            Aggregator(interval, open_writer(f"{filename}_{interval:g}s",
+                                             "Time (s)\tMean (A)\tMin (A)\tMax (A)\tCount", file_format))
+            for interval in intervals
+        ]
+        self._raw_filename = f"{filename}_raw"
+        self.events = None
+        if spike_threshold is not None:
+            self.events = open_writer(f"{filename}_events", "Time (s)\tCurrent (A)\tEvent", file_format)
+        self.event_count = 0
+        self._last_spike = -np.inf     # Time of the latest spike seen
+        self._written_until = -np.inf  # Time of the last sample written to the event file
+        self.filenames = [tier.writer.filename for tier in self.tiers]
+        if self.events is not None:
+            self.filenames.append(self.events.filename)
+        self.filename = self.filenames[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rows) -> None:
+        """Add a batch of ``(time, current)`` rows."""
+        rows = np.asarray(rows, dtype=float).reshape(-1, 2)
+        if not len(rows):
+            return
+        t, y = rows[:, 0], rows[:, 1]
+        reference = self._reference() if self.events is not None else None
+        self.raw.extend(rows)
+        if self.events is not None and reference is not None:
+            self._capture_events(t, np.abs(y - reference) > self.spike_threshold)
+        for tier in self.tiers:
+            tier.add(t, y)
+
+    def _reference(self) -> float | None:
+        """Median of the raw samples of the last first-tier interval, None until there is one."""
+        interval = self.tiers[0].interval
+        if not len(self.raw):
+            return None
+        if self.raw.last() - self.raw.first() < interval and len(self.raw) < self.raw.capacity:
+            return None
+        return float(np.median(self.raw.since(self.raw.last() - interval)[:, 1]))
+
+    def _capture_events(self, t, spikes) -> None:
+        """Write the samples within ``event_window`` of a spike to the event file.
+
+        Must run after the batch has been added to the ring buffer, which also
+        provides the samples before the first spike of the batch.
+        """
+        window = self.event_window
+        if not spikes.any() and t[0] > self._last_spike + window:
+            return
+        start = min(t[spikes][0] - window, t[0]) if spikes.any() else t[0]
+        rows = self.raw.since(start)
+        s = rows[:, 0]
+        row_spikes = np.zeros(len(rows), dtype=bool)
+        row_spikes[len(rows) - len(t):] = spikes  # The batch is the end of the rows
+
+        # Time of the latest spike at or before and of the next spike at or after each sample
+        previous = np.maximum(np.maximum.accumulate(np.where(row_spikes, s, -np.inf)), self._last_spike)
+        following = np.minimum.accumulate(np.where(row_spikes, s, np.inf)[::-1])[::-1]
+        captured = (s - previous <= window) | (following - s <= window)
+        before = self._last_spike + window >= s[0]  # The sample before the rows was captured
+        new = captured & ~np.r_[before, captured[:-1]]
+        write = captured & (s > self._written_until)
+        if write.any():
+            event = self.event_count + np.cumsum(new)
+            self.events.write(np.column_stack((rows[write], event[write])))
+            self._written_until = s[write][-1]
+        self.event_count += int(new.sum())
+        self._last_spike = previous[-1]
+
+    def recent(self, seconds: float) -> np.ndarray:
+        """Raw ``(time, current)`` rows of the last ``seconds`` seconds."""
+        if not len(self.raw):
+            return np.empty((0, 2))
+        return self.raw.since(self.raw.last() - seconds)
+
+    def close(self) -> None:
+        """Write the open intervals and save the raw samples of the last ``raw_window`` seconds."""
+        for tier in self.tiers:
+            tier.close()
+        if self.events is not None:
+            self.events.close()
+        with open_writer(self._raw_filename, "Time (s)\tCurrent (A)", self.file_format) as writer:
+            writer.write(self.recent(self.raw_window))
+        self.filenames.append(writer.filename)
@@ -0,0 +1,187 @@
+"""Live detection of compliance, over-range readings and sudden jumps.
+
+:class:`AnomalyDetector` checks every reading of a point-by-point sweep or
+trace as it arrives, so a device sitting in compliance or breaking down stops
+costing sweep time (and the device) after a few points:
+
+* ``"compliance"``: the status word reports compliance for
+  ``compliance_points`` readings in a row
+* ``"overrange"``: the reading is over the measurement range (9.9e37, or the
+  overflow / range compliance bits of the status word)
+* ``"jump"``: the change from the previous reading (per unit of source level
+  while sweeping) is more than ``jump_sigma`` standard deviations off the mean
+  of the last ``window`` changes, e.g. a breakdown or a spike
+
+Each kind has an action: ``"abort"`` raises :class:`MeasurementAborted`,
+``"skip"`` skips the rest of the branch (every level at or beyond the level of
+the anomaly, see :meth:`AnomalyDetector.skipped`), ``"range"`` switches to the
+next higher fixed range and asks for the point to be measured again,
+``"warn"`` only prints it and ``None`` ignores it. Every anomaly is kept in
+``events``.
+"""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import numpy as np
+
+from .instrument import (OVERFLOW, STATUS_COMPLIANCE, STATUS_OVERFLOW, STATUS_RANGE_COMPLIANCE,
+                         Keithley2400, Reading)
+from .ranging import CURRENT_RANGES, VOLTAGE_RANGES
+
+ACTIONS = ("abort", "skip", "range", "warn", None)
+
+
+class MeasurementAborted(RuntimeError):
+    """Raised by :class:`AnomalyDetector` for an anomaly whose action is ``"abort"``."""
+
+
+class Anomaly(NamedTuple):
+    kind: str       # "compliance", "overrange" or "jump"
+    level: float    # Source level of the reading
+    value: float    # Sensed value
+    action: str | None
+
+
+class RollingStats:
+    """Mean and standard deviation of the last ``window`` values, O(1) per value.
+
+    The running sums are recomputed from the stored values once per
+    ``window`` values, so rounding errors do not pile up over long traces.
+    """
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self._values = np.zeros(window)
+        self.clear()
+
+    def clear(self) -> None:
+        self.count = 0
+        self._position = 0
+        self._sum = 0.0
+        self._squares = 0.0
+
+    def add(self, value: float) -> None:
+        window = self.window
+        if self.count == window:
+            old = self._values[self._position]
+            self._sum -= old
+            self._squares -= old * old
+        else:
+            self.count += 1
+        self._values[self._position] = value
+        self._sum += value
+        self._squares += value * value
+        self._position = (self._position + 1) % window
+        if self._position == 0:
+            self._sum = float(self._values.sum())
+            self._squares = float(np.dot(self._values, self._values))
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return float(np.sqrt(max(self._squares / self.count - self.mean ** 2, 0.0)))
+
+
+class AnomalyDetector:
+    """Check the readings of a sweep or trace and apply the action of every anomaly.
+
+    ``sense_range`` is the fixed range selected on the instrument; without it
+    (autorange or :class:`~keithley2400.ranging.RangeManager`) the
+    ``"range"`` action only warns. ``jump_sigma=None`` turns the jump test
+    off: it suits traces and smooth curves, while exponential curves (diodes)
+    need a high threshold. ``verbose`` prints every anomaly.
+    """
+
+    def __init__(self, instrument: Keithley2400, sense_range: float | None = None,
+                 on_compliance: str | None = "skip", compliance_points: int = 3,
+                 on_overrange: str | None = "range", jump_sigma: float | None = None,
+                 on_jump: str | None = "abort", window: int = 20, verbose: bool = True):
+        for action in (on_compliance, on_overrange, on_jump):
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown action {action!r}, use one of {ACTIONS}")
+        self.instrument = instrument
+        self.sense = instrument.sense
+        self.ranges = CURRENT_RANGES if self.sense == "CURR" else VOLTAGE_RANGES
+        self.range = sense_range
+        self.actions = {"compliance": on_compliance, "overrange": on_overrange, "jump": on_jump}
+        self.compliance_points = compliance_points
+        self.jump_sigma = jump_sigma
+        self.verbose = verbose
+        self.changes = RollingStats(window)
+        self.bounds = [-np.inf, np.inf]  # Levels outside are skipped, narrowed by "skip"
+        self.events = []
+        self._in_compliance = 0          # Readings in compliance in a row
+        self._previous = None            # (level, value) of the previous reading
+        self._direction = 0.0
+
+    def skipped(self, level: float) -> bool:
+        """Whether ``level`` lies in a branch skipped after an anomaly."""
+        return not self.bounds[0] < level < self.bounds[1]
+
+    def check(self, level: float, reading: Reading) -> bool:
+        """Check one reading taken at source ``level``; returns True to measure the point again.
+
+        Raises :class:`MeasurementAborted` for an anomaly whose action is ``"abort"``.
+        """
+        value = reading.current if self.sense == "CURR" else reading.voltage
+        status = int(reading.status)
+        if abs(value) >= OVERFLOW or status & (STATUS_OVERFLOW | STATUS_RANGE_COMPLIANCE):
+            return self._act("overrange", level, value)
+
+        self._in_compliance = self._in_compliance + 1 if status & STATUS_COMPLIANCE else 0
+        if self._in_compliance == self.compliance_points:
+            return self._act("compliance", level, value)
+        if self.jump_sigma is not None and self._jumped(level, value):
+            return self._act("jump", level, value)
+        return False
+
+    def _jumped(self, level: float, value: float) -> bool:
+        """Test the change since the previous reading against the recent changes."""
+        previous, self._previous = self._previous, (level, value)
+        if previous is None:
+            return False
+        step = level - previous[0]
+        if abs(step) <= 1e-9 * abs(level):
+            step = 0.0  # Rounding noise of a repeated level
+        direction = np.sign(step)
+        if direction != self._direction:
+            self.changes.clear()  # A new leg (or the turn of a sweep) changes the sign of the slope
+            self._direction = direction
+        change = (value - previous[1]) / step if step else value - previous[1]
+        stats = self.changes
+        jumped = (stats.count >= max(stats.window // 2, 2) and stats.std > 0
+                  and abs(change - stats.mean) > self.jump_sigma * stats.std)
+        if not jumped:
+            stats.add(change)
+        return jumped
+
+    def _act(self, kind: str, level: float, value: float) -> bool:
+        action = self.actions[kind]
+        if action is None:
+            return False
+        if action == "range" and (self.range is None or self.range >= self.ranges[-1]):
+            action = "warn"  # No fixed range to raise
+        self.events.append(Anomaly(kind, float(level), float(value), action))
+        if self.verbose:
+            print(f"{kind.capitalize()} at source level {level:.6g}: reading {value:.6g}, action: {action}")
+        if action == "abort":
+            raise MeasurementAborted(f"{kind} at source level {level:.6g}")
+        if action == "skip":
+            if level > 0:
+                self.bounds[1] = min(self.bounds[1], level)
+            elif level < 0:
+                self.bounds[0] = max(self.bounds[0], level)
+            else:
+                raise MeasurementAborted(f"{kind} at source level 0")
+        elif action == "range":
+            self.range = min(r for r in self.ranges if r > self.range)
+            self.instrument.set_sense_range(self.range)
+            self._previous = None  # The new range changes the noise of the next change
+            return True
+        return False
@@ -0,0 +1,131 @@
+"""Nearest-point lookup for the crosshair, measured in screen (view) distance.
+
+The crosshair label shows the data point that *looks* nearest to the mouse,
+so distances are compared in pixels: ``dx / x_scale`` and ``dy / y_scale``
+with the scales in data units per pixel. Both indexes answer a query in
+O(log n) or a few grid cells, without building temporary arrays:
+
+* :class:`SortedIndex` for non-decreasing x (time): binary search, then a
+  short walk outwards that stops as soon as no closer point is possible
+* :class:`GridIndex` for sweeps, where x repeats on the forward and backward
+  branches: points bucketed in a 2-D grid, searched ring by ring around the
+  mouse
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+class SortedIndex:
+    """Nearest point of data with non-decreasing x.
+
+    ``x`` and ``y`` are used as they are (e.g. views of a
+    :class:`~keithley2400.buffer.GrowableBuffer`), nothing is copied.
+    ``max_walk`` bounds the points checked one by one on each side of the
+    insertion point; when very many points share a pixel column (zoomed far
+    out) the rest of the candidates are searched in one vectorized step.
+    """
+
+    def __init__(self, x, y, max_walk: int = 256):
+        self.x = x
+        self.y = y
+        self.max_walk = max_walk
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def nearest(self, x: float, y: float, x_scale: float = 1.0, y_scale: float = 1.0) -> int:
+        """Index of the point nearest to ``(x, y)`` on screen, -1 if there is no data."""
+        n = len(self.x)
+        if n == 0:
+            return -1
+        position = int(np.searchsorted(self.x, x))
+        best, best_distance, cut_short = -1, np.inf, False
+        for start, stop, step in ((position, min(n, position + self.max_walk), 1),
+                                  (position - 1, max(-1, position - 1 - self.max_walk), -1)):
+            for i in range(start, stop, step):
+                dx = (self.x[i] - x) / x_scale
+                if dx * dx >= best_distance:
+                    break  # x only moves further away in this direction
+                dy = (self.y[i] - y) / y_scale
+                distance = dx * dx + dy * dy
+                if distance < best_distance:
+                    best, best_distance = i, distance
+            else:
+                cut_short |= stop not in (n, -1)
+        if cut_short:
+            # Zoomed far out: search the remaining candidates at once
+            reach = np.sqrt(best_distance) * x_scale
+            first = int(np.searchsorted(self.x, x - reach, side='left'))
+            last = int(np.searchsorted(self.x, x + reach, side='right'))
+            distance = ((self.x[first:last] - x) / x_scale) ** 2 + ((self.y[first:last] - y) / y_scale) ** 2
+            best = first + int(np.argmin(distance))
+        return best
+
+
+class GridIndex:
+    """Nearest point of scattered data (e.g. both branches of a hysteresis sweep).
+
+    The points are sorted into a ``cells`` x ``cells`` grid over their
+    bounding box (default about two points per cell). A query checks the cell
+    under the mouse and then rings of cells around it until the ring is
+    further away on screen than the best point found.
+    """
+
+    def __init__(self, x, y, cells: int | None = None):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        n = len(self.x)
+        self.cells = cells or max(1, int(np.sqrt(n / 2)))
+        if n == 0:
+            return
+        self.x0, self.y0 = self.x.min(), self.y.min()
+        self.width = (self.x.max() - self.x0) / self.cells or 1.0
+        self.height = (self.y.max() - self.y0) / self.cells or 1.0
+        cell = self._cell_ids(self.x, self.y)
+        self.order = np.argsort(cell, kind='stable')
+        # Points of cell c are order[starts[c]:starts[c + 1]]
+        self.starts = np.searchsorted(cell[self.order], np.arange(self.cells * self.cells + 1))
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _column(self, x):
+        return np.clip(((x - self.x0) / self.width).astype(int), 0, self.cells - 1)
+
+    def _row(self, y):
+        return np.clip(((y - self.y0) / self.height).astype(int), 0, self.cells - 1)
+
+    def _cell_ids(self, x, y):
+        return self._row(y) * self.cells + self._column(x)
+
+    def nearest(self, x: float, y: float, x_scale: float = 1.0, y_scale: float = 1.0) -> int:
+        """Index of the point nearest to ``(x, y)`` on screen, -1 if there is no data."""
+        if len(self.x) == 0:
+            return -1
+        column = min(max(int((x - self.x0) // self.width), 0), self.cells - 1)
+        row = min(max(int((y - self.y0) // self.height), 0), self.cells - 1)
+        # Screen size of one cell, used to bound the distance of a whole ring
+        cell_dx, cell_dy = self.width / x_scale, self.height / y_scale
+        best, best_distance = -1, np.inf
+        for ring in range(self.cells):
+            # Every point in this ring is at least (ring - 1) cells away from the mouse
+            reach = max(ring - 1, 0) * min(cell_dx, cell_dy)
+            if reach * reach >= best_distance:
+                break
+            for r in range(row - ring, row + ring + 1):
+                if not 0 <= r < self.cells:
+                    continue
+                edge = r in (row - ring, row + ring)
+                for c in range(column - ring, column + ring + 1):
+                    if not 0 <= c < self.cells or not (edge or c in (column - ring, column + ring)):
+                        continue
+                    cell = r * self.cells + c
+                    for k in range(self.starts[cell], self.starts[cell + 1]):
+                        i = self.order[k]
+                        dx = (self.x[i] - x) / x_scale
+                        dy = (self.y[i] - y) / y_scale
+                        distance = dx * dx + dy * dy
+                        if distance < best_distance:
+                            best, best_distance = int(i), distance
+        return best
@@ -0,0 +1,234 @@
+"""Live plot window shared by the measurement scripts (pyqtgraph)."""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pyqtgraph as pg
+import pyqtgraph.exporters
+
+from .acquisition import consume
+from .decimate import LODPyramid, minmax_per_pixel
+
+# Offscreen window reused by render_png: (app, win, plot_widget)
+_offscreen = None
+
+
+def create_plot_window(title: str, x_label: str, y_label: str):
+    """Create the styled main window and return ``(app, win, plot_widget)``."""
+    app = pg.QtWidgets.QApplication.instance() or pg.QtWidgets.QApplication([])
+    win = pg.QtWidgets.QMainWindow()
+    win.setWindowTitle('Live Data Plotting with PyQtGraph')
+    win.setGeometry(100, 100, 1200, 800)
+    plot_widget = pg.PlotWidget()
+    win.setCentralWidget(plot_widget)
+
+    # Show right and top axis
+    plot_widget.showAxis('right')
+    plot_widget.showAxis('top')
+
+    # Increase the font size of x and y labels and set axis/tick color to black
+    font = pg.QtGui.QFont()
+    font.setPointSize(18)
+    for axis in ['left', 'bottom', 'right', 'top']:
+        ax = plot_widget.getAxis(axis)
+        if ax is not None:
+            ax.setTickFont(font)
+            ax.setPen(pg.mkPen(color='k', width=2))  # Axis line and ticks in black
+            ax.setTickPen(pg.mkPen(color='k', width=2))
+            ax.setTextPen(pg.mkPen(color='k'))       # Tick labels in black
+            ax.setLabel(ax.labelText, units=ax.labelUnits, **{'font-size': '18pt', 'color': 'k'})
+            if axis == 'left':
+                # Use a lambda to format y-axis ticks in scientific notation
+                ax.setStyle(autoExpandTextSpace=True, tickTextOffset=10, showValues=True)
+                ax.tickStrings = lambda values, scale, spacing: [f"{v:.2e}" for v in values]
+
+    # Change the background color to white
+    plot_widget.setBackground('w')
+
+    # Add a legend to the plot
+    legend = plot_widget.addLegend()
+    legend.setBrush(pg.mkBrush(color=(10, 10, 10, 10)))
+
+    set_labels(plot_widget, title, x_label, y_label)
+    plot_widget.showGrid(x=False, y=False)
+
+    # Remove tick labels from right and top axes (keep ticks but hide labels)
+    plot_widget.getAxis('right').tickStrings = lambda values, scale, spacing: ['' for v in values]
+    plot_widget.getAxis('top').tickStrings = lambda values, scale, spacing: ['' for v in values]
+
+    return app, win, plot_widget
+
+
+def set_labels(plot_widget, title: str, x_label: str, y_label: str) -> None:
+    """Set axis labels and title."""
+    plot_widget.setLabel('left', y_label)
+    plot_widget.setLabel('bottom', x_label)
+    plot_widget.setTitle(f"<span style='font-size:24pt; color:k;'>{title}</span>")
+
+
+def add_curve(plot_widget, color: str, name: str):
+    """Add an empty scatter curve (circle markers, no line)."""
+    return plot_widget.plot(
+        np.array([]), np.array([]),
+        pen=None,             # No line connecting points
+        symbol='o',           # Circle marker
+        symbolBrush=color,
+        symbolSize=8,
+        name=name
+    )
+
+
+class DecimatedCurve:
+    """Curve of a long, growing trace drawn through a min/max LOD pyramid.
+
+    Only the visible x window is handed to pyqtgraph: as the original circle
+    markers while it holds at most ``symbol_threshold`` points, and as a
+    min/max-per-pixel line beyond that. The window is recomputed only when
+    the x range moves, the plot is resized or new data arrives. ``buffer``
+    keeps the full-resolution data (e.g. for the crosshair).
+    """
+
+    def __init__(self, plot_widget, buffer, color: str, name: str, symbol_threshold: int = 5000):
+        self.plot_widget = plot_widget
+        self.buffer = buffer
+        self.color = color
+        self.symbol_threshold = symbol_threshold
+        self.pyramid = LODPyramid(buffer)
+        self.curve = add_curve(plot_widget, color, name)
+        self._decimated = False
+        self._key = None
+        plot_widget.plotItem.vb.sigXRangeChanged.connect(lambda *args: self.refresh())
+
+    def refresh(self) -> None:
+        """Update the pyramid with new data and redraw the visible window if needed."""
+        self.pyramid.update()
+        (x0, x1), _ = self.plot_widget.viewRange()
+        pixels = int(self.plot_widget.plotItem.vb.width()) or 1000
+        key = (x0, x1, pixels, len(self.buffer))
+        if key == self._key:
+            return
+        self._key = key
+        x, y, decimated = self.pyramid.view(x0, x1, pixels, max_points=self.symbol_threshold)
+        if decimated != self._decimated:
+            self._decimated = decimated
+            if decimated:
+                self.curve.setSymbol(None)
+                self.curve.setPen(pg.mkPen(self.color, width=1))
+            else:
+                self.curve.setPen(None)
+                self.curve.setSymbol('o')
+        self.curve.setData(x, y)
+
+
+def show(win) -> None:
+    """Show the window and let Qt draw it before the measurement starts."""
+    win.show()
+    process_events()
+
+
+def process_events() -> None:
+    pg.QtWidgets.QApplication.processEvents()
+
+
+def run_live(acquisition, update, rate: float = 20) -> None:
+    """Refresh the plot at a fixed frame rate while ``acquisition`` runs.
+
+    Every ``1/rate`` seconds the samples queued by the
+    :class:`~keithley2400.acquisition.AcquisitionThread` are passed to
+    ``update`` as one batch and Qt redraws once. The instrument loop never waits
+    for the GUI, so redraw time does not change the sample interval. Returns
+    when the acquisition has finished and all samples are consumed; an error in
+    the acquisition is re-raised here.
+    """
+    consume(acquisition, update, 1.0 / rate, idle=process_events)
+    process_events()
+
+
+def export_png(plot_widget, filename: str) -> None:
+    """Save the plot to ``filename + '.png'``."""
+    exporter = pg.exporters.ImageExporter(plot_widget.plotItem)
+    exporter.export(filename + ".png")
+
+
+def render_png(filename: str, title: str, x_label: str, y_label: str,
+               curves, x_range=None) -> None:
+    """Draw finished data offscreen and save it as ``filename + '.png'``.
+
+    Used after headless runs: no window is shown and no display is needed.
+    ``curves`` is a list of ``(x, y, color, name)``. The offscreen window is
+    created on the first call and reused, so rendering many plots in one
+    process (e.g. :mod:`keithley2400.runner`) sets up Qt only once.
+    """
+    global _offscreen
+    if _offscreen is None:
+        if pg.QtWidgets.QApplication.instance() is None:
+            os.environ["QT_QPA_PLATFORM"] = "offscreen"
+        _offscreen = create_plot_window(title, x_label, y_label)
+        if os.environ.get("QT_QPA_PLATFORM") == "offscreen":
+            _offscreen[1].show()  # Lays the window out at full size, nothing is displayed
+    app, win, plot_widget = _offscreen
+    plot_widget.clear()
+    plot_widget.plotItem.legend.clear()
+    set_labels(plot_widget, title, x_label, y_label)
+    if x_range is not None:
+        plot_widget.setXRange(*x_range)
+    else:
+        plot_widget.enableAutoRange()
+    for x, y, color, name in curves:
+        curve = add_curve(plot_widget, color, name)
+        if len(x) > 5000 and np.all(np.diff(x) >= 0):
+            # Long traces (I-t) are drawn as a min/max line, one pair per pixel
+            x0, x1 = x_range if x_range is not None else (x[0], x[-1])
+            x, y = minmax_per_pixel(x, y, y, x0, x1, 1200)
+            curve.setSymbol(None)
+            curve.setPen(pg.mkPen(color, width=1))
+        curve.setData(x, y)
+    process_events()
+    export_png(plot_widget, filename)
+
+
+def add_crosshair(plot_widget, index, label_format):
+    """Add a crosshair with a label showing the data point nearest to the mouse.
+
+    ``index`` is a :class:`~keithley2400.nearest.SortedIndex` (time traces) or
+    :class:`~keithley2400.nearest.GridIndex` (sweeps) over the data; the
+    nearest point is the one closest on screen. ``label_format`` turns the
+    nearest ``(x, y)`` into the label text. The returned signal proxy must be
+    kept alive by the caller.
+    """
+    vLine = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('g', width=1))
+    hLine = pg.InfiniteLine(angle=0, movable=False, pen=pg.mkPen('g', width=1))
+    plot_widget.addItem(vLine, ignoreBounds=True)
+    plot_widget.addItem(hLine, ignoreBounds=True)
+    coord_label = pg.TextItem("", anchor=(0, 1), color='k')
+    plot_widget.addItem(coord_label)
+    view_box = plot_widget.plotItem.vb
+
+    def mouseMoved(evt):
+        pos = evt[0]  # using signal proxy turns original arguments into a tuple
+        if plot_widget.sceneBoundingRect().contains(pos):
+            mousePoint = view_box.mapSceneToView(pos)
+            x = mousePoint.x()
+            y = mousePoint.y()
+            vLine.setPos(x)
+            hLine.setPos(y)
+            # Find the closest data point on screen: scales are data units per pixel
+            (x0, x1), (y0, y1) = view_box.viewRange()
+            x_scale = (x1 - x0) / max(view_box.width(), 1.0) or 1.0
+            y_scale = (y1 - y0) / max(view_box.height(), 1.0) or 1.0
+            i = index.nearest(x, y, x_scale, y_scale)
+            if i >= 0:
+                x_nearest = index.x[i]
+                y_nearest = index.y[i]
+                coord_label.setText(label_format(x_nearest, y_nearest))
+                coord_label.setPos(x_nearest, y_nearest)
+            else:
+                coord_label.setText("")
+
+    return pg.SignalProxy(plot_widget.scene().sigMouseMoved, rateLimit=60, slot=mouseMoved)
+
+
+def exec_app() -> None:
+    """Keep the window open for interactive inspection."""
+    pg.QtWidgets.QApplication.instance().exec()
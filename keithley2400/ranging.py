@@ -0,0 +1,110 @@
+"""Managed ranging of the sensed quantity for sweeps over many decades.
+
+A fixed range clips large readings and loses resolution on small ones, and the
+instrument's autorange spends extra time on every reading. :class:`RangeManager`
+keeps a fixed range and changes it only when needed:
+
+* before each point the range is predicted from the recent readings (or taken
+  from the cache of the source region, so the return leg of a hysteresis sweep
+  reuses the ranges found on the way out)
+* ``:RANG`` is only sent when the predicted range differs from the current one
+* an overflowed reading is repeated on the next higher range, so no clipped
+  reading is ever returned
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from .instrument import OVERFLOW, Keithley2400, Reading
+
+
+# Measurement ranges of the 2400
+CURRENT_RANGES = (1e-6, 10e-6, 100e-6, 1e-3, 10e-3, 100e-3, 1.0)
+VOLTAGE_RANGES = (0.2, 2.0, 20.0, 200.0)
+
+# Largest factor a reading is extrapolated to grow by from one point to the next
+MAX_GROWTH = 100.0
+
+
+def range_for(value: float, ranges, headroom: float = 0.5) -> float:
+    """Smallest range in which ``|value|`` stays below ``headroom`` of full scale."""
+    for candidate in ranges:
+        if abs(value) <= headroom * candidate:
+            return candidate
+    return ranges[-1]
+
+
+class RangeManager:
+    """Fixed ranges chosen per point from predictions and a per-region cache.
+
+    ``region_width`` is the width of a source region in the cache (e.g. the
+    sweep step); levels in the same region reuse the range found there first.
+    ``headroom`` is the fraction of full scale a predicted reading may use.
+    ``initial_range`` is the range already selected (e.g. by
+    :meth:`Keithley2400.configure`); without it the lowest range is selected.
+    ``changes`` and ``repeats`` count the range commands sent and the readings
+    repeated after an overflow.
+    """
+
+    def __init__(self, instrument: Keithley2400, region_width: float, ranges=None,
+                 headroom: float = 0.5, initial_range: float | None = None):
+        self.instrument = instrument
+        if ranges is None:
+            ranges = CURRENT_RANGES if instrument.sense == "CURR" else VOLTAGE_RANGES
+        self.ranges = tuple(ranges)
+        self.region_width = region_width
+        self.headroom = headroom
+        self.cache = {}
+        self.history = []  # The last two |readings|
+        self.changes = 0
+        self.repeats = 0
+        self.range = initial_range  # Range already selected on the instrument, if known
+        if initial_range is None:
+            self.set_range(self.ranges[0])
+
+    def _value(self, reading: Reading) -> float:
+        return reading.current if self.instrument.sense == "CURR" else reading.voltage
+
+    def _region(self, level: float) -> int:
+        return int(np.floor(level / self.region_width + 0.5))
+
+    def set_range(self, sense_range: float) -> None:
+        """Switch to ``sense_range``, sending nothing if it is already selected."""
+        if sense_range != self.range:
+            self.instrument.set_sense_range(sense_range)
+            self.range = sense_range
+            self.changes += 1
+
+    def predict(self, level: float) -> float:
+        """Range expected to fit the reading at source ``level``."""
+        cached = self.cache.get(self._region(level))
+        if len(self.history) < 2:
+            expected = self.history[-1] if self.history else 0.0
+        else:
+            previous, last = self.history
+            growth = min(last / previous, MAX_GROWTH) if previous > 0 else MAX_GROWTH
+            expected = last * max(growth, 1.0)
+        predicted = range_for(expected, self.ranges, self.headroom)
+        if cached is not None:
+            # Trust the cache, unless the trend asks for a larger range
+            return predicted if expected > self.headroom * cached else cached
+        return predicted
+
+    def measure(self, level: float, read) -> Reading:
+        """Set the range for ``level``, take a reading with ``read()`` and retry on overflow.
+
+        ``read`` sets the source and returns a :class:`Reading` (e.g. a wrapper
+        around :meth:`Keithley2400.measure`).
+        """
+        self.set_range(self.predict(level))
+        reading = read()
+        while abs(self._value(reading)) >= OVERFLOW and self.range < self.ranges[-1]:
+            self.set_range(min(r for r in self.ranges if r > self.range))
+            self.repeats += 1
+            reading = read()
+
+        value = abs(self._value(reading))
+        if value < OVERFLOW:
+            self.history = (self.history + [value])[-2:]
+            self.cache[self._region(level)] = range_for(value, self.ranges, self.headroom)
+        return reading
@@ -0,0 +1,310 @@
+"""Batch runner for hysteresis sweeps over many devices (wafers, die arrays, switch matrices).
+
+A job list gives one sweep per device. The jobs run back to back: every
+instrument is opened once and kept open, and configuring it for the next job
+is one bus message. Saving the data file and rendering the PNG of a job run in
+a pool of worker processes while the next job is measured, so the time per
+device is the sweep itself. Qt is only set up once per worker process (see
+:func:`keithley2400.plotting.render_png`).
+
+The job list is a JSON list of objects or a CSV file with a header, with the
+fields of :class:`SweepJob` (only ``device``, ``minimum``, ``maximum`` and
+``step`` are required)::
+
+    device,minimum,maximum,step,compliance,sense_range
+    die-01,5,5,0.25,1.05,1e-6
+    die-02,2,2,0.1,1.05,1e-6
+
+    python -m keithley2400.runner jobs.csv --directory data
+
+Files are named like those of the scripts (``voltage_sweep_data_<time>_<device>``),
+so :mod:`keithley2400.analysis` and :mod:`keithley2400.catalog` pick them up.
+Switching the matrix to the next device is left to the ``before_job`` hook of
+:class:`SweepRunner`.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from .catalog import RunCatalog
+from .instrument import Keithley2400
+from .safety import handle_signals
+from .storage import open_writer, timestamped_filename
+from .sweep import hysteresis_profile
+
+
+class SweepJob(NamedTuple):
+    """One 0 -> min -> max -> 0 sweep of one device, parameters as in the sweep scripts."""
+    device: str
+    minimum: float
+    maximum: float
+    step: float
+    source: str = "VOLT"        # "VOLT": I-V sweep, "CURR": V-I sweep
+    compliance: float = 1.05
+    sense_range: float = 1e-6
+    delay: float = 0.05
+    address: int = 24
+    sweep_mode: str = "point"   # "point" or "buffered"
+    decimals: int | None = None
+
+
+# Type of every SweepJob field, for job lists read from CSV
+_FIELD_TYPES = {"device": str, "source": str, "sweep_mode": str, "address": int, "decimals": int}
+
+
+# Data file prefix, header, plot title and axis labels per source function
+_LAYOUT = {
+    "VOLT": ("voltage_sweep_data", "Voltage (V)\tCurrent (A)", "I-V Measurement", "Voltage (V)", "Current (A)"),
+    "CURR": ("current_sweep_data", "Current (A)\tVoltage (V)", "I-V Measurement", "Current (A)", "Voltage (V)"),
+}
+
+
+def load_jobs(path: str) -> list[SweepJob]:
+    """Read a job list from a ``.json`` or ``.csv`` file.
+
+    Empty CSV cells and JSON nulls leave a field at its default. A field that
+    is unknown, missing or cannot be converted raises ValueError naming the
+    job (counted from 1) and the field.
+    """
+    with open(path, newline="") as f:
+        rows = json.load(f) if path.endswith(".json") else list(csv.DictReader(f))
+    jobs = []
+    for index, row in enumerate(rows, 1):
+        values = {}
+        for name, value in row.items():
+            if value in ("", None):
+                continue
+            if name not in SweepJob._fields:
+                raise ValueError(f"Job {index}: unknown field {name!r}")
+            try:
+                values[name] = _FIELD_TYPES.get(name, float)(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Job {index}: bad value {value!r} for field {name!r}") from None
+        missing = [name for name in SweepJob._fields if name not in values and name not in SweepJob._field_defaults]
+        if missing:
+            raise ValueError(f"Job {index}: missing field {missing[0]!r}")
+        values["source"] = values.get("source", "VOLT").upper()
+        jobs.append(SweepJob(**values))
+    return jobs
+
+
+def sweep_readings(keithley: Keithley2400, job: SweepJob, levels, data_format: str = "ASCII"):
+    """Configure ``keithley`` for ``job``, switch the output on and yield every reading of the sweep.
+
+    Readings are the 5 fields V, I, R, t, status. When the generator ends or
+    is closed, the source is ramped down from the last level set and the
+    output is switched off, also if the ramp fails (see
+    :meth:`~keithley2400.instrument.Keithley2400.ramp_off`).
+    """
+    keithley.configure(job.source, job.compliance, job.sense_range)
+    keithley.set_data_format(data_format)
+    keithley.output_on()
+    try:
+        if job.sweep_mode == "buffered":
+            yield from keithley.buffered_sweep(levels, job.delay)
+        else:
+            for level in levels:
+                keithley.set_level(level)
+                time.sleep(job.delay)  # Wait for the measurement to stabilize
+                yield keithley.measure()
+    finally:
+        # The profile ends at 0, this only ramps down if the sweep stopped early.
+        # A buffered sweep returns to the fixed level (0) when aborted.
+        keithley.ramp_off(keithley.level, job.step, job.delay)
+
+
+def save_job(job: SweepJob, data, segments, filename: str, file_format: str = "txt",
+             render_png: bool = True) -> list[str]:
+    """Write the data file and the PNG of a finished sweep; returns the file names.
+
+    ``data`` holds the (source, sensed) columns and ``segments`` the legs of
+    the sweep profile. Runs in a worker process of :class:`SweepRunner`.
+    """
+    _, header, title, x_label, y_label = _LAYOUT[job.source]
+    with open_writer(filename, header, file_format) as writer:
+        writer.write(data)
+    files = [writer.filename]
+    if render_png:
+        from . import plotting
+        forward = np.zeros(len(data), dtype=bool)
+        forward[segments[0]:segments[0] + segments[1]] = True
+        levels = hysteresis_profile(job.minimum, job.maximum, job.step, job.decimals).levels
+        low, high = levels.min(), levels.max()
+        plotting.render_png(filename, title, x_label, y_label, [
+            (data[forward, 0], data[forward, 1], 'r', 'Forward'),
+            (data[~forward, 0], data[~forward, 1], 'b', 'Backward'),
+        ], (low + low * 0.05, high * 1.05))
+        files.append(filename + ".png")
+    return files
+
+
+class SweepRunner:
+    """Run :class:`SweepJob` s back to back, saving in the background.
+
+    ``workers`` processes save the files and render the PNGs. ``before_job``
+    is called with each job before it is measured (e.g. to switch the matrix);
+    the output is off at that point. With ``record_runs`` every job is
+    registered in the :class:`~keithley2400.catalog.RunCatalog`. While a job
+    is measured, a watchdog switches the output off if the instrument is not
+    read for ``watchdog_timeout`` seconds (``None``: no watchdog).
+    """
+
+    def __init__(self, directory: str = ".", workers: int = 2, file_format: str = "txt",
+                 data_format: str = "ASCII", render_png: bool = True, simulate: bool = False,
+                 board: int = 0, before_job=None, record_runs: bool = True,
+                 watchdog_timeout: float | None = 10.0):
+        self.directory = directory
+        self.file_format = file_format
+        self.data_format = data_format
+        self.render_png = render_png
+        self.simulate = simulate
+        self.board = board
+        self.before_job = before_job
+        self.catalog = RunCatalog() if record_runs else None
+        self.watchdog_timeout = watchdog_timeout
+        self.instruments = {}  # Open instruments and their IDN by GPIB address
+        self.idns = {}
+        self._filenames = set()
+        # Spawned (not forked) workers, so they share no GPIB handles or threads with this process
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def instrument(self, address: int) -> Keithley2400:
+        """The instrument at ``address``, opened on first use."""
+        if address not in self.instruments:
+            if self.simulate:
+                keithley = Keithley2400.simulated()
+            else:
+                keithley = Keithley2400.open(address, self.board)
+            self.idns[address] = keithley.identify()
+            self.instruments[address] = keithley
+        return self.instruments[address]
+
+    def _idn(self, address: int) -> str:
+        self.instrument(address)
+        return self.idns[address]
+
+    def measure(self, job: SweepJob) -> tuple[np.ndarray, tuple[int, int, int]]:
+        """Run the sweep of ``job``; returns the (source, sensed) columns and the leg lengths."""
+        keithley = self.instrument(job.address)
+        profile = hysteresis_profile(job.minimum, job.maximum, job.step, job.decimals)
+        if self.watchdog_timeout is not None:
+            keithley.start_watchdog(self.watchdog_timeout)
+        try:
+            data = np.array(list(sweep_readings(keithley, job, profile.levels, self.data_format))).reshape(-1, 5)
+        finally:
+            keithley.stop_watchdog()  # The output is off, the next job may wait for the matrix
+        columns = (0, 1) if job.source == "VOLT" else (1, 0)
+        return data[:, columns], profile.segments
+
+    def _filename(self, job: SweepJob) -> str:
+        name = timestamped_filename(_LAYOUT[job.source][0], job.device)
+        unique, n = name, 1
+        while unique in self._filenames:  # Same device twice within one second
+            n += 1
+            unique = f"{name}_{n}"
+        self._filenames.add(unique)
+        return os.path.join(self.directory, unique)
+
+    def run(self, jobs):
+        """Run all ``jobs``; yields ``(job, files)`` as the files of each job are saved.
+
+        A job that fails is reported with ``files`` set to the exception and
+        the runner goes on with the next job.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        pending = []  # (job, run id, future) of jobs still being saved
+        for job in jobs:
+            if self.before_job is not None:
+                self.before_job(job)
+            run_id = None
+            if self.catalog is not None:
+                run_id = self.catalog.start(
+                    "iv" if job.source == "VOLT" else "vi", self._idn(job.address), job._asdict(),
+                    device=job.device, address=None if self.simulate else job.address, source=job.source,
+                    compliance=job.compliance, sense_range=job.sense_range, step=job.step, delay=job.delay)
+            try:
+                data, segments = self.measure(job)
+            except Exception as e:
+                if run_id is not None:
+                    self.catalog.finish(run_id, 0, "failed")
+                yield job, e
+                continue
+            if run_id is not None:
+                self.catalog.finish(run_id, len(data))
+            future = self.pool.submit(save_job, job, data, segments, self._filename(job),
+                                      self.file_format, self.render_png)
+            pending.append((job, run_id, future))
+
+            # Report the jobs saved while this one was measured
+            while pending and pending[0][2].done():
+                yield self._saved(*pending.pop(0))
+        for job, run_id, future in pending:
+            yield self._saved(job, run_id, future)
+
+    def _saved(self, job, run_id, future):
+        try:
+            files = future.result()
+        except Exception as e:
+            return job, e
+        if run_id is not None:
+            for path in files:
+                self.catalog.add_file(run_id, path)
+        return job, files
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+        for keithley in self.instruments.values():
+            keithley.close()
+        if self.catalog is not None:
+            self.catalog.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("jobs", help="Job list (.json or .csv)")
+    parser.add_argument("--directory", default=".", help="Folder for the data files and plots")
+    parser.add_argument("--workers", type=int, default=2, help="Processes saving files and plots")
+    parser.add_argument("--file-format", default="txt", choices=["txt", "csv", "bin", "h5"])
+    parser.add_argument("--data-format", default="ASCII", choices=["ASCII", "REAL,64", "SREAL"])
+    parser.add_argument("--no-png", action="store_true", help="Do not render plots")
+    parser.add_argument("--simulate", action="store_true", help="Use the simulated Keithley 2400")
+    parser.add_argument("--no-catalog", action="store_true", help="Do not register the runs in the run catalog")
+    parser.add_argument("--watchdog-timeout", type=float, default=10.0,
+                        help="Switch the output off if the instrument is not read for this many seconds, 0: no watchdog")
+    args = parser.parse_args(argv)
+
+    handle_signals()  # SIGTERM/SIGHUP ramp down the running job like Ctrl+C
+    try:
+        jobs = load_jobs(args.jobs)
+    except ValueError as e:
+        parser.error(f"{args.jobs}: {e}")
+    start = time.perf_counter()
+    with SweepRunner(args.directory, args.workers, args.file_format, args.data_format,
+                     render_png=not args.no_png, simulate=args.simulate,
+                     record_runs=not args.no_catalog,
+                     watchdog_timeout=args.watchdog_timeout or None) as runner:
+        for job, files in runner.run(jobs):
+            if isinstance(files, Exception):
+                print(f"{job.device}: failed: {files}")
+            else:
+                print(f"{job.device}: {', '.join(files)}")
+    print(f"{len(jobs)} jobs in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Leaving the device safe when a measurement ends early or the host stalls.
+
+* :class:`Watchdog` switches the output off when the host stops talking to the
+  instrument, e.g. because the measurement loop hangs. It is fed by every read
+  of :class:`~keithley2400.instrument.Keithley2400`, see
+  :meth:`Keithley2400.start_watchdog`.
+* :func:`handle_signals` makes SIGTERM and SIGHUP (killed process, closed SSH
+  session) raise ``KeyboardInterrupt`` like Ctrl+C, so the ``finally`` blocks
+  of the scripts ramp down before the process exits.
+* :func:`signals_abort_ramp` is used by :meth:`Keithley2400.shutdown`: a
+  further Ctrl+C while ramping down skips the rest of the ramp and switches
+  the output off at once instead of leaving the source on.
+"""
+from __future__ import annotations
+
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+# Signals that stop a measurement like Ctrl+C (SIGHUP does not exist on Windows)
+TERMINATING_SIGNALS = tuple(getattr(signal, name) for name in ("SIGTERM", "SIGHUP") if hasattr(signal, name))
+
+
+class RampInterrupted(RuntimeError):
+    """A signal arrived while ramping down; the output is switched off directly."""
+
+
+class Watchdog(threading.Thread):
+    """Switch the output off if the instrument is not read for ``timeout`` seconds.
+
+    :meth:`feed` restarts the countdown; ``expected`` extends it by the time
+    the next bus transaction may legitimately take (e.g. a buffered sweep
+    running on the instrument). Once tripped, the watchdog device-clears the
+    instrument (aborting a transfer the stalled loop may hang in), writes
+    ``:OUTP OFF`` and ends.
+    """
+
+    def __init__(self, instrument, timeout: float = 5.0):
+        super().__init__(daemon=True)
+        self.instrument = instrument
+        self.timeout = timeout
+        self.tripped = False
+        self._deadline = time.monotonic() + timeout
+        self._stop_event = threading.Event()
+
+    def feed(self, expected: float = 0.0) -> None:
+        self._deadline = time.monotonic() + self.timeout + expected
+
+    def run(self) -> None:
+        while not self._stop_event.wait(min(self.timeout / 4, 0.5)):
+            if time.monotonic() > self._deadline:
+                self.tripped = True
+                print(f"Watchdog: no reply from the instrument for {self.timeout} s, switching the output off")
+                try:
+                    self.instrument.force_output_off()
+                except Exception as e:
+                    print(f"Watchdog: could not switch the output off: {e}")
+                return
+
+    def stop(self) -> None:
+        """Stop watching and wait for the thread to end."""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+def handle_signals() -> None:
+    """Raise ``KeyboardInterrupt`` on SIGTERM and SIGHUP, as on SIGINT (Ctrl+C).
+
+    Call it from the main thread before the output is switched on.
+    """
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt(signal.Signals(signum).name)
+
+    for signum in TERMINATING_SIGNALS:
+        signal.signal(signum, interrupt)
+
+
+@contextmanager
+def signals_abort_ramp():
+    """Inside the block, the first SIGINT/SIGTERM/SIGHUP raises :class:`RampInterrupted`.
+
+    Later signals are ignored until the block ends, so nothing interrupts
+    switching the output off. Only has an effect in the main thread, the
+    only one that receives signals.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    interrupted = False
+
+    def interrupt(signum, frame):
+        nonlocal interrupted
+        if not interrupted:
+            interrupted = True
+            raise RampInterrupted(f"Ramp interrupted by {signal.Signals(signum).name}")
+
+    previous = {signum: signal.signal(signum, interrupt) for signum in (signal.SIGINT, *TERMINATING_SIGNALS)}
+    try:
+        yield
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
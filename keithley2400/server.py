@@ -0,0 +1,505 @@
+"""Local server for remote control and live data streaming of measurement runs.
+
+:class:`AcquisitionServer` owns the instruments and runs one measurement at a
+time, queued first come, first served. Clients on the same machine connect
+over TCP and send JSON requests; runs are started, stopped and inspected, and
+any number of subscribers receive the samples of every run as binary frames.
+The instrument loop never waits for a client: samples are handed from the
+acquisition thread to the event loop in batches (see
+:func:`keithley2400.acquisition.consume`), and a subscriber that reads too
+slowly loses frames instead of holding the others back.
+
+Every frame is a 5-byte header, ``<IB`` (payload length, kind), followed by
+the payload:
+
+* kind ``J``: one JSON object, a request, its reply or an event
+* kind ``D``: one batch of samples, a ``<IQH`` header (run number, index of
+  the first row in the run, columns) followed by the rows as little-endian
+  float64
+
+Requests have a ``command`` and may carry an ``id``, which is echoed in the
+reply (``{"ok": true, ...}`` or ``{"ok": false, "error": ...}``):
+
+* ``run``: queue a run, ``kind`` is ``"sweep"`` (fields of
+  :class:`~keithley2400.runner.SweepJob`) or ``"trace"`` (fields of
+  :class:`TraceJob`), given as ``parameters``; replies with the run number
+* ``stop``: stop the running run, or cancel the queued run ``run``
+* ``status``: state and metrics of the running, queued and finished runs
+* ``subscribe`` / ``unsubscribe``: receive the data frames and the ``run``
+  events (state changes of every run, with the columns of its frames)
+
+Sweep frames have the columns index, source level, sensed value, time and
+status word; trace frames time, current and status word. Data files are
+written as by the scripts and runs are registered in the
+:class:`~keithley2400.catalog.RunCatalog`::
+
+    python -m keithley2400.server --simulate --directory data
+
+    with Client() as client:
+        client.subscribe()
+        number = client.run("sweep", device="die-01", minimum=2, maximum=2, step=0.1)
+        for message in client.messages():
+            ...
+
+The server has no authentication: it only listens on localhost, and anyone
+who can log in to the measurement PC can drive the instrument through it.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import closing
+from typing import NamedTuple
+
+import numpy as np
+
+from .acquisition import AcquisitionThread, consume
+from .catalog import RunCatalog
+from .instrument import Keithley2400
+from .runner import _LAYOUT, SweepJob, sweep_readings
+from .safety import handle_signals
+from .storage import open_writer, timestamped_filename
+from .sweep import hysteresis_profile
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5555
+
+MESSAGE = b"J"
+DATA = b"D"
+_FRAME = struct.Struct("<IB")
+_DATA_HEADER = struct.Struct("<IQH")
+MAX_REQUEST = 1 << 20          # Longest JSON request accepted, in bytes
+MAX_BUFFERED = 4 << 20         # Bytes queued for one subscriber before its frames are dropped
+
+_SWEEP_COLUMNS = {"VOLT": ("Index", "Voltage (V)", "Current (A)", "Time (s)", "Status"),
+                  "CURR": ("Index", "Current (A)", "Voltage (V)", "Time (s)", "Status")}
+_TRACE_COLUMNS = ("Time (s)", "Current (A)", "Status")
+
+
+class TraceJob(NamedTuple):
+    """One I-t trace at constant voltage, parameters as in the I-t script."""
+    voltage: float
+    total_time: float
+    device: str | None = None
+    compliance: float = 0.3
+    sense_range: float = 10e-6
+    step: float = 0.1           # Ramp step to and from the voltage
+    delay: float = 0.1          # Delay between ramp steps
+    nplc: float = 1.0
+    average_count: int = 1
+    address: int = 24
+
+
+def trace_readings(keithley: Keithley2400, job: TraceJob, data_format: str = "ASCII"):
+    """Ramp to the voltage of ``job`` and yield readings until ``total_time`` has passed.
+
+    When the generator ends or is closed, the voltage is ramped down and the
+    output is switched off, also if the ramp fails (see
+    :meth:`~keithley2400.instrument.Keithley2400.ramp_off`).
+    """
+    keithley.configure("VOLT", job.compliance, job.sense_range)
+    keithley.set_data_format(data_format)
+    with keithley.batch():
+        keithley.set_nplc(job.nplc)
+        keithley.set_averaging(job.average_count)
+    keithley.output_on()
+    try:
+        keithley.ramp(0, job.voltage, job.step, job.delay)
+        keithley.reset_timestamp()
+        while True:
+            reading = keithley.measure()
+            yield reading
+            if reading.time >= job.total_time:
+                break
+    finally:
+        keithley.ramp_off(keithley.level, job.step, job.delay)
+
+
+def encode_message(message: dict) -> bytes:
+    payload = json.dumps(message).encode()
+    return _FRAME.pack(len(payload), MESSAGE[0]) + payload
+
+
+def encode_data(run: int, first: int, rows: np.ndarray) -> bytes:
+    rows = np.ascontiguousarray(rows, dtype="<f8")
+    payload = _DATA_HEADER.pack(run, first, rows.shape[1]) + rows.tobytes()
+    return _FRAME.pack(len(payload), DATA[0]) + payload
+
+
+def decode_data(payload: bytes) -> tuple[int, int, np.ndarray]:
+    """Run number, index of the first row and the rows of a data frame."""
+    run, first, columns = _DATA_HEADER.unpack_from(payload)
+    rows = np.frombuffer(payload, "<f8", offset=_DATA_HEADER.size)
+    return run, first, rows.reshape(-1, columns)
+
+
+class Run:
+    """A queued, running or finished run of the server and its metrics."""
+
+    def __init__(self, number: int, kind: str, job):
+        self.number = number
+        self.kind = kind             # "sweep" or "trace"
+        self.job = job
+        self.state = "queued"        # "queued", "running", "completed", "stopped", "failed" or "cancelled"
+        self.columns = _SWEEP_COLUMNS[job.source] if kind == "sweep" else _TRACE_COLUMNS
+        self.points = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.files = []
+        self.catalog_id = None
+        self.acquisition = None
+
+    def info(self) -> dict:
+        elapsed = None
+        if self.started is not None:
+            elapsed = (self.finished or time.time()) - self.started
+        return {"run": self.number, "kind": self.kind, "device": self.job.device, "state": self.state,
+                "columns": self.columns, "points": self.points, "elapsed": elapsed,
+                "rate": self.points / elapsed if elapsed else None, "error": self.error,
+                "files": self.files, "catalog_id": self.catalog_id, "parameters": self.job._asdict()}
+
+
+class AcquisitionServer:
+    """Run measurements requested over a localhost socket and stream their samples.
+
+    Data files go to ``directory`` in ``file_format``; with ``record_runs``
+    every run is registered in the run catalog. Samples are sent to the
+    subscribers ``rate`` times per second.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, directory: str = ".",
+                 file_format: str = "txt", data_format: str = "ASCII", simulate: bool = False,
+                 board: int = 0, record_runs: bool = True, rate: float = 20.0):
+        self.host = host
+        self.port = port
+        self.directory = directory
+        self.file_format = file_format
+        self.data_format = data_format
+        self.simulate = simulate
+        self.board = board
+        self.catalog = RunCatalog() if record_runs else None
+        self.period = 1 / rate
+        self.instruments = {}  # Open instruments and their IDN by GPIB address
+        self.idns = {}
+        self.runs = {}         # All runs by number
+        self.current = None    # The running run
+        self.subscribers = set()
+        self.frames = 0        # Data frames sent and dropped, over all subscribers
+        self.dropped = 0
+        self._queue = None
+        self._numbers = 0
+        self._consumer = ThreadPoolExecutor(1)  # Saves the samples and hands them to the event loop
+
+    def instrument(self, address: int) -> Keithley2400:
+        """The instrument at ``address``, opened on first use."""
+        if address not in self.instruments:
+            if self.simulate:
+                keithley = Keithley2400.simulated(realtime=True)
+            else:
+                keithley = Keithley2400.open(address, self.board)
+            self.idns[address] = keithley.identify()
+            self.instruments[address] = keithley
+        return self.instruments[address]
+
+    async def serve(self) -> None:
+        """Accept clients and run the queued runs until cancelled."""
+        self._queue = asyncio.Queue()
+        server = await asyncio.start_server(self._client, self.host, self.port)
+        worker = asyncio.create_task(self._worker())
+        print(f"Listening on {self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+            try:
+                await asyncio.gather(worker, return_exceptions=True)  # Stops a running run, which ramps down
+            finally:
+                self.close()
+
+    def close(self) -> None:
+        """Stop the running run (ramping it down) and close the instruments."""
+        if self.current is not None and self.current.acquisition is not None:
+            self.current.acquisition.stop()
+        for keithley in self.instruments.values():
+            keithley.close()
+        self.instruments.clear()
+        self._consumer.shutdown()
+        if self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                length, kind = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+                if kind != MESSAGE[0] or length > MAX_REQUEST:
+                    break  # Not a client of this protocol
+                message = json.loads(await reader.readexactly(length))
+                try:
+                    reply = dict(await self._handle(message, writer), ok=True)
+                except Exception as e:
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                if "id" in message:
+                    reply["id"] = message["id"]
+                writer.write(encode_message(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    async def _handle(self, message: dict, writer: asyncio.StreamWriter) -> dict:
+        command = message.get("command")
+        if command == "run":
+            return {"run": self._submit(message.get("kind"), message.get("parameters", {})).number,
+                    "queued": self._queue.qsize()}
+        if command == "stop":
+            return {"run": await self._stop(message.get("run"))}
+        if command == "status":
+            return self.status()
+        if command == "subscribe":
+            self.subscribers.add(writer)
+            return {}
+        if command == "unsubscribe":
+            self.subscribers.discard(writer)
+            return {}
+        raise ValueError(f"Unknown command {command!r}")
+
+    def _submit(self, kind: str, parameters: dict) -> Run:
+        if kind == "sweep":
+            job = SweepJob(**parameters)
+            if job.source not in _LAYOUT:
+                raise ValueError(f"Unknown source {job.source!r}")
+        elif kind == "trace":
+            job = TraceJob(**parameters)
+        else:
+            raise ValueError(f"Unknown run kind {kind!r}, use 'sweep' or 'trace'")
+        self._numbers += 1
+        run = Run(self._numbers, kind, job)
+        self.runs[run.number] = run
+        self._queue.put_nowait(run)
+        self._event(run)
+        return run
+
+    async def _stop(self, number: int | None) -> int | None:
+        run = self.current if number is None else self.runs.get(number)
+        if run is None:
+            return None
+        if run.state == "queued":
+            run.state = "cancelled"  # Skipped by the worker
+            self._event(run)
+        elif run.state == "running" and run.acquisition is not None:
+            # Waits for the current reading; the ramp down follows in the acquisition thread
+            await asyncio.get_running_loop().run_in_executor(None, run.acquisition.stop)
+        return run.number
+
+    def status(self) -> dict:
+        return {"current": None if self.current is None else self.current.info(),
+                "queued": [run.number for run in self.runs.values() if run.state == "queued"],
+                "finished": [run.info() for run in self.runs.values()
+                             if run.state not in ("queued", "running")],
+                "subscribers": len(self.subscribers), "frames": self.frames, "dropped": self.dropped}
+
+    def _event(self, run: Run) -> None:
+        self._broadcast(encode_message({"event": "run", "run": run.info()}))
+
+    def _broadcast(self, frame: bytes) -> None:
+        for writer in list(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                self.dropped += 1  # Slow reader: drop rather than wait for it
+            else:
+                writer.write(frame)
+                self.frames += 1
+
+    async def _worker(self) -> None:
+        while True:
+            run = await self._queue.get()
+            if run.state != "queued":
+                continue
+            self.current = run
+            try:
+                await self._execute(run)
+            finally:
+                self.current = None
+
+    async def _execute(self, run: Run) -> None:
+        loop = asyncio.get_running_loop()
+        job = run.job
+        os.makedirs(self.directory, exist_ok=True)
+        if run.kind == "sweep":
+            prefix, header = _LAYOUT[job.source][:2]
+            catalog_kind = "iv" if job.source == "VOLT" else "vi"
+            file_columns = [1, 2]
+        else:
+            prefix, header = "current_time_data", "Time (s)\tCurrent (A)"
+            catalog_kind = "it"
+            file_columns = [0, 1]
+        filename = os.path.join(self.directory, timestamped_filename(
+            prefix, f"{job.device}_run{run.number}" if job.device else f"run{run.number}"))
+        writer = None
+        run.state = "running"
+        run.started = time.time()
+        try:
+            keithley = await loop.run_in_executor(None, self.instrument, job.address)
+            if self.catalog is not None:
+                run.catalog_id = self.catalog.start(
+                    catalog_kind, self.idns[job.address], job._asdict(), device=job.device,
+                    address=None if self.simulate else job.address,
+                    source=getattr(job, "source", "VOLT"), compliance=job.compliance,
+                    sense_range=job.sense_range, step=job.step, delay=job.delay)
+            writer = open_writer(filename, header, self.file_format)
+            run.files = [writer.filename]
+            run.acquisition = AcquisitionThread(self._samples(keithley, run))
+            self._event(run)
+
+            def update(batch):  # In the consumer thread: save, then hand the batch to the event loop
+                rows = np.array(batch, dtype=float)
+                writer.write(rows[:, file_columns])
+                first, run.points = run.points, run.points + len(rows)
+                loop.call_soon_threadsafe(self._broadcast, encode_data(run.number, first, rows))
+
+            run.acquisition.start()
+            consuming = self._consumer.submit(consume, run.acquisition, update, self.period)
+            try:
+                await asyncio.wrap_future(consuming)
+            except asyncio.CancelledError:
+                # Server shutting down: ramp down and save the last samples before the loop ends
+                run.state = "stopped"
+                run.acquisition.stop()
+                wait([consuming])
+                raise
+            run.state = "stopped" if run.acquisition.stopped else "completed"
+        except Exception as e:
+            run.state = "failed"
+            run.error = f"{type(e).__name__}: {e}"
+            print(f"Run {run.number} failed: {run.error}")
+        finally:
+            run.finished = time.time()
+            if writer is not None:
+                writer.close()
+            if run.catalog_id is not None:
+                status = {"completed": "completed", "stopped": "interrupted"}.get(run.state, "failed")
+                self.catalog.finish(run.catalog_id, run.points, status, files=run.files)
+            self._event(run)
+
+    def _samples(self, keithley: Keithley2400, run: Run):
+        """Rows of the data frames of ``run``, see the module docstring."""
+        job = run.job
+        if run.kind == "trace":
+            readings = trace_readings(keithley, job, self.data_format)
+            with closing(readings):
+                for reading in readings:
+                    yield reading[3], reading[1], reading[4]
+        else:
+            profile = hysteresis_profile(job.minimum, job.maximum, job.step, job.decimals)
+            source, sensed = (0, 1) if job.source == "VOLT" else (1, 0)
+            readings = sweep_readings(keithley, job, profile.levels, self.data_format)
+            with closing(readings):
+                for i, reading in enumerate(readings):
+                    yield i, reading[source], reading[sensed], reading[3], reading[4]
+
+
+class Client:
+    """Blocking client of :class:`AcquisitionServer`, e.g. for scripts driving runs or logging data.
+
+    Frames that arrive while waiting for a reply are kept for :meth:`messages`.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float | None = None):
+        self.socket = socket.create_connection((host, port), timeout)
+        self._file = self.socket.makefile("rb")
+        self._pending = collections.deque()
+        self._ids = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+        self.socket.close()
+
+    def request(self, command: str, **fields) -> dict:
+        """Send a request and return its reply; raises RuntimeError if it failed."""
+        self._ids += 1
+        self.socket.sendall(encode_message(dict(fields, command=command, id=self._ids)))
+        while True:
+            message = self._read()
+            if isinstance(message, dict) and message.get("id") == self._ids:
+                break
+            self._pending.append(message)
+        if not message["ok"]:
+            raise RuntimeError(message["error"])
+        return message
+
+    def run(self, kind: str, **parameters) -> int:
+        """Queue a ``"sweep"`` or ``"trace"`` run and return its number."""
+        return self.request("run", kind=kind, parameters=parameters)["run"]
+
+    def stop(self, run: int | None = None) -> int | None:
+        return self.request("stop", run=run)["run"]
+
+    def status(self) -> dict:
+        return self.request("status")
+
+    def subscribe(self) -> None:
+        self.request("subscribe")
+
+    def unsubscribe(self) -> None:
+        self.request("unsubscribe")
+
+    def messages(self):
+        """Yield the events (dicts) and data frames (``(run, first, rows)``) as they arrive."""
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            yield self._read()
+
+    def _read(self):
+        header = self._file.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            raise ConnectionError("Server closed the connection")
+        length, kind = _FRAME.unpack(header)
+        payload = self._file.read(length)
+        if kind == DATA[0]:
+            return decode_data(payload)
+        return json.loads(payload)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on (keep it local)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--directory", default=".", help="Folder for the data files")
+    parser.add_argument("--file-format", default="txt", choices=["txt", "csv", "bin", "h5"])
+    parser.add_argument("--data-format", default="ASCII", choices=["ASCII", "REAL,64", "SREAL"])
+    parser.add_argument("--rate", type=float, default=20.0, help="Data frames per second sent to subscribers")
+    parser.add_argument("--simulate", action="store_true", help="Use the simulated Keithley 2400")
+    parser.add_argument("--no-catalog", action="store_true", help="Do not register the runs in the run catalog")
+    args = parser.parse_args(argv)
+
+    handle_signals()  # SIGTERM/SIGHUP stop the server like Ctrl+C, ramping down a running run
+    server = AcquisitionServer(args.host, args.port, args.directory, args.file_format, args.data_format,
+                               args.simulate, record_runs=not args.no_catalog, rate=args.rate)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("Server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""Simulated Keithley 2400 for testing and benchmarking without hardware.
+
+:class:`SimulatedTransport` is a drop-in replacement for
+:class:`~keithley2400.transport.GpibTransport`. It understands the SCPI subset
+used by the scripts and the driver (source/sense configuration, output, list
+and linear sweeps, trace buffer, data formats, status model, timestamps) and
+answers with readings in the instrument's 5-field format (V, I, R, t, status).
+
+The device under test is a model object with a ``current(voltage, t)``
+method; :class:`Resistor`, :class:`Diode` and :class:`NoisyLeakage` are
+provided. Every command costs ``command_latency`` and every reading the source
+delay plus the integration time (NPLC, averaging), either in real time
+(``realtime=True``, for benchmarks) or on a virtual clock (fast runs).
+
+    keithley = Keithley2400(SimulatedTransport(Diode()))
+"""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+
+
+# 2400 reading values for "not measured" and "overflow"
+NOT_MEASURED = 9.91e37
+OVERFLOW = 9.9e37
+
+# Status word bits of a reading (same values as in instrument.py)
+STATUS_OVERFLOW = 0x0001  # Range overflow of the sensed quantity (OFLO)
+STATUS_COMPLIANCE = 0x0008
+
+# Power line frequency used to turn NPLC into an integration time
+LINE_FREQUENCY = 50.0
+
+# Settling after a range change, and the extra time autorange takes per reading
+RANGE_CHANGE_TIME = 2e-3
+AUTORANGE_TIME = 8e-3
+
+# Status byte and measurement event bits (same values as in instrument.py)
+_STB_MSB = 0x01
+_STB_MAV = 0x10
+_STB_RQS = 0x40
+_MEAS_READING_AVAILABLE = 0x040
+_MEAS_BUFFER_FULL = 0x200
+
+_VOWELS = "AEIOU"
+
+
+# ----------------------------------------------------------------------
+# Device models
+
+class Resistor:
+    """Ohmic device with optional Gaussian current noise (A rms)."""
+
+    def __init__(self, resistance: float = 1e6, noise: float = 0.0, seed: int | None = None):
+        self.resistance = resistance
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+    def current(self, voltage: float, t: float = 0.0) -> float:
+        i = voltage / self.resistance
+        if self.noise:
+            i += self.rng.normal(0.0, self.noise)
+        return i
+
+
+class Diode:
+    """Shockley diode with series resistance and reverse breakdown."""
+
+    def __init__(self, saturation_current: float = 1e-12, ideality: float = 1.5,
+                 series_resistance: float = 10.0, breakdown_voltage: float = -8.0,
+                 thermal_voltage: float = 0.02585):
+        self.saturation_current = saturation_current
+        self.ideality = ideality
+        self.series_resistance = series_resistance
+        self.breakdown_voltage = breakdown_voltage
+        self.thermal_voltage = thermal_voltage
+
+    def _ideal(self, vd: float) -> float:
+        nvt = self.ideality * self.thermal_voltage
+        i = self.saturation_current * np.expm1(min(vd / nvt, 200.0))
+        if vd < self.breakdown_voltage:
+            i -= self.saturation_current * np.expm1(min((self.breakdown_voltage - vd) / nvt, 200.0))
+        return i
+
+    def current(self, voltage: float, t: float = 0.0) -> float:
+        # Solve I = f(V - I*Rs) by bisection on the diode voltage
+        lo, hi = min(voltage, 0.0) - 1.0, max(voltage, 0.0) + 1.0
+        for _ in range(60):
+            vd = 0.5 * (lo + hi)
+            if vd + self._ideal(vd) * self.series_resistance > voltage:
+                hi = vd
+            else:
+                lo = vd
+        return float(self._ideal(0.5 * (lo + hi)))
+
+
+class NoisyLeakage:
+    """Leaky insulator: pA-scale ohmic leakage with a slow drift and noise."""
+
+    def __init__(self, resistance: float = 1e12, noise: float = 1e-13,
+                 drift: float = 1e-15, seed: int | None = None):
+        self.resistance = resistance
+        self.noise = noise
+        self.drift = drift  # A/s
+        self.rng = np.random.default_rng(seed)
+
+    def current(self, voltage: float, t: float = 0.0) -> float:
+        return voltage / self.resistance + self.drift * t + self.rng.normal(0.0, self.noise)
+
+
+def solve_voltage(model, current: float, t: float = 0.0, limit: float = 210.0) -> float:
+    """Voltage at which ``model`` draws ``current`` (for current sourcing)."""
+    lo, hi = -limit, limit
+    for _ in range(80):
+        mid = 0.5 * (lo + hi)
+        if model.current(mid, t) > current:
+            hi = mid
+        else:
+            lo = mid
+    return 0.5 * (lo + hi)
+
+
+# ----------------------------------------------------------------------
+# SCPI helpers
+
+def short_form(mnemonic: str) -> str:
+    """SCPI short form of a mnemonic, e.g. ``SENSe`` -> ``SENS``, ``LEVel`` -> ``LEV``."""
+    mnemonic = mnemonic.upper()
+    if len(mnemonic) <= 4:
+        return mnemonic
+    if mnemonic[3] in _VOWELS:
+        return mnemonic[:3]
+    return mnemonic[:4]
+
+
+def normalize(header: str) -> str:
+    """Normalize a command header, e.g. ``:SENSe:CURRent:PROTection`` -> ``SENS:CURR:PROT``."""
+    header = header.strip().lstrip(":")
+    if header.startswith("*"):
+        return header.upper()
+    query = "?" if header.endswith("?") else ""
+    return ":".join(short_form(part) for part in header.rstrip("?").split(":")) + query
+
+
+class SimulatedTransport:
+    """Emulated Keithley 2400 behind the transport interface (write/read/...)."""
+
+    def __init__(self, model=None, command_latency: float = 0.5e-3,
+                 realtime: bool = False, idn: str | None = None):
+        self.model = model if model is not None else Resistor()
+        self.command_latency = command_latency
+        self.realtime = realtime
+        self.idn = idn or "KEITHLEY INSTRUMENTS INC.,MODEL 2400,0000000,C32 (simulated)"
+        self.commands = 0           # Number of bus transactions, for benchmarks
+        self._epoch = time.monotonic()
+        self._virtual_time = 0.0
+        self.reset()
+
+    # ------------------------------------------------------------------
+    # Clock
+
+    def now(self) -> float:
+        if self.realtime:
+            return time.monotonic() - self._epoch
+        return self._virtual_time
+
+    def _sleep_until(self, t: float) -> None:
+        if self.realtime:
+            remaining = t - self.now()
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            self._virtual_time = max(self._virtual_time, t)
+
+    def _spend(self, seconds: float) -> None:
+        self._sleep_until(self.now() + seconds)
+
+    # ------------------------------------------------------------------
+    # Instrument state
+
+    def reset(self) -> None:
+        """State after *RST."""
+        self.output = False
+        self.source = "VOLT"
+        self.source_mode = {"VOLT": "FIXED", "CURR": "FIXED"}
+        self.level = {"VOLT": 0.0, "CURR": 0.0}
+        self.source_list = {"VOLT": [], "CURR": []}
+        self.sweep = {"STAR": 0.0, "STOP": 0.0, "POIN": 2, "STEP": None}
+        self.source_delay = 0.0
+        self.trigger_delay = 0.0
+        self.auto_clear = False
+        self.compliance = {"CURR": 105e-6, "VOLT": 21.0}
+        self.sense_range = {"CURR": 105e-6, "VOLT": 21.0}
+        self.auto_range = {"CURR": True, "VOLT": True}
+        self._range_settling = 0.0
+        self.nplc = 1.0
+        self.average_count = 10
+        self.average = False
+        self.data_format = "ASCII"
+        self.swapped = False
+        self.trigger_count = 1
+        self.trace_points = 100
+        self.trace_feed_next = False
+        self.trace = []
+        self.time_zero = self.now()
+        self.sre = 0
+        self.meas_enable = 0
+        self.meas_event = 0
+        self._queue = []            # Pending responses: (ready_at, bytes)
+        self._srq = False
+        self._done_at = 0.0         # End of a running :INIT sweep
+
+    # ------------------------------------------------------------------
+    # Transport interface
+
+    def write(self, message: str) -> None:
+        self.commands += 1
+        self._spend(self.command_latency)
+        previous = ""
+        for part in message.strip().split(";"):
+            part = part.strip()
+            if not part:
+                continue
+            # SCPI: a command after ';' without leading ':' continues the previous path
+            if previous and not part.startswith((":", "*")) and ":" in previous:
+                part = previous.rsplit(":", 1)[0] + ":" + part
+            header, _, argument = part.partition(" ")
+            header = normalize(header)
+            self._execute(header, argument.strip())
+            previous = header
+
+    def read(self, length: int = 100) -> bytes:
+        self.commands += 1
+        self._spend(self.command_latency)
+        if not self._queue:
+            # Addressed to talk without a query: take a fresh reading
+            self._queue_reading()
+        ready_at, response = self._queue.pop(0)
+        self._sleep_until(ready_at)
+        return response[:length]
+
+    def serial_poll(self) -> int:
+        self.commands += 1
+        self._spend(self.command_latency)
+        status = self._status_byte()
+        if self._srq:
+            status |= _STB_RQS
+            self._srq = False
+        return status
+
+    def wait_rqs(self) -> None:
+        """Wait until the instrument would assert SRQ (at most 100 ms)."""
+        deadline = self.now() + 0.1
+        while True:
+            self._status_byte()
+            if self._srq or self.now() >= deadline:
+                return
+            # Sleep until the next response or the end of a sweep is due
+            events = [t for t, _ in self._queue] + ([self._done_at] if self._done_at else [])
+            self._sleep_until(min([t for t in events if t > self.now()] + [deadline]))
+
+    def clear(self) -> None:
+        """Device clear: drop pending responses and abort a running sweep."""
+        self.commands += 1
+        self._queue = []
+        self._done_at = 0.0
+
+    def close(self) -> None:
+        pass
+
+    # ------------------------------------------------------------------
+    # Status model
+
+    def _status_byte(self) -> int:
+        now = self.now()
+        if self._done_at and now >= self._done_at:
+            if self.trace and len(self.trace) >= self.trace_points:
+                self.meas_event |= _MEAS_BUFFER_FULL
+            self._done_at = 0.0
+        status = 0
+        if self._queue and self._queue[0][0] <= now:
+            status |= _STB_MAV
+        if self.meas_event & self.meas_enable:
+            status |= _STB_MSB
+        if status & self.sre:
+            self._srq = True
+        return status
+
+    # ------------------------------------------------------------------
+    # Measurement
+
+    def _integration_time(self) -> float:
+        t = self.nplc / LINE_FREQUENCY
+        if self.average:
+            t *= self.average_count
+        if self.auto_range["CURR" if self.source == "VOLT" else "VOLT"]:
+            t += AUTORANGE_TIME
+        t, self._range_settling = t + self._range_settling, 0.0
+        return t
+
+    def _take_reading(self, level: float, t: float) -> list:
+        """One reading at source ``level`` at time ``t`` (5 fields)."""
+        sense = "CURR" if self.source == "VOLT" else "VOLT"
+        status = 0
+        elapsed = t - self.time_zero
+        if not self.output:
+            voltage, current = (level, 0.0) if self.source == "VOLT" else (0.0, level)
+        elif self.source == "VOLT":
+            voltage = level
+            current = self.model.current(voltage, elapsed)
+            limit = self.compliance["CURR"]
+            if abs(current) > limit:
+                current = float(np.sign(current) * limit)
+                voltage = solve_voltage(self.model, current, elapsed, abs(level))
+                status |= STATUS_COMPLIANCE
+        else:
+            current = level
+            voltage = solve_voltage(self.model, current, elapsed)
+            limit = self.compliance["VOLT"]
+            if abs(voltage) > limit:
+                voltage = float(np.sign(voltage) * limit)
+                current = self.model.current(voltage, elapsed)
+                status |= STATUS_COMPLIANCE
+
+        # Resolution noise of the range and fixed range overflow
+        measured = current if sense == "CURR" else voltage
+        full_scale = self.sense_range[sense]
+        if self.auto_range[sense]:
+            full_scale = max(abs(measured), 1e-9 if sense == "CURR" else 0.2)
+        noise = full_scale * 1e-5 / np.sqrt(self.nplc * (self.average_count if self.average else 1))
+        measured += float(np.random.normal(0.0, noise))
+        if not self.auto_range[sense] and abs(measured) > 1.05 * full_scale:
+            measured = float(np.sign(measured) * OVERFLOW)
+            status |= STATUS_OVERFLOW
+        if sense == "CURR":
+            current = measured
+        else:
+            voltage = measured
+        return [voltage, current, NOT_MEASURED, elapsed, float(status)]
+
+    def _encode(self, readings: list) -> bytes:
+        values = [value for reading in readings for value in reading]
+        if self.data_format == "ASCII":
+            return (",".join(f"{value:+.6E}" for value in values) + "\n").encode("ascii")
+        dtype = ("<" if self.swapped else ">") + ("f8" if self.data_format == "REAL,64" else "f4")
+        return b"#0" + np.asarray(values, dtype=dtype).tobytes() + b"\n"
+
+    def _source_points(self) -> list:
+        mode = self.source_mode[self.source]
+        if mode == "LIST":
+            return list(self.source_list[self.source])
+        if mode == "SWE":
+            points = self.sweep["POIN"]
+            if self.sweep["STEP"]:
+                points = int(round(abs(self.sweep["STOP"] - self.sweep["STAR"]) / self.sweep["STEP"])) + 1
+            return list(np.linspace(self.sweep["STAR"], self.sweep["STOP"], points))
+        return [self.level[self.source]]
+
+    def _run(self) -> tuple[list, float]:
+        """Run the trigger model once; returns the readings and the end time."""
+        points = self._source_points()
+        count = self.trigger_count
+        t = self.now()
+        readings = []
+        output = self.output
+        for k in range(count):
+            level = points[k % len(points)]
+            t += self.trigger_delay + self.source_delay + self._integration_time()
+            # With auto clear the output is only on from the source action to the end of the measurement
+            self.output = output or self.auto_clear
+            readings.append(self._take_reading(level, t))
+        if self.auto_clear:
+            self.output = False
+        return readings, t
+
+    def _queue_reading(self) -> None:
+        readings, done = self._run()
+        self._queue.append((done, self._encode(readings)))
+        self.meas_event |= _MEAS_READING_AVAILABLE
+
+    def _respond(self, text: str, ready_at: float | None = None) -> None:
+        self._queue.append((self.now() if ready_at is None else ready_at, (text + "\n").encode("ascii")))
+
+    # ------------------------------------------------------------------
+    # Command dispatch
+
+    def _execute(self, header: str, argument: str) -> None:
+        arg = argument.strip().strip("'\"").upper()
+        parts = header.split(":")
+
+        if header == "*IDN?":
+            self._respond(self.idn)
+        elif header == "*RST":
+            self.reset()
+        elif header == "*CLS":
+            self.meas_event = 0
+        elif header == "*SRE":
+            self.sre = int(float(arg))
+        elif header == "*WAI":
+            self._sleep_until(max(self._done_at, self.now()))  # Hold off the rest of the message
+        elif header == "*OPC?":
+            self._respond("1", max(self._done_at, self.now()))
+        elif header in ("READ?", "MEAS?"):
+            self._queue_reading()
+        elif header == "INIT":
+            readings, done = self._run()
+            if self.trace_feed_next:
+                self.trace = (self.trace + readings)[:self.trace_points]
+                if len(self.trace) >= self.trace_points:
+                    self.trace_feed_next = False
+            self._done_at = done
+        elif header == "ABOR":
+            self._done_at = 0.0
+        elif header == "OUTP":
+            self.output = arg in ("ON", "1")
+        elif header == "OUTP?":
+            self._respond("1" if self.output else "0")
+        elif header in ("SYST:TIME:RES", "SYST:TIME:RES:AUTO"):
+            self.time_zero = self.now()
+        elif header == "FORM:DATA":
+            self.data_format = "ASCII" if arg.startswith("ASC") else ("SREAL" if arg.startswith("SRE") else "REAL,64")
+        elif header == "FORM:BORD":
+            self.swapped = arg.startswith("SWAP")
+        elif header == "STAT:MEAS:ENAB":
+            self.meas_enable = int(float(arg))
+        elif header == "STAT:MEAS?":
+            self._status_byte()
+            self._respond(str(self.meas_event))
+            self.meas_event = 0
+        elif header == "TRIG:COUN":
+            self.trigger_count = int(float(arg))
+        elif header == "TRIG:DEL":
+            self.trigger_delay = float(arg)
+        elif header == "SYST:LFR?":
+            self._respond(f"{LINE_FREQUENCY:g}")
+        elif header == "TRAC:CLE":
+            self.trace = []
+        elif header == "TRAC:POIN":
+            self.trace_points = int(float(arg))
+        elif header == "TRAC:FEED:CONT":
+            self.trace_feed_next = arg.startswith("NEXT")
+            if self.trace_feed_next:
+                self.trace = []  # Filling starts again at the beginning of the buffer
+        elif header == "TRAC:DATA?":
+            self._respond_raw(self._encode(self.trace), max(self._done_at, self.now()))
+        elif parts[0] == "SOUR":
+            self._execute_source(parts[1:], arg)
+        elif parts[0] == "SENS":
+            self._execute_sense(parts[1:], arg)
+        # Anything else (display, beeper, ...) is accepted and ignored
+
+    def _respond_raw(self, response: bytes, ready_at: float) -> None:
+        self._queue.append((ready_at, response))
+
+    def _execute_source(self, parts: list, arg: str) -> None:
+        if parts == ["FUNC"] or parts == ["FUNC", "MODE"]:
+            self.source = "CURR" if arg.startswith("CURR") else "VOLT"
+        elif parts == ["DEL"]:
+            self.source_delay = float(arg)
+        elif parts == ["DEL", "AUTO"]:
+            if arg in ("ON", "1"):
+                self.source_delay = 0.0  # The auto delay of the low ranges is negligible here
+        elif parts[:2] == ["CLE", "AUTO"]:
+            self.auto_clear = arg in ("ON", "1")
+        elif parts[0] in ("VOLT", "CURR"):
+            function, rest = parts[0], parts[1:]
+            if rest in (["LEV"], ["LEV", "IMM"], ["LEV", "IMM", "AMPL"], [], ["AMPL"]):
+                self.level[function] = float(arg)
+            elif rest == ["MODE"]:
+                self.source_mode[function] = "SWE" if arg.startswith("SWE") else arg
+            elif rest in (["STAR"], ["STOP"], ["POIN"], ["STEP"]):
+                self.sweep[rest[0]] = float(arg) if rest[0] != "POIN" else int(float(arg))
+        elif parts[:1] == ["LIST"] and len(parts) >= 2:
+            function = parts[1]
+            values = [float(value) for value in arg.split(",") if value.strip()]
+            if parts[2:] == ["APP"]:
+                self.source_list[function] += values
+            else:
+                self.source_list[function] = values
+        elif parts[:1] == ["SWE"]:
+            pass  # Spacing/direction: only linear sweeps are simulated
+
+    def _execute_sense(self, parts: list, arg: str) -> None:
+        if parts[:1] == ["FUNC"]:
+            return  # The sensed function always follows the source here
+        if parts[:1] == ["AVER"]:
+            if parts[1:] == ["COUN"]:
+                self.average_count = int(float(arg))
+            elif parts[1:] in ([], ["STAT"]):
+                self.average = arg in ("ON", "1")
+            return
+        if parts[0] in ("CURR", "VOLT"):
+            function, rest = parts[0], parts[1:]
+            if rest == ["PROT"] or rest == ["PROT", "LEV"]:
+                self.compliance[function] = float(arg)
+            elif rest == ["RANG"] or rest == ["RANG", "UPP"]:
+                if float(arg) != self.sense_range[function] or self.auto_range[function]:
+                    self._range_settling = RANGE_CHANGE_TIME
+                self.sense_range[function] = float(arg)
+                self.auto_range[function] = False
+            elif rest == ["RANG", "AUTO"]:
+                self.auto_range[function] = arg in ("ON", "1")
+            elif rest == ["NPLC"]:
+                self.nplc = float(arg)
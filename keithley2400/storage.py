@@ -0,0 +1,218 @@
+"""Saving measurement data with the timestamped file names used by the scripts.
+
+Data is streamed to disk while a measurement runs. Rows are collected in
+memory and written in chunks, either when ``chunk_rows`` rows are pending or
+when ``flush_interval`` seconds have passed since the last write, so a crash
+loses at most one chunk and memory use does not grow with the run length.
+
+Supported file formats (``file_format`` of :func:`open_writer`):
+
+* ``"txt"``: tab separated text, same layout as ``np.savetxt`` (default)
+* ``"csv"``: comma separated text
+* ``"bin"``: append-only little endian float64 rows after a small header
+* ``"h5"``: HDF5 file with one extendable dataset (needs ``h5py``)
+
+All of them can be read while the run is still in progress with
+:func:`read_data`.
+"""
+from __future__ import annotations
+
+import struct
+import time
+
+import numpy as np
+
+from .buffer import GrowableBuffer
+
+
+# Header of the binary format: magic, version, number of columns, header length
+BINARY_MAGIC = b"K2400DAT"
+BINARY_VERSION = 1
+_BINARY_PREFIX = struct.Struct("<8sHHI")
+
+FILE_FORMATS = ("txt", "csv", "bin", "h5")
+
+
+def timestamped_filename(prefix: str, suffix: str | None = None) -> str:
+    """Return e.g. ``voltage_sweep_data_20250101-120000[_suffix]`` (no extension)."""
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    if suffix:
+        return f"{prefix}_{timestamp}_{suffix}"
+    return f"{prefix}_{timestamp}"
+
+
+def save_columns(filename: str, columns, header: str) -> None:
+    """Save equally long columns as a tab separated ``.txt`` file."""
+    data = np.column_stack(columns)
+    np.savetxt(filename + ".txt", data, header=header, delimiter="\t")
+
+
+class StreamWriter:
+    """Base class of the streaming writers.
+
+    Subclasses open the file in ``_open`` and implement ``_append`` (write an
+    (n, columns) array) and ``_sync`` (push written data to disk).
+    """
+
+    extension = ""
+
+    def __init__(self, filename: str, header: str, columns: int | None = None,
+                 chunk_rows: int = 1000, flush_interval: float = 1.0):
+        self.filename = filename + self.extension
+        self.header = header
+        self.columns = columns if columns is not None else len(header.split("\t"))
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._pending = GrowableBuffer(self.columns, chunk=chunk_rows)
+        self._last_flush = time.monotonic()
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rows) -> None:
+        """Queue one row or an (n, columns) batch; flush if a threshold is reached."""
+        rows = np.atleast_2d(rows)
+        if rows.size == 0:
+            return
+        self._pending.extend(rows)
+        if (len(self._pending) >= self.chunk_rows
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending rows and push them to disk."""
+        if len(self._pending):
+            self._append(self._pending.data)
+            self.rows_written += len(self._pending)
+            self._pending.clear()
+        self._sync()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.flush()
+            self._close()
+
+    @property
+    def closed(self) -> bool:
+        return self.file is None
+
+    def _close(self) -> None:
+        self.file.close()
+        self.file = None
+
+
+class TextWriter(StreamWriter):
+    """Tab (``.txt``) or comma (``.csv``) separated text with a ``# header`` line."""
+
+    extension = ".txt"
+
+    def __init__(self, filename: str, header: str, delimiter: str = "\t", **kwargs):
+        self.delimiter = delimiter
+        if delimiter == ",":
+            self.extension = ".csv"
+        super().__init__(filename, header, **kwargs)
+
+    def _open(self) -> None:
+        self.file = open(self.filename, "w")
+        self.file.write("# " + self.header.replace("\t", self.delimiter) + "\n")
+        self.file.flush()
+
+    def _append(self, rows) -> None:
+        np.savetxt(self.file, rows, delimiter=self.delimiter)
+
+    def _sync(self) -> None:
+        self.file.flush()
+
+
+class BinaryWriter(StreamWriter):
+    """Append-only binary file: a small header followed by float64 rows.
+
+    The header is ``K2400DAT``, the format version, the number of columns and
+    the UTF-8 column header. After a crash the file holds every flushed row (a
+    torn last row is ignored by :func:`read_binary`).
+    """
+
+    extension = ".bin"
+
+    def _open(self) -> None:
+        self.file = open(self.filename, "wb")
+        header = self.header.encode("utf-8")
+        self.file.write(_BINARY_PREFIX.pack(BINARY_MAGIC, BINARY_VERSION, self.columns, len(header)))
+        self.file.write(header)
+        self.file.flush()
+
+    def _append(self, rows) -> None:
+        self.file.write(np.ascontiguousarray(rows, dtype='<f8').tobytes())
+
+    def _sync(self) -> None:
+        self.file.flush()
+
+
+class HDF5Writer(StreamWriter):
+    """HDF5 file with an extendable ``data`` dataset, written in chunks.
+
+    The file is switched to SWMR mode, so other processes can read it with
+    ``h5py.File(name, "r", swmr=True)`` while the measurement runs.
+    """
+
+    extension = ".h5"
+
+    def _open(self) -> None:
+        import h5py
+        self.file = h5py.File(self.filename, "w", libver="latest")
+        self.dataset = self.file.create_dataset(
+            "data", shape=(0, self.columns), maxshape=(None, self.columns),
+            chunks=(self.chunk_rows, self.columns), dtype="f8")
+        self.dataset.attrs["header"] = self.header
+        self.file.swmr_mode = True
+
+    def _append(self, rows) -> None:
+        n = self.dataset.shape[0]
+        self.dataset.resize(n + len(rows), axis=0)
+        self.dataset[n:] = rows
+
+    def _sync(self) -> None:
+        self.dataset.flush()
+
+
+def open_writer(filename: str, header: str, file_format: str = "txt", **kwargs) -> StreamWriter:
+    """Open a streaming writer for ``filename`` (without extension)."""
+    if file_format == "txt":
+        return TextWriter(filename, header, **kwargs)
+    if file_format == "csv":
+        return TextWriter(filename, header, delimiter=",", **kwargs)
+    if file_format == "bin":
+        return BinaryWriter(filename, header, **kwargs)
+    if file_format == "h5":
+        return HDF5Writer(filename, header, **kwargs)
+    raise ValueError(f"Unknown file format {file_format!r}, use one of {FILE_FORMATS}")
+
+
+def read_binary(path: str) -> tuple[np.ndarray, str]:
+    """Read a file written by :class:`BinaryWriter`; returns ``(data, header)``."""
+    with open(path, "rb") as f:
+        magic, version, columns, header_length = _BINARY_PREFIX.unpack(f.read(_BINARY_PREFIX.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a Keithley 2400 data file")
+        header = f.read(header_length).decode("utf-8")
+        data = np.frombuffer(f.read(), dtype='<f8')
+    data = data[:len(data) - len(data) % columns]  # Ignore a torn last row
+    return data.reshape(-1, columns), header
+
+
+def read_data(path: str) -> np.ndarray:
+    """Read a data file in any of the supported formats as an (n, columns) array."""
+    if path.endswith(".bin"):
+        return read_binary(path)[0]
+    if path.endswith(".h5"):
+        import h5py
+        with h5py.File(path, "r", swmr=True) as f:
+            return f["data"][:]
+    delimiter = "," if path.endswith(".csv") else "\t"
+    return np.loadtxt(path, delimiter=delimiter, ndmin=2)
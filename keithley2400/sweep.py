@@ -0,0 +1,162 @@
+"""Sweep profiles shared by the I-V and V-I scripts (fixed step and adaptive)."""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import numpy as np
+
+from .instrument import OVERFLOW
+
+
+# Noise of a reading relative to its measurement range at 1 NPLC (about 2 counts at 6½ digits)
+RANGE_NOISE = 1e-5
+
+
+def noise_floor(sense_range: float, nplc: float = 1.0) -> float:
+    """Smallest change between two readings on ``sense_range`` that is not noise.
+
+    Five times the reading noise, which drops with the square root of the
+    integration time; used as the ``floor`` of :class:`AdaptiveSweep`.
+    """
+    return 5 * RANGE_NOISE * sense_range / np.sqrt(nplc)
+
+
+class SweepProfile(NamedTuple):
+    """Source levels of a 0 -> min -> max -> 0 hysteresis sweep.
+
+    ``segments`` holds the number of points in the three legs
+    (0 -> min, min -> max, max -> 0). The first and last legs are plotted as
+    "backward", the middle one as "forward".
+    """
+    levels: np.ndarray
+    segments: tuple[int, int, int]
+
+    def direction(self, index: int) -> str:
+        if index < self.segments[0]:
+            return "backward"
+        if index < self.segments[0] + self.segments[1]:
+            return "forward"
+        return "backward"
+
+
+def hysteresis_profile(minimum: float, maximum: float, step: float,
+                       decimals: int | None = None) -> SweepProfile:
+    """Build the 0 -> min -> max -> 0 profile used by the sweep scripts.
+
+    The legs are built exactly as in the original scripts (0 to ``-minimum``,
+    ``-minimum`` to ``maximum``, ``maximum`` to 0). If ``decimals`` is set the
+    levels are rounded (the I-V script rounds to 2).
+    """
+    list1 = np.arange(0, -minimum - step, -step)
+    list2 = np.arange(-minimum, maximum + step, step)
+    list3 = np.arange(maximum, 0 - step, -step)
+    levels = np.concatenate((list1, list2, list3))
+    if decimals is not None:
+        levels = np.round(levels, decimals)
+    return SweepProfile(levels, (len(list1), len(list2), len(list3)))
+
+
+def split_legs(levels) -> tuple[int, int, int]:
+    """Recover the ``segments`` of a recorded 0 -> min -> max -> 0 sweep.
+
+    ``levels`` is the source column of a saved sweep (fixed step or adaptive).
+    Both sweeps repeat the turning levels, so the first leg ends at the first
+    minimum and the second one at the first maximum after it. An interrupted
+    sweep gives shorter (possibly empty) trailing legs.
+    """
+    levels = np.asarray(levels)
+    if len(levels) == 0:
+        return 0, 0, 0
+    end1 = int(np.argmin(levels)) + 1
+    end2 = end1 + int(np.argmax(levels[end1:])) + 1 if end1 < len(levels) else end1
+    return end1, end2 - end1, len(levels) - end2
+
+
+class AdaptiveSweep:
+    """0 -> min -> max -> 0 sweep whose step follows the curvature of the measured curve.
+
+    The legs and their forward/backward labels are the same as in
+    :func:`hysteresis_profile`, but the levels are chosen while measuring:
+    after every point the deviation of the new reading from the straight line
+    through the two before it is compared with ``target``, and the next step
+    is scaled so the deviation stays about ``target`` (it grows with the
+    square of the step), within ``min_step`` and ``max_step`` and at most
+    doubling from one step to the next. Straight and flat regions are crossed
+    with ``max_step``, knees and breakdowns get dense points.
+
+    With ``metric="log"`` the curve is taken as ``log10(|y| + floor)``
+    (diode and leakage currents spanning decades, ``target`` in decades), with
+    ``"linear"`` as ``y`` relative to the largest ``|y|`` seen so far.
+    ``floor`` is the noise floor of ``y`` (see :func:`noise_floor`): a
+    deviation of at most ``floor`` counts as straight, so noise does not
+    shrink the step, and so does a point next to an over-range reading.
+    """
+
+    def __init__(self, minimum: float, maximum: float, min_step: float, max_step: float,
+                 target: float = 0.1, metric: str = "log", floor: float = 1e-12,
+                 decimals: int | None = None):
+        if metric not in ("log", "linear"):
+            raise ValueError(f"Unknown metric {metric!r}, use 'log' or 'linear'")
+        self.legs = ((0.0, -minimum), (-minimum, maximum), (maximum, 0.0))
+        self.min_step = min_step
+        self.max_step = max_step
+        self.target = target
+        self.metric = metric
+        self.floor = floor
+        self.decimals = decimals
+        self.leg_of_point = []  # Leg index of every point taken so far
+        self._scale = floor
+
+    def direction(self, index: int) -> str:
+        return "forward" if self.leg_of_point[index] == 1 else "backward"
+
+    def _deviation(self, points) -> float:
+        """Deviation of the last of three ``(level, y)`` points from the line through the first two."""
+        (x0, y0), (x1, y1), (x2, y2) = points
+        if x1 == x0 or max(abs(y0), abs(y1), abs(y2)) >= OVERFLOW:
+            return 0.0  # No line, or no value to compare: straight
+        slope = (x2 - x1) / (x1 - x0)
+        if abs(y2 - y1 - (y1 - y0) * slope) <= self.floor:
+            return 0.0  # Within the noise
+        if self.metric == "log":
+            y0, y1, y2 = (np.log10(abs(y) + self.floor) for y in (y0, y1, y2))
+        else:
+            self._scale = max(self._scale, abs(y0), abs(y1), abs(y2))
+            y0, y1, y2 = y0 / self._scale, y1 / self._scale, y2 / self._scale
+        return abs(y2 - y1 - (y1 - y0) * slope)
+
+    def run(self, measure, bounds=None):
+        """Sweep with ``measure(level) -> (x, y)`` and yield ``(index, x, y)``.
+
+        ``bounds`` is a ``[low, high]`` list of the levels allowed; it may be
+        narrowed while sweeping (e.g. ``AnomalyDetector.bounds``), the legs
+        then turn around at the new bound.
+        """
+        bounds = bounds if bounds is not None else [-np.inf, np.inf]
+        index = 0
+        for leg, (start, stop) in enumerate(self.legs):
+            sign = 1.0 if stop >= start else -1.0
+            level, step, points = start, self.min_step, []
+            while True:
+                stop = min(max(stop, bounds[0]), bounds[1])
+                level = min(max(level, bounds[0]), bounds[1])
+                if self.decimals is not None:
+                    level = round(level, self.decimals)
+                x, y = measure(level)
+                self.leg_of_point.append(leg)
+                yield index, x, y
+                index += 1
+                if sign * (stop - level) <= 0:
+                    break
+
+                # Scale the step so the next point deviates from a straight line by about target
+                points = [*points[-2:], (level, y)]
+                wanted = 2 * step  # Until three points show the curvature
+                if len(points) == 3:
+                    deviation = self._deviation(points)
+                    if deviation > 0:
+                        wanted = abs(points[2][0] - points[1][0]) * np.sqrt(self.target / deviation)
+                step = min(max(wanted, self.min_step), self.max_step, 2 * step)
+                level = level + sign * step
+                if sign * (level - stop) > 0:
+                    level = stop
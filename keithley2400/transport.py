@@ -0,0 +1,45 @@
+"""Bus transports used by the Keithley 2400 driver.
+
+A transport only moves SCPI strings and raw bytes; it knows nothing about the
+instrument. Anything with ``write``, ``read`` and ``close`` can be passed to
+:class:`keithley2400.Keithley2400`.
+"""
+from __future__ import annotations
+
+
+# linux-gpib ibsta bits
+RQS = 0x0800
+TIMO = 0x4000
+
+
+class GpibTransport:
+    """linux-gpib device handle (``gpib.dev``) for one primary address."""
+
+    def __init__(self, address: int, board: int = 0):
+        # Imported here so the rest of the package works on machines without linux-gpib
+        import gpib
+        self._gpib = gpib
+        self.address = address
+        self.board = board
+        self.handle = gpib.dev(board, address)
+
+    def write(self, command: str) -> None:
+        self._gpib.write(self.handle, command)
+
+    def read(self, length: int = 100) -> bytes:
+        return self._gpib.read(self.handle, length)
+
+    def serial_poll(self) -> int:
+        """Serial poll the device and return its status byte."""
+        return self._gpib.serial_poll(self.handle)
+
+    def wait_rqs(self) -> None:
+        """Block until the device requests service or the device timeout expires."""
+        self._gpib.wait(self.handle, RQS | TIMO)
+
+    def clear(self) -> None:
+        """Device clear (SDC): aborts pending transfers and clears the I/O buffers."""
+        self._gpib.clear(self.handle)
+
+    def close(self) -> None:
+        self._gpib.close(self.handle)
@@ -0,0 +1,24 @@
+"""File kinds and file search of the analysis."""
+from keithley2400.analysis import find_files, kind_of
+
+
+def test_long_run_files_have_no_kind():
+    for suffix in ("1s", "60s", "0.5s", "events", "raw"):
+        assert kind_of(f"current_time_data_20261017-120000_{suffix}.txt") is None
+    assert kind_of("current_time_data_20261017-120000.txt") == "it"
+
+
+def test_user_suffixes_keep_their_kind():
+    assert kind_of("voltage_sweep_data_20261017-120000_raw.txt") == "iv"
+    assert kind_of("current_sweep_data_20261017-120000_2s.csv") == "vi"
+    assert kind_of("current_time_data_20261017-120000_events_run3.txt") == "it"
+    assert kind_of("current_time_data_20261017-120000_sample_raw.txt") == "it"
+
+
+def test_find_files_skips_long_run_files(tmp_path, capsys):
+    names = ["voltage_sweep_data_20261017-120000_raw.txt", "current_time_data_20261017-120000_1s.txt",
+             "current_time_data_20261017-120000_raw.txt", "current_time_data_20261017-130000.txt"]
+    for name in names:
+        (tmp_path / name).write_text("")
+    assert find_files([str(tmp_path)]) == [str(tmp_path / names[3]), str(tmp_path / names[0])]
+    assert capsys.readouterr().err.count("Skipped") == 2
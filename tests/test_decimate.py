@@ -0,0 +1,24 @@
+"""Min/max levels of detail of a growing trace."""
+import numpy as np
+
+from keithley2400.buffer import GrowableBuffer
+from keithley2400.decimate import LODPyramid
+
+
+def test_view_keeps_points_outside_the_window_out():
+    rng = np.random.default_rng(1)
+    x = np.arange(200_000) * 0.001
+    y = rng.normal(size=len(x))
+    buffer = GrowableBuffer(2)
+    pyramid = LODPyramid(buffer)
+    for i in range(0, len(x), 7777):
+        buffer.extend(np.column_stack((x[i:i + 7777], y[i:i + 7777])))
+        pyramid.update()
+
+    for _ in range(500):
+        x0, x1 = np.sort(rng.uniform(0, x[-1], 2))
+        pixels = int(rng.integers(50, 2000))
+        vx, vy, _ = pyramid.view(x0, x1, pixels)
+        inside = (x >= x0) & (x <= x1)
+        assert x0 <= vx.min() and vx.max() <= x1
+        assert vy.min() == y[inside].min() and vy.max() == y[inside].max()
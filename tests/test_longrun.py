@@ -0,0 +1,57 @@
+"""Spike events and the raw ring buffer of the long-run store."""
+import numpy as np
+import pytest
+
+from keithley2400.longrun import MultiResolutionStore, RingBuffer
+from keithley2400.storage import read_data
+
+
+def stream(store, t, y, batch=10):
+    for i in range(0, len(t), batch):
+        store.write(np.column_stack((t[i:i + batch], y[i:i + batch])))
+    store.close()
+
+
+def test_spikes_give_one_event(tmp_path):
+    t = np.arange(0, 10, 0.01)
+    y = np.zeros_like(t)
+    spikes = np.isin(np.round(t, 2), (3.5, 3.6))
+    y[spikes] = 1e-5  # Pulls the mean of the 3-4 s interval over the threshold
+    store = MultiResolutionStore(str(tmp_path / "trace"), raw_window=2, spike_threshold=1e-7, event_window=0.205)
+    stream(store, t, y)
+
+    assert store.event_count == 1  # No event after the interval holding the spikes
+    events = read_data(store.events.filename)
+    assert events[:, 0].min() == pytest.approx(3.3)
+    assert events[:, 0].max() == pytest.approx(3.8)
+    assert np.count_nonzero(events[:, 1]) == 2
+    assert set(events[:, 2]) == {1}
+
+
+def test_separate_spikes_give_separate_events(tmp_path):
+    t = np.arange(0, 10, 0.01)
+    y = np.full_like(t, 1e-9)
+    y[np.isin(np.round(t, 2), (2.5, 7.5))] = -1e-6
+    store = MultiResolutionStore(str(tmp_path / "trace"), spike_threshold=1e-7, event_window=0.5)
+    stream(store, t, y)
+
+    assert store.event_count == 2
+    events = read_data(store.events.filename)
+    assert len(events) == 2 * 101
+    assert np.array_equal(np.unique(events[:, 2]), [1, 2])
+
+
+def test_no_intervals(tmp_path):
+    with pytest.raises(ValueError):
+        MultiResolutionStore(str(tmp_path / "trace"), intervals=())
+
+
+def test_ring_buffer_grows_to_span():
+    buffer = RingBuffer(2, 100_000, span=60)
+    for second in range(120):
+        t = second + np.arange(100) / 100
+        buffer.extend(np.column_stack((t, t)))
+    assert buffer.capacity == 100_000 and 6000 <= len(buffer) < 16_384
+    assert buffer.first() <= buffer.last() - 60
+    rows = buffer.since(buffer.last() - 60)
+    assert np.all(np.diff(rows[:, 0]) > 0) and len(rows) == 6001
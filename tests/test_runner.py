@@ -0,0 +1,43 @@
+"""Job lists of the batch runner."""
+import json
+import re
+
+import pytest
+
+from keithley2400.runner import SweepJob, load_jobs
+
+
+def write_json(tmp_path, jobs):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps(jobs))
+    return str(path)
+
+
+def test_null_fields_take_their_default(tmp_path):
+    path = write_json(tmp_path, [{"device": "A", "minimum": 1, "maximum": 2, "step": 0.1,
+                                  "address": None, "decimals": None, "delay": None}])
+    assert load_jobs(path) == [SweepJob("A", 1.0, 2.0, 0.1)]
+
+
+def test_csv_empty_cells_take_their_default(tmp_path):
+    path = tmp_path / "jobs.csv"
+    path.write_text("device,minimum,maximum,step,source,decimals\nA,1,2,0.1,curr,\n")
+    assert load_jobs(str(path)) == [SweepJob("A", 1.0, 2.0, 0.1, source="CURR")]
+
+
+@pytest.mark.parametrize("field, value, message", [
+    ("address", "GPIB", "Job 2: bad value 'GPIB' for field 'address'"),
+    ("step", [0.1], "Job 2: bad value [0.1] for field 'step'"),
+    ("range", 1e-6, "Job 2: unknown field 'range'"),
+])
+def test_bad_fields_name_job_and_field(tmp_path, field, value, message):
+    good = {"device": "A", "minimum": 1, "maximum": 2, "step": 0.1}
+    path = write_json(tmp_path, [good, {**good, field: value}])
+    with pytest.raises(ValueError, match=re.escape(message)):
+        load_jobs(path)
+
+
+def test_missing_field(tmp_path):
+    path = write_json(tmp_path, [{"device": "A", "minimum": 1, "maximum": 2}])
+    with pytest.raises(ValueError, match="Job 1: missing field 'step'"):
+        load_jobs(path)
@@ -0,0 +1,49 @@
+"""Adaptive sweep against the fixed-step sweep on the simulated instrument."""
+import numpy as np
+
+from keithley2400 import Diode, Keithley2400, hysteresis_profile
+from keithley2400.sweep import AdaptiveSweep, noise_floor
+
+
+def adaptive_points(model, source, sense_range, compliance, minimum, maximum, min_step, max_step,
+                    metric, **kwargs):
+    """Source levels of an adaptive sweep of ``model`` on the simulator."""
+    np.random.seed(0)  # Reading noise of the simulator, the sweep follows it
+    levels = []
+    keithley = Keithley2400.simulated(model)
+    keithley.configure(source, compliance, sense_range)
+    keithley.output_on()
+
+    def measure(level):
+        levels.append(level)
+        keithley.set_level(level)
+        reading = keithley.measure()
+        if source == "VOLT":
+            return reading.voltage, reading.current
+        return reading.current, reading.voltage
+
+    profile = AdaptiveSweep(minimum, maximum, min_step, max_step, 0.1, metric=metric,
+                            floor=noise_floor(sense_range), **kwargs)
+    for _ in profile.run(measure):
+        pass
+    return levels
+
+
+def test_vi_resistor_fewer_points():
+    # Default V-I script sweep: the 1 MOhm resistor is a straight line
+    levels = adaptive_points(None, "CURR", 80, 80, 2.5e-9, 2.5e-9, 0.01e-9, 0.2e-9, "linear")
+    assert len(levels) < len(hysteresis_profile(2.5e-9, 2.5e-9, 0.1e-9).levels)
+
+
+def test_iv_resistor_fewer_points():
+    # Default I-V script sweep: a current within the noise of the 1 uA range near 0 V
+    levels = adaptive_points(None, "VOLT", 1e-6, 1.05, 5, 5, 0.01, 0.5, "log", decimals=2)
+    assert len(levels) < len(hysteresis_profile(5, 5, 0.25, decimals=2).levels)
+
+
+def test_iv_diode_dense_at_knee():
+    levels = adaptive_points(Diode(), "VOLT", 1e-3, 1.05e-3, 10, 2, 0.01, 0.5, "log", decimals=2)
+    assert len(levels) < len(hysteresis_profile(10, 2, 0.25, decimals=2).levels)
+    # Steps below the fixed step of 0.25 V around the forward knee
+    knee = np.unique([level for level in levels if 0.4 <= level <= 0.9])
+    assert len(knee) >= 3 and np.diff(knee).min() < 0.25